@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional, Tuple
+
+from app.metrics import metrics
+from app.utils import logger
+
+# Lower value = served first
+PRIORITY_LANDLORD = 0
+PRIORITY_AUTHENTICATED = 1
+PRIORITY_ANONYMOUS = 2
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is shed instead of admitted.
+    `status_code` is 429 when the wait queue is full and 503 when queueing delay is over target.
+    """
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounds concurrent work and sheds overload quickly instead of letting every request time out.
+
+    At most `max_in_flight` requests run at once. Others wait in a short priority queue
+    (landlords, then authenticated users, then anonymous traffic) for at most `queue_timeout`
+    seconds. A request is rejected immediately when the queue is full (429) or, for
+    non-landlord traffic, when the most recent queueing delay exceeded `target_queue_delay` (503).
+    """
+
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 16, queue_timeout: float = 2.0,
+                 target_queue_delay: float = 0.5, name: str = "admission"):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_queue_delay = target_queue_delay
+        self.name = name
+        self.in_flight = 0
+        self._queue: List[Tuple[int, int, asyncio.Future, float]] = []
+        self._sequence = itertools.count()
+        self._last_queue_delay = 0.0
+        self._service_time = 1.0  # EWMA of seconds per admitted request
+
+    def queue_length(self) -> int:
+        return sum(1 for entry in self._queue if not entry[2].done())
+
+    def retry_after(self) -> int:
+        """Seconds until a retry is likely to be admitted, from queue length and service time."""
+        backlog = self.queue_length() + self.in_flight
+        return max(1, math.ceil(self._service_time * backlog / self.max_in_flight))
+
+    def _reject(self, status_code: int, reason: str) -> AdmissionRejected:
+        metrics.increment(f"{self.name}_rejected_{status_code}")
+        logger.warning(f"Admission rejected ({status_code}): {reason}")
+        return AdmissionRejected(status_code, reason, self.retry_after())
+
+    async def acquire(self, priority: int = PRIORITY_ANONYMOUS) -> None:
+        waiting = self.queue_length()
+        if self.in_flight < self.max_in_flight and not waiting:
+            self.in_flight += 1
+            self._last_queue_delay = 0.0
+            metrics.increment(f"{self.name}_admitted")
+            return
+
+        if waiting and priority != PRIORITY_LANDLORD and self._last_queue_delay > self.target_queue_delay:
+            raise self._reject(503, "Queueing delay is above target.")
+
+        if waiting >= self.max_queue:
+            worst = max((entry for entry in self._queue if not entry[2].done()), default=None)
+            if worst is None or worst[0] <= priority:
+                raise self._reject(429, "Too many requests are waiting.")
+            # Make room for higher-priority traffic by shedding the lowest-priority waiter
+            worst[2].set_exception(self._reject(429, "Displaced by higher-priority traffic."))
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future, enqueued_at))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._last_queue_delay = time.monotonic() - enqueued_at
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # The slot was handed over just as the deadline expired; give it back
+                self.release(service_time=None)
+            future.cancel()
+            raise self._reject(503, "Timed out waiting for capacity.")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(service_time=None)
+            future.cancel()
+            raise
+        self._last_queue_delay = time.monotonic() - enqueued_at
+        metrics.increment(f"{self.name}_admitted")
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        if service_time is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        while self._queue:
+            _, _, future, _ = heapq.heappop(self._queue)
+            if not future.done():
+                # Hand the slot straight to the next waiter; in_flight is unchanged
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._last_queue_delay = 0.0
+
+    def release_callback(self) -> Callable[[], None]:
+        """
+        Releases a slot taken with `acquire` when called. For work that can outlive the
+        request waiting on it (e.g. a graph execution on a thread, which a disconnecting
+        client cannot stop), call it on the work's completion so the slot keeps bounding
+        real concurrency.
+        """
+        start = time.monotonic()
+        return lambda: self.release(service_time=time.monotonic() - start)
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITY_ANONYMOUS):
+        await self.acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(service_time=time.monotonic() - start)
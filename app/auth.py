@@ -0,0 +1,63 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Dict, Optional
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def sign_token(claims: Dict, secret: str) -> str:
+    """Issues an HS256 JWT; used by tests and for minting admin tokens from the CLI."""
+    header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{_b64encode(signature)}"
+
+def verify_token(token: str, secret: str, now: Optional[float] = None) -> Optional[Dict]:
+    """
+    Returns the claims of an HS256 JWT signed with `secret` by the rental platform's backend,
+    or None if the token is malformed, signed with another key or algorithm, or expired.
+    """
+    if not secret:
+        return None
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        if header.get("alg") != "HS256":
+            return None
+        expected = hmac.new(secret.encode(), f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+            return None
+        claims = json.loads(_b64decode(payload_b64))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict):
+        return None
+    expires = claims.get("exp")
+    if expires is not None and (not isinstance(expires, (int, float)) or expires <= (now or time.time())):
+        return None
+    return claims
+
+def bearer_claims(authorization: Optional[str], secret: str) -> Optional[Dict]:
+    """Verified claims from an `Authorization: Bearer <token>` header, or None."""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return verify_token(token.strip(), secret)
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Mint a signed bearer token (e.g. for /debug/memory).")
+    parser.add_argument("--role", default="admin")
+    parser.add_argument("--ttl-seconds", type=int, default=3600)
+    args = parser.parse_args()
+    print(sign_token({"role": args.role, "exp": int(time.time()) + args.ttl_seconds}, os.environ["AUTH_TOKEN_SECRET"]))
@@ -1,171 +1,281 @@
+import functools
 import os
-from typing import List, Dict, Any, Literal
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Annotated, List, Dict, Any, Literal, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from app.vector_store import faiss_vector_store
+from langgraph.graph import StateGraph, START, END
+from app.lexical import LexicalHit, reciprocal_rank_fusion
+from app.vector_store import SearchHit, faiss_vector_store
 from app.config import config
-from app.utils import logger, get_gemini_language_code
+from app.fallback import extractive_answer
+from app.knowledge_base import embedding_model
+from app.metrics import metrics
+from app.precompute import AnswerStore
+from app.tenants import lexical_search_with_tenant, search_with_tenant
+from app.utils import logger, detect_language, get_gemini_language_code, get_no_context_response
 
 # Initialize Gemini LLM
 # Use gemini-1.5-flash for faster responses and lower cost
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=config.GOOGLE_API_KEY, temperature=0.2, convert_system_message_to_human=True)
+llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=config.GOOGLE_API_KEY, temperature=0.2)
+
+# Gemini calls run on this pool so generate can stop waiting once the latency budget is spent
+_llm_executor = ThreadPoolExecutor(max_workers=config.LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+# Canonical FAQ answers generated ahead of time (see app/precompute.py); probed by the cache branch
+answer_store = AnswerStore(path=config.ANSWER_STORE_PATH)
+
+def merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    """Reducer for per-branch timings: concurrent branches each contribute their own key."""
+    return {**(left or {}), **(right or {})}
 
 class ChatbotState(Dict):
     """
     Represents the state of our chatbot in the LangGraph.
     """
     query: str
-    language: Literal["english", "amharic", "afaan_oromo"]
+    language: Optional[Literal["english", "amharic", "afaan_oromo"]]
+    # Company whose own corpus is searched alongside the shared base corpus (see app/tenants.py)
+    tenant_id: Optional[str] = None
+    # Set by callers that must not be served a precomputed answer (e.g. the precompute job itself)
+    skip_cache: bool = False
+    # Seconds to wait for Gemini before answering extractively (default LLM_LATENCY_BUDGET_SECONDS)
+    latency_budget: Optional[float] = None
+    # Written by embed_query and shared by cache_probe and dense_retrieve
+    query_embedding: Optional[List[float]] = None
+    # Written by the parallel branches, one key per branch
+    cached_question: Optional[str] = None
+    detected_language: Optional[str] = None
+    dense_hits: List[SearchHit] = []
+    lexical_hits: List[LexicalHit] = []
+    branch_timings: Annotated[Dict[str, float], merge_timings] = {}
+    # Written by the merge node
+    cached_response: Optional[str] = None
     context: List[str] = []
+    context_scores: List[float] = []
     response: str = ""
+    # True when the response was extracted from the context because Gemini failed or was too slow
+    fallback: bool = False
 
-def retrieve(state: ChatbotState) -> Dict[str, Any]:
+def timed_branch(name: str):
     """
-    Retrieves relevant documents from the FAISS vector store based on the query.
+    Records a branch's wall time in state["branch_timings"] and accumulates it in metrics
+    (branch_<name>_seconds / branch_<name>_runs), so the slowest branch is visible.
     """
-    logger.info(f"Retrieving context for query: '{state['query']}'")
-    context = faiss_vector_store.search(state["query"], k=3)
-    logger.info(f"Retrieved {len(context)} context chunks.")
-    return {"context": context}
+    def decorator(fn):
+        @functools.wraps(fn)
+        def node(state: ChatbotState) -> Dict[str, Any]:
+            start = time.perf_counter()
+            update = fn(state)
+            elapsed = time.perf_counter() - start
+            metrics.increment(f"branch_{name}_seconds", elapsed)
+            metrics.increment(f"branch_{name}_runs")
+            return {**update, "branch_timings": {name: elapsed}}
+        return node
+    return decorator
 
-def generate(state: ChatbotState) -> Dict[str, Any]:
+@timed_branch("embed_query")
+def embed_query(state: ChatbotState) -> Dict[str, Any]:
     """
-    Generates a response using the LLM based on the query and retrieved context.
+    Embeds the query once for both embedding branches. On failure the branches embed it themselves.
     """
-    logger.info(f"Generating response for query: '{state['query']}' in language: {state['language']}")
-    
-    gemini_lang = get_gemini_language_code(state['language'])
-    
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            ("system", "You are a helpful Rental Management System chatbot. Answer in {language} using the following context. If the question cannot be answered from the context, state that you don't have enough information."),
-            ("human", "Context: {context}\nQuestion: {question}"),
-        ]
-    )
-    
-    rag_chain = prompt_template | llm | StrOutputParser()
-    
     try:
-        response = rag_chain.invoke({
-            "language": gemini_lang,
-            "context": "\n\n".join(state["context"]),
-            "question": state["query"]
-        })
-        logger.info("Response generated successfully.")
-        return {"response": response}
+        return {"query_embedding": embedding_model.embed_query(state["query"])}
     except Exception as e:
-        logger.error(f"Error during LLM generation: {e}")
-        return {"response": "Sorry, I encountered an issue while generating a response. Please try rephrasing your question."}
-
-# Build the LangGraph
-workflow = StateGraph(ChatbotState)
+        logger.error(f"Error embedding query: {e}", exc_info=True)
+        return {"query_embedding": None}
 
-workflow.add_node("retrieve", retrieve)
-workflow.add_node("generate", generate)
-
-workflow.set_entry_point("retrieve")
-workflow.add_edge("retrieve", "generate")
-workflow.add_edge("generate", END)
+@timed_branch("cache_probe")
+def cache_probe(state: ChatbotState) -> Dict[str, Any]:
+    """
+    Looks for a canonical FAQ question the query paraphrases. Exact matches with a known
+    language are already served by the API before the graph runs; this branch catches
+    semantic matches and requests whose language is detected here.
+    """
+    # Precomputed answers come from the base FAQ; a tenant's own policies may differ
+    if state.get("skip_cache") or state.get("tenant_id"):
+        return {"cached_question": None}
+    question = answer_store.match_question(
+        state["query"], config.PRECOMPUTED_MATCH_MIN_SIMILARITY, query_embedding=state.get("query_embedding")
+    )
+    return {"cached_question": question}
 
-chatbot_graph = workflow.compile()
+@timed_branch("detect_language")
+def detect_query_language(state: ChatbotState) -> Dict[str, Any]:
+    """
+    Detects the query language from its script and wording; used when the caller didn't force one.
+    """
+    return {"detected_language": detect_language(state["query"])}
 
-if __name__ == "__main__":
-    # Example usage
-    print("Testing chatbot graph...")
-    
-    # Ensure FAISS is initialized before running the graph
-    _ = faiss_vector_store # Accessing it triggers initialization
-    
-    # Test English query
-    english_query = "What property types can I list?"
-    english_result = chatbot_graph.invoke({"query": english_query, "language": "english"})
-    print(f"\nEnglish Query: {english_query}")
-    print(f"English Response: {english_result['response']}")
+@timed_branch("dense_retrieve")
+def dense_retrieve(state: ChatbotState) -> Dict[str, Any]:
+    """
+    Retrieves relevant documents from the FAISS vector store based on the query.
+    Only hits within the configured distance threshold are kept, with adaptive k by score gap.
+    """
+    logger.info(f"Retrieving context for query: '{state['query']}'")
+    search = faiss_vector_store.search_with_scores
+    if state.get("tenant_id"):
+        search = functools.partial(search_with_tenant, state["tenant_id"])
+    hits = search(
+        state["query"],
+        k=config.RETRIEVAL_K,
+        max_distance=config.RETRIEVAL_MAX_DISTANCE,
+        max_gap=config.RETRIEVAL_MAX_GAP,
+        query_embedding=state.get("query_embedding"),
+    )
+    metrics.increment("retrieval_queries")
+    logger.info(f"Retrieved {len(hits)} dense context chunks.")
+    return {"dense_hits": hits}
 
-    # Test Amharic query
-    amharic_query = "አዲስ ተጠቃሚ እንዴት እመዘገባለሁ?"
-    amharic_result = chatbot_graph.invoke({"query": amharic_query, "language": "amharic"})
-    print(f"\nAmharic Query: {amharic_query}")
-    print(f"Amharic Response: {amharic_result['response']}")
+@timed_branch("lexical_retrieve")
+def lexical_retrieve(state: ChatbotState) -> Dict[str, Any]:
+    """
+    Retrieves chunks by BM25 term matching, for exact terms the embedding model may miss.
+    """
+    search = faiss_vector_store.lexical_search
+    if state.get("tenant_id"):
+        search = functools.partial(lexical_search_with_tenant, state["tenant_id"])
+    hits = search(state["query"], k=config.RETRIEVAL_K, min_score=config.LEXICAL_MIN_SCORE)
+    logger.info(f"Retrieved {len(hits)} lexical context chunks.")
+    return {"lexical_hits": hits}
 
-    # Test Afaan Oromo query
-    afaan_oromo_query = "Sirni Bulchiinsa Kiraayii maali?"
-    afaan_oromo_result = chatbot_graph.invoke({"query": afaan_oromo_query, "language": "afaan_oromo"})
-    print(f"\nAfaan Oromo Query: {afaan_oromo_query}")
-    print(f"Afaan Oromo Response: {afaan_oromo_result['response']}")
+def merge(state: ChatbotState) -> Dict[str, Any]:
+    """
+    Fan-in of the parallel branches: resolves the language, picks up a precomputed answer
+    for the matched canonical question, and fuses dense and lexical rankings with
+    reciprocal rank fusion. Lexical-only chunks have no L2 distance and are scored at
+    the distance threshold.
+    """
+    timings = state.get("branch_timings") or {}
+    if timings:
+        slowest = max(timings, key=timings.get)
+        logger.info(
+            "Branch timings: " + ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in sorted(timings.items()))
+            + f"; critical path {slowest}"
+        )
 
-import os
-from typing import List, Dict, Any, Literal
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from app.vector_store import faiss_vector_store
-from app.config import config
-from app.utils import logger, get_gemini_language_code
+    language = state.get("language") or state.get("detected_language") or "english"
+    cached = None
+    if state.get("cached_question"):
+        cached = answer_store.lookup_exact(state["cached_question"], language)
 
-# Initialize Gemini LLM
-# Use gemini-1.5-flash for faster responses and lower cost
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=config.GOOGLE_API_KEY, temperature=0.2)
+    dense = state.get("dense_hits") or []
+    lexical = state.get("lexical_hits") or []
+    fused = reciprocal_rank_fusion([[hit.doc_id for hit in dense], [hit.doc_id for hit in lexical]], k=config.RRF_K)
+    texts = {hit.doc_id: hit.text for hit in lexical}
+    texts.update((hit.doc_id, hit.text) for hit in dense)
+    distances = {hit.doc_id: hit.distance for hit in dense}
+    selected = [doc_id for doc_id, _ in fused[:config.RETRIEVAL_K]]
+    return {
+        "language": language,
+        "cached_response": cached,
+        "context": [texts[doc_id] for doc_id in selected],
+        "context_scores": [distances.get(doc_id, config.RETRIEVAL_MAX_DISTANCE) for doc_id in selected],
+    }
 
-class ChatbotState(Dict):
+def route_after_merge(state: ChatbotState) -> Literal["serve_cached", "generate", "no_context"]:
     """
-    Represents the state of our chatbot in the LangGraph.
+    Serves a precomputed answer when one matched; otherwise skips the LLM entirely when
+    no chunk passed the relevance thresholds.
     """
-    query: str
-    language: Literal["english", "amharic", "afaan_oromo"]
-    context: List[str] = []
-    response: str = ""
+    if state.get("cached_response"):
+        return "serve_cached"
+    return "generate" if state.get("context") else "no_context"
 
-def retrieve(state: ChatbotState) -> Dict[str, Any]:
-    """
-    Retrieves relevant documents from the FAISS vector store based on the query.
-    """
-    logger.info(f"Retrieving context for query: '{state['query']}'")
-    context = faiss_vector_store.search(state["query"], k=3)
-    logger.info(f"Retrieved {len(context)} context chunks.")
-    return {"context": context}
+def serve_cached(state: ChatbotState) -> Dict[str, Any]:
+    logger.info(f"Serving precomputed answer for paraphrase of '{state['cached_question']}'.")
+    metrics.increment("precomputed_hits")
+    return {"response": state["cached_response"]}
 
-def generate(state: ChatbotState) -> Dict[str, Any]:
+def no_context(state: ChatbotState) -> Dict[str, Any]:
     """
-    Generates a response using the LLM based on the query and retrieved context.
+    Answers out-of-domain queries with a localized "I don't have that information" reply.
     """
-    logger.info(f"Generating response for query: '{state['query']}' in language: {state['language']}")
-    
-    gemini_lang = get_gemini_language_code(state['language'])
-    
+    logger.info(f"No relevant context for query: '{state['query']}'. Skipping LLM call.")
+    metrics.increment("no_context_short_circuits")
+    return {"response": get_no_context_response(state["language"])}
+
+def _invoke_llm(query: str, language: str, context: List[str]) -> str:
+    gemini_lang = get_gemini_language_code(language)
+
     prompt_template = ChatPromptTemplate.from_messages(
         [
             ("system", "You are a helpful Rental Management System chatbot. Answer in {language} using the following context. If the question cannot be answered from the context, state that you don't have enough information."),
             ("human", "Context: {context}\nQuestion: {question}"),
         ]
     )
-    
+
     rag_chain = prompt_template | llm | StrOutputParser()
-    
+
+    return rag_chain.invoke({
+        "language": gemini_lang,
+        "context": "\n\n".join(context),
+        "question": query
+    })
+
+def generate(state: ChatbotState) -> Dict[str, Any]:
+    """
+    Generates a response using the LLM based on the query and retrieved context.
+    If Gemini fails or hasn't answered within the latency budget, answers with the
+    best-matching sentences of the retrieved chunks instead and flags the response as a fallback.
+    """
+    logger.info(f"Generating response for query: '{state['query']}' in language: {state['language']}")
+    budget = state.get("latency_budget") or config.LLM_LATENCY_BUDGET_SECONDS
+
+    future = _llm_executor.submit(_invoke_llm, state["query"], state["language"], state["context"])
     try:
-        response = rag_chain.invoke({
-            "language": gemini_lang,
-            "context": "\n\n".join(state["context"]),
-            "question": state["query"]
-        })
+        response = future.result(timeout=budget)
         logger.info("Response generated successfully.")
         return {"response": response}
+    except FutureTimeoutError:
+        # The call keeps running on its pool thread; its late result is discarded
+        future.cancel()
+        metrics.increment("llm_timeouts")
+        logger.warning(f"LLM did not answer within {budget}s; answering from retrieved context.")
     except Exception as e:
+        metrics.increment("llm_errors")
         logger.error(f"Error during LLM generation: {e}")
+
+    answer = extractive_answer(state["query"], state["language"], state["context"], state.get("context_scores") or [])
+    if answer is None:
         return {"response": "Sorry, I encountered an issue while generating a response. Please try rephrasing your question."}
+    metrics.increment("llm_fallbacks")
+    return {"response": answer, "fallback": True}
 
-# Build the LangGraph
+# Build the LangGraph: the query is embedded once, then independent steps run as concurrent
+# branches and fan in at merge, so the critical path is the slowest branch rather than their sum.
+# (LangGraph runs nodes in lockstep supersteps, so the cheap branches start with the embedding
+# ones rather than alongside embed_query, where they would not shorten the critical path.)
 workflow = StateGraph(ChatbotState)
 
-workflow.add_node("retrieve", retrieve)
-workflow.add_node("generate", generate)
+BRANCHES = {
+    "cache_probe": cache_probe,
+    "detect_language": detect_query_language,
+    "dense_retrieve": dense_retrieve,
+    "lexical_retrieve": lexical_retrieve,
+}
+workflow.add_node("embed_query", embed_query)
+workflow.add_edge(START, "embed_query")
+for name, branch in BRANCHES.items():
+    workflow.add_node(name, branch)
+    workflow.add_edge("embed_query", name)
+workflow.add_node("merge", merge)
+workflow.add_edge(list(BRANCHES), "merge")
 
-workflow.set_entry_point("retrieve")
-workflow.add_edge("retrieve", "generate")
+workflow.add_node("serve_cached", serve_cached)
+workflow.add_node("generate", generate)
+workflow.add_node("no_context", no_context)
+workflow.add_conditional_edges(
+    "merge",
+    route_after_merge,
+    {"serve_cached": "serve_cached", "generate": "generate", "no_context": "no_context"},
+)
+workflow.add_edge("serve_cached", END)
 workflow.add_edge("generate", END)
+workflow.add_edge("no_context", END)
 
 chatbot_graph = workflow.compile()
 
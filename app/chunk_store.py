@@ -0,0 +1,156 @@
+import json
+import mmap
+from array import array
+from collections.abc import Sequence
+from typing import Dict, List, NamedTuple, Union
+
+class ChunkMetadata(NamedTuple):
+    """Metadata recorded for every chunk alongside its text."""
+    source: str
+    section: str
+    language: str
+
+# Largest code each array typecode can hold
+_CODE_LIMITS = {"H": 0xFFFF, "I": 0xFFFFFFFF}
+
+class _CategoricalColumn:
+    """
+    A column of repeated string values stored as small integer codes into a vocabulary.
+    Sources, section titles and languages repeat heavily, so this stays compact. Codes are
+    16-bit and widen to 32-bit once the vocabulary outgrows them.
+    """
+
+    def __init__(self):
+        self.vocabulary: List[str] = []
+        self._lookup: Dict[str, int] = {}
+        self.codes = array("H")
+
+    def append(self, value: str) -> None:
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.vocabulary)
+            if code > _CODE_LIMITS[self.codes.typecode]:
+                self.codes = array("I", self.codes)
+            self.vocabulary.append(value)
+            self._lookup[value] = code
+        self.codes.append(code)
+
+    def __getitem__(self, i: int) -> str:
+        return self.vocabulary[self.codes[i]]
+
+    def values(self) -> List[str]:
+        return [self.vocabulary[code] for code in self.codes]
+
+    def nbytes(self) -> int:
+        return self.codes.itemsize * len(self.codes) + sum(len(v.encode("utf-8")) for v in self.vocabulary)
+
+class MappedTexts(Sequence):
+    """
+    Read-only chunk texts served from a memory-mapped chunks.jsonl file.
+    Only the byte offset of each line is held in memory; a text is decoded when accessed,
+    and its page can be dropped again by the kernel under memory pressure.
+    """
+
+    def __init__(self, path: str, offsets: array):
+        self.path = path
+        self._offsets = offsets  # n + 1 line boundaries
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return json.loads(self._map[self._offsets[i]:self._offsets[i + 1]])["text"]
+
+    def nbytes(self) -> int:
+        """Resident bytes: the offsets only (the texts are file-backed)."""
+        return self._offsets.itemsize * len(self._offsets)
+
+    def mapped_nbytes(self) -> int:
+        """Size of the mapped file: file-backed, resident only for pages that were read."""
+        return len(self._map)
+
+class ChunkStore:
+    """
+    Columnar store of chunk texts and their metadata.
+    Row i of every column describes the chunk at position i of the FAISS index.
+    """
+
+    COLUMNS = ChunkMetadata._fields
+
+    def __init__(self):
+        self.texts: Union[List[str], MappedTexts] = []
+        self._columns: Dict[str, _CategoricalColumn] = {name: _CategoricalColumn() for name in self.COLUMNS}
+
+    def append(self, text: str, source: str, section: str, language: str) -> int:
+        """Adds a chunk and returns its row id."""
+        self.texts.append(text)
+        self._append_metadata(source, section, language)
+        return len(self.texts) - 1
+
+    def _append_metadata(self, source: str, section: str, language: str) -> None:
+        self._columns["source"].append(source)
+        self._columns["section"].append(section)
+        self._columns["language"].append(language)
+
+    @classmethod
+    def read_jsonl(cls, path: str, mmap_texts: bool = False) -> "ChunkStore":
+        """
+        Reads chunks written one JSON object per line ({"text", "source", "section", "language"}).
+        With `mmap_texts` the texts stay in the file (see `MappedTexts`); only metadata is loaded.
+        """
+        store = cls()
+        offsets = array("Q", [0])
+        with open(path, "rb") as f:
+            for line in f:
+                row = json.loads(line)
+                if mmap_texts:
+                    offsets.append(offsets[-1] + len(line))
+                else:
+                    store.texts.append(row["text"])
+                store._append_metadata(
+                    row.get("source", "unknown"), row.get("section", ""), row.get("language", "english")
+                )
+        if mmap_texts and len(offsets) > 1:
+            store.texts = MappedTexts(path, offsets)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i: int) -> str:
+        return self.texts[i]
+
+    def metadata(self, i: int) -> ChunkMetadata:
+        return ChunkMetadata(*(self._columns[name][i] for name in self.COLUMNS))
+
+    def column(self, name: str) -> List[str]:
+        """Returns a full metadata column, e.g. `column("language")`."""
+        return self._columns[name].values()
+
+    def rows_where(self, name: str, value: str) -> List[int]:
+        """Row ids whose metadata column equals `value`."""
+        column = self._columns[name]
+        if value not in column._lookup:
+            return []
+        code = column._lookup[value]
+        return [i for i, c in enumerate(column.codes) if c == code]
+
+    def nbytes(self) -> int:
+        """Approximate payload size: UTF-8 texts plus encoded metadata columns (memory-mapped texts count their offsets)."""
+        if isinstance(self.texts, MappedTexts):
+            text_bytes = self.texts.nbytes()
+        else:
+            text_bytes = sum(len(t.encode("utf-8")) for t in self.texts)
+        return text_bytes + sum(c.nbytes() for c in self._columns.values())
+
+    def mapped_nbytes(self) -> int:
+        """Bytes of chunk texts served from a memory-mapped file (0 when held in memory)."""
+        return self.texts.mapped_nbytes() if isinstance(self.texts, MappedTexts) else 0
@@ -0,0 +1,96 @@
+import re
+from typing import Callable, List, NamedTuple
+
+TokenCounter = Callable[[str], int]
+
+_FAQ_QUESTION = re.compile(r"^Q\d+:\s*(.+)$")
+_BANNER_HEADING = re.compile(r"^=+\s*(.+?)\s*=+$")
+_BOLD_HEADING = re.compile(r"^\*\*(.+?)\*\*:?\s*(.*)$")
+_SENTENCE_END = re.compile(r"(?<=[.!?።])\s+")
+
+class Section(NamedTuple):
+    """A structural unit of a source document: a heading and the lines under it."""
+    title: str
+    lines: List[str]
+
+def split_faq(text: str) -> List[Section]:
+    """
+    Splits FAQ text into one section per question/answer pair.
+    Lines before the first question (the FAQ banner) are dropped.
+    """
+    sections: List[Section] = []
+    for line in (l.strip() for l in text.strip().splitlines()):
+        if not line:
+            continue
+        match = _FAQ_QUESTION.match(line)
+        if match:
+            sections.append(Section(title=match.group(1), lines=[line]))
+        elif sections:
+            sections[-1].lines.append(line)
+    return sections
+
+def split_headed(text: str) -> List[Section]:
+    """
+    Splits a document on `=== Banner ===` and `**Heading**` lines.
+    A bold heading may carry inline content (`**Project Goal**: Build ...`),
+    which stays in its section.
+    """
+    sections: List[Section] = []
+    for line in (l.strip() for l in text.strip().splitlines()):
+        if not line:
+            continue
+        banner = _BANNER_HEADING.match(line)
+        bold = _BOLD_HEADING.match(line)
+        if banner:
+            sections.append(Section(title=banner.group(1), lines=[line]))
+        elif bold:
+            sections.append(Section(title=bold.group(1).strip(), lines=[line]))
+        elif sections:
+            sections[-1].lines.append(line)
+        else:
+            sections.append(Section(title="", lines=[line]))
+    return sections
+
+def _split_long_line(line: str, max_tokens: int, count_tokens: TokenCounter) -> List[str]:
+    """Breaks a single over-budget line at sentence, then word, boundaries."""
+    pieces: List[str] = []
+    current = ""
+    for unit in _SENTENCE_END.split(line):
+        words = [unit] if count_tokens(unit) <= max_tokens else unit.split()
+        for word in words:
+            candidate = f"{current} {word}".strip()
+            if current and count_tokens(candidate) > max_tokens:
+                pieces.append(current)
+                current = word
+            else:
+                current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+def pack_section(section: Section, max_tokens: int, count_tokens: TokenCounter) -> List[str]:
+    """
+    Packs a section into chunks of at most `max_tokens` tokens.
+    Lines (so whole bullets and Q/A lines) are never cut unless a single line is
+    itself over budget. Continuation chunks repeat the heading line for context.
+    """
+    whole = "\n".join(section.lines)
+    if count_tokens(whole) <= max_tokens:
+        return [whole]
+
+    heading = section.lines[0]
+    chunks: List[str] = []
+    current: List[str] = []
+    for line in section.lines:
+        units = [line] if count_tokens(line) <= max_tokens else _split_long_line(line, max_tokens, count_tokens)
+        for unit in units:
+            candidate = "\n".join(current + [unit])
+            if current and count_tokens(candidate) > max_tokens:
+                chunks.append("\n".join(current))
+                prefix = [heading] if heading != unit and count_tokens(f"{heading}\n{unit}") <= max_tokens else []
+                current = prefix + [unit]
+            else:
+                current.append(unit)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
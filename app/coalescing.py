@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.metrics import metrics
+from app.utils import logger
+
+class _Call:
+    """An in-flight execution and the number of callers waiting on it."""
+
+    def __init__(self, task: "asyncio.Task[Any]", interruptible: bool):
+        self.task = task
+        self.interruptible = interruptible
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single execution.
+
+    The first caller for a key starts the work as its own task; callers arriving while it
+    is still running attach to that task and receive the same result or exception.
+    A caller that is cancelled (e.g. the client disconnected) only detaches itself. Once no
+    caller is left waiting, interruptible work is cancelled. Work that cancellation cannot
+    stop (e.g. a thread behind `asyncio.to_thread`) stays registered until it finishes, so a
+    later identical call picks up its result instead of starting a second execution.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], interruptible: bool = True,
+                 on_done: Optional[Callable[[], None]] = None) -> Any:
+        """
+        Runs `fn()` for `key`, or joins the execution already in flight for it.
+        `interruptible` applies to an execution this call starts. `on_done` is called when the
+        execution this caller attached to has finished, even if the caller stopped waiting earlier.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()), interruptible)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            metrics.increment(f"{self.name}_executions")
+        else:
+            logger.info(f"Coalescing request onto in-flight execution for key {key!r}.")
+            metrics.increment(f"{self.name}_coalesced")
+        if on_done is not None:
+            call.task.add_done_callback(lambda _: on_done())
+
+        call.waiters += 1
+        try:
+            # shield() keeps one caller's cancellation from cancelling the shared task
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and call.interruptible and not call.task.done():
+                # Nobody is waiting any more; stop the work and let new callers start afresh
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
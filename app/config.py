@@ -8,4 +8,44 @@ class Config:
     if not GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY environment variable not set.")
 
+    # Retrieval: embeddings are L2-normalized, so squared L2 distances lie in [0, 4]
+    RETRIEVAL_K: int = int(os.getenv("RETRIEVAL_K", "3"))
+    # Hits farther than this are treated as irrelevant; if none pass, the LLM call is skipped
+    RETRIEVAL_MAX_DISTANCE: float = float(os.getenv("RETRIEVAL_MAX_DISTANCE", "1.3"))
+    # Adaptive k: stop adding hits once the distance jumps by more than this from the previous hit
+    RETRIEVAL_MAX_GAP: float = float(os.getenv("RETRIEVAL_MAX_GAP", "0.25"))
+    # Lexical (BM25) branch: matches scoring below this are ignored, so stray common words
+    # in out-of-domain queries can't bring back context the dense threshold rejected
+    LEXICAL_MIN_SCORE: float = float(os.getenv("LEXICAL_MIN_SCORE", "4.0"))
+    # Reciprocal rank fusion constant for merging dense and lexical rankings
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+
+    # Seconds to wait for Gemini before answering from the retrieved chunks (extractive fallback)
+    LLM_LATENCY_BUDGET_SECONDS: float = float(os.getenv("LLM_LATENCY_BUDGET_SECONDS", "8.0"))
+    # Concurrent Gemini calls, including overrunning ones still finishing in the background
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+    # Shared secret of the HS256 bearer tokens issued by the rental platform; tokens carry a "role"
+    # claim. Without it no request is treated as authenticated.
+    AUTH_TOKEN_SECRET: str = os.getenv("AUTH_TOKEN_SECRET", "")
+
+    # Admission control for /chat: bounded concurrency, short priority queue, fast 429/503
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2.0"))
+    ADMISSION_TARGET_QUEUE_DELAY_SECONDS: float = float(os.getenv("ADMISSION_TARGET_QUEUE_DELAY_SECONDS", "0.5"))
+
+    # Scheduled precomputation of canonical FAQ answers in all supported languages
+    PRECOMPUTE_ENABLED: bool = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+    ANSWER_STORE_PATH: str = os.getenv("ANSWER_STORE_PATH", "data/precomputed_answers.json")
+    PRECOMPUTE_INTERVAL_HOURS: float = float(os.getenv("PRECOMPUTE_INTERVAL_HOURS", "24"))
+    # Minimum spacing between Gemini calls made by the background job
+    PRECOMPUTE_MIN_INTERVAL_SECONDS: float = float(os.getenv("PRECOMPUTE_MIN_INTERVAL_SECONDS", "5"))
+    # Cosine similarity a query needs to a canonical question to be served its precomputed answer
+    PRECOMPUTED_MATCH_MIN_SIMILARITY: float = float(os.getenv("PRECOMPUTED_MATCH_MIN_SIMILARITY", "0.9"))
+    # The background job isn't latency-bound, so it waits longer for Gemini than live requests
+    PRECOMPUTE_LATENCY_BUDGET_SECONDS: float = float(os.getenv("PRECOMPUTE_LATENCY_BUDGET_SECONDS", "60"))
+    # Precomputed answers kept serialized and precompressed (gzip, and brotli if installed) for direct serving
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
 config = Config()
@@ -0,0 +1,297 @@
+import os
+import queue
+import select
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import BinaryIO, Callable, List, Optional, Sequence
+
+import numpy as np
+
+from app.metrics import metrics
+from app.utils import logger
+
+# Wire protocol between the web process and an embedding worker (integers are little-endian uint32):
+#   request:  count, then `count` times (byte length, UTF-8 text)
+#   response: status=OK, rows, dim, then rows * dim little-endian float32 values
+#             status=ERROR, 0, length, then a UTF-8 error message
+# Once its model is loaded, the worker announces itself with an empty OK response (rows=0, dim=model dimension).
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_U32 = struct.Struct("<I")
+_HEADER = struct.Struct("<III")
+_FLOAT32 = np.dtype("<f4")
+
+Reader = Callable[[int], bytes]
+
+class EmbeddingWorkerError(RuntimeError):
+    """The worker process died, closed its pipe or sent a malformed response."""
+
+class EmbeddingWorkerTimeout(EmbeddingWorkerError):
+    """The worker did not answer within the timeout."""
+
+class RemoteEncodeError(EmbeddingWorkerError):
+    """The worker is healthy but encoding the batch raised; the message is the remote error."""
+
+def encode_request(texts: Sequence[str]) -> bytes:
+    parts = [_U32.pack(len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_U32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+def decode_request(read: Reader) -> Optional[List[str]]:
+    """Reads one request; returns None if the stream ended cleanly before it started."""
+    head = read(_U32.size)
+    if not head:
+        return None
+    (count,) = _U32.unpack(_exact(head, _U32.size))
+    texts = []
+    for _ in range(count):
+        (length,) = _U32.unpack(_exact(read(_U32.size), _U32.size))
+        texts.append(_exact(read(length), length).decode("utf-8"))
+    return texts
+
+def encode_response(vectors: np.ndarray) -> bytes:
+    vectors = np.ascontiguousarray(vectors, dtype=_FLOAT32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(len(vectors), -1)
+    rows, dim = vectors.shape
+    return _HEADER.pack(STATUS_OK, rows, dim) + vectors.tobytes()
+
+def encode_error(message: str) -> bytes:
+    data = message.encode("utf-8")
+    return _HEADER.pack(STATUS_ERROR, 0, len(data)) + data
+
+def decode_response(read: Reader) -> np.ndarray:
+    status, rows, dim = _HEADER.unpack(_exact(read(_HEADER.size), _HEADER.size))
+    if status == STATUS_ERROR:
+        raise RemoteEncodeError(_exact(read(dim), dim).decode("utf-8", errors="replace"))
+    if status != STATUS_OK:
+        raise EmbeddingWorkerError(f"Unknown response status {status}.")
+    size = rows * dim * _FLOAT32.itemsize
+    return np.frombuffer(_exact(read(size), size), dtype=_FLOAT32).reshape(rows, dim).astype("float32")
+
+def _exact(data: bytes, size: int) -> bytes:
+    if len(data) != size:
+        raise EmbeddingWorkerError(f"Stream ended after {len(data)} of {size} bytes.")
+    return data
+
+def _stream_reader(stream: BinaryIO) -> Reader:
+    def read(size: int) -> bytes:
+        chunks, remaining = [], size
+        while remaining:
+            chunk = stream.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+    return read
+
+def serve(in_stream: BinaryIO, out_stream: BinaryIO, encode_fn: Callable[[List[str]], np.ndarray],
+          ready_dim: Optional[int] = None) -> None:
+    """
+    Answers requests from `in_stream` on `out_stream` until the input is closed.
+    Encoding errors are reported to the client; the loop keeps serving.
+    """
+    read = _stream_reader(in_stream)
+    if ready_dim is not None:
+        out_stream.write(_HEADER.pack(STATUS_OK, 0, ready_dim))
+        out_stream.flush()
+    while True:
+        texts = decode_request(read)
+        if texts is None:
+            return
+        try:
+            payload = encode_response(encode_fn(texts) if texts else np.zeros((0, 0), dtype="float32"))
+        except Exception as e:
+            logger.error(f"Embedding worker failed to encode {len(texts)} texts: {e}")
+            payload = encode_error(f"{type(e).__name__}: {e}")
+        out_stream.write(payload)
+        out_stream.flush()
+
+class _WorkerProcess:
+    """One worker subprocess and the client side of its pipes."""
+
+    def __init__(self, command: List[str], env: dict, cwd: str):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, cwd=cwd)
+        self._stdout_fd = self.process.stdout.fileno()
+        self.dim: Optional[int] = None
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _reader(self, timeout: float) -> Reader:
+        deadline = time.monotonic() + timeout
+
+        def read(size: int) -> bytes:
+            chunks, remaining = [], size
+            while remaining:
+                wait = deadline - time.monotonic()
+                ready, _, _ = select.select([self._stdout_fd], [], [], max(0.0, wait))
+                if not ready:
+                    raise EmbeddingWorkerTimeout(f"Embedding worker {self.pid} did not answer within {timeout}s.")
+                chunk = os.read(self._stdout_fd, remaining)
+                if not chunk:
+                    raise EmbeddingWorkerError(f"Embedding worker {self.pid} exited (code {self.process.poll()}).")
+                chunks.append(chunk)
+                remaining -= len(chunk)
+            return b"".join(chunks)
+        return read
+
+    def wait_ready(self, timeout: float) -> None:
+        self.dim = decode_response(self._reader(timeout)).shape[1]
+
+    def request(self, texts: Sequence[str], timeout: float) -> np.ndarray:
+        try:
+            self.process.stdin.write(encode_request(texts))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise EmbeddingWorkerError(f"Embedding worker {self.pid} is gone: {e}") from e
+        return decode_response(self._reader(timeout))
+
+    def kill(self) -> None:
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+class EmbeddingWorkerPool:
+    """
+    A small pool of embedding worker subprocesses, so torch inference runs outside the
+    web process and never competes with the event loop for the GIL.
+
+    Each call borrows an idle worker. Workers start lazily and are restarted automatically:
+    if one dies mid-request the request is retried once on a fresh worker, and a worker
+    that exceeds `timeout` is killed (its slot restarts on next use) and the call fails fast.
+    """
+
+    def __init__(self, size: int = 1, timeout: float = 10.0, startup_timeout: float = 120.0,
+                 command: Optional[List[str]] = None, threads_per_worker: Optional[int] = None):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.command = command or [sys.executable, "-m", "app.embedding_worker"]
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.size)
+        self._idle: "queue.Queue[Optional[_WorkerProcess]]" = queue.Queue()
+        self._all: List[_WorkerProcess] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            self._idle.put(None)  # an empty slot; its worker is started on first use
+
+    def _start_worker(self) -> _WorkerProcess:
+        env = dict(os.environ)
+        env["EMBEDDING_WORKER_MODE"] = "inprocess"  # the worker itself embeds locally
+        env["EMBEDDING_WORKER_THREADS"] = str(self.threads_per_worker)
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        worker = _WorkerProcess(self.command, env, cwd)
+        try:
+            worker.wait_ready(self.startup_timeout)
+        except Exception:
+            worker.kill()
+            raise
+        with self._lock:
+            self._all.append(worker)
+        logger.info(f"Embedding worker {worker.pid} ready (dim={worker.dim}, threads={self.threads_per_worker}).")
+        return worker
+
+    def _discard(self, worker: Optional[_WorkerProcess]) -> None:
+        if worker is None:
+            return
+        worker.kill()
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Returns an (n, d) float32 array of normalized embeddings for `texts`."""
+        if self._closed:
+            raise EmbeddingWorkerError("Embedding worker pool is shut down.")
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise EmbeddingWorkerTimeout(f"No embedding worker became free within {self.timeout}s.")
+
+        try:
+            for attempt in range(2):
+                if worker is None or not worker.alive():
+                    if worker is not None:
+                        metrics.increment("embedding_worker_restarts")
+                        logger.warning(f"Embedding worker {worker.pid} died; restarting.")
+                    self._discard(worker)
+                    worker = None  # keeps the slot empty if the restart itself fails
+                    worker = self._start_worker()
+                try:
+                    return worker.request(texts, self.timeout)
+                except RemoteEncodeError:
+                    raise
+                except EmbeddingWorkerTimeout:
+                    metrics.increment("embedding_worker_timeouts")
+                    logger.error(f"Embedding worker {worker.pid} timed out; killing it.")
+                    self._discard(worker)
+                    worker = None
+                    raise
+                except EmbeddingWorkerError as e:
+                    # The pipe broke; the process may not be reaped yet, so don't trust alive()
+                    metrics.increment("embedding_worker_restarts")
+                    self._discard(worker)
+                    worker = None
+                    if attempt == 1:
+                        raise
+                    logger.warning(f"{e} Retrying on a fresh worker.")
+        finally:
+            self._idle.put(worker)
+
+    def pids(self) -> List[int]:
+        with self._lock:
+            return [worker.pid for worker in self._all if worker.alive()]
+
+    def shutdown(self) -> None:
+        """Stops all workers. Closing a worker's stdin also makes it exit on its own."""
+        self._closed = True
+        with self._lock:
+            workers, self._all = self._all, []
+        for worker in workers:
+            worker.kill()
+
+def main() -> None:
+    # The protocol owns the original stdout; anything libraries print goes to stderr instead
+    out_stream = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    # Ctrl-C in the server's terminal reaches the whole process group; exit on stdin EOF instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    threads = int(os.getenv("EMBEDDING_WORKER_THREADS", "0"))
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+    from app.knowledge_base import MultilingualEmbeddings
+
+    model = MultilingualEmbeddings.get_embedding_model()
+    serve(
+        sys.stdin.buffer,
+        out_stream,
+        lambda texts: model.encode(texts, normalize_embeddings=True),
+        ready_dim=model.get_sentence_embedding_dimension(),
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import time
+import statistics
+import numpy as np
+from typing import List, Dict, Any, Callable, Iterable, NamedTuple, Optional, Tuple
+
+from app.utils import logger
+
+class GoldQuery(NamedTuple):
+    """
+    A labelled evaluation query.
+    `anchors` are phrases that only occur in the expected chunk(s) of FAQ_TEXT or
+    DOCX_SUMMARY_TEXT, so the labels stay valid whatever chunking is in use.
+    """
+    query: str
+    language: str
+    anchors: Tuple[str, ...]
+
+SearchFn = Callable[[str, int], List[str]]
+
+# Each topic is asked in English, Amharic and Afaan Oromo and points at the same chunk(s).
+_GOLD_TOPICS: List[Tuple[Tuple[str, ...], Dict[str, str]]] = [
+    (("Q1:",), {
+        "english": "What kinds of properties can I list or search for?",
+        "amharic": "ምን አይነት ንብረቶችን መዘርዘር ወይም መፈለግ እችላለሁ?",
+        "afaan_oromo": "Gosa qabeenyaa akkamii galmeessuu ykn barbaaduu danda'a?",
+    }),
+    (("Q2:",), {
+        "english": "How do I sign up for a new account?",
+        "amharic": "አዲስ ተጠቃሚ እንዴት መመዝገብ እችላለሁ?",
+        "afaan_oromo": "Akkamittan akka fayyadamaa haaraatti galmaa'a?",
+    }),
+    (("Q3:",), {
+        "english": "Can one account manage several properties?",
+        "amharic": "በአንድ መለያ ብዙ ንብረቶችን ማስተዳደር እችላለሁ?",
+        "afaan_oromo": "Herrega tokkoon qabeenya hedduu bulchuu nan danda'aa?",
+    }),
+    (("Q4:",), {
+        "english": "Which payment methods do you accept for rent?",
+        "amharic": "ለኪራይ ምን አይነት የክፍያ ዘዴዎችን ትቀበላላችሁ?",
+        "afaan_oromo": "Kiraaf mala kaffaltii akkamii fudhattu?",
+    }),
+    (("Q5:",), {
+        "english": "Do I have to pay a fee to list my property?",
+        "amharic": "ንብረት ለመዘርዘር ክፍያ አለ?",
+        "afaan_oromo": "Qabeenya galmeessuuf kaffaltiin jiraa?",
+    }),
+    (("Q6:",), {
+        "english": "How can I reach customer support?",
+        "amharic": "የደንበኞች አገልግሎትን እንዴት ማግኘት እችላለሁ?",
+        "afaan_oromo": "Tajaajila maamiltootaa akkamittan qunnamuu danda'a?",
+    }),
+    (("Q7:",), {
+        "english": "I forgot my password, what should I do?",
+        "amharic": "የይለፍ ቃሌን ረሳሁ፣ ምን ማድረግ አለብኝ?",
+        "afaan_oromo": "Jecha icciitii koo irraanfadheera, maal gochuu qaba?",
+    }),
+    (("Q10:",), {
+        "english": "Can I get alerts for new listings that match my search?",
+        "amharic": "ፍለጋዬን ለሚያሟሉ አዳዲስ ንብረቶች ማሳወቂያ ማግኘት እችላለሁ?",
+        "afaan_oromo": "Beeksisa qabeenya haaraa barbaacha koo wajjin walsimu argachuu nan danda'aa?",
+    }),
+    (("Unity University",), {
+        "english": "Who developed the Rental Management System?",
+        "amharic": "የኪራይ አስተዳደር ስርዓቱን ያዘጋጁት እነማን ናቸው?",
+        "afaan_oromo": "Sirna Bulchiinsa Kiraayii eenyutu hojjete?",
+    }),
+    (("Pay-per-post",), {
+        "english": "Do landlords pay a monthly subscription?",
+        "amharic": "አከራዮች ወርሃዊ የደንበኝነት ክፍያ ይከፍላሉ?",
+        "afaan_oromo": "Abbootiin manaa kaffaltii ji'aa ni kaffaluu?",
+    }),
+    (("Technology Stack",), {
+        "english": "What technologies is the platform built with?",
+        "amharic": "መድረኩ በምን ቴክኖሎጂዎች ተገንብቷል?",
+        "afaan_oromo": "Waltajjiin kun teknooloojii akkamiitiin ijaarame?",
+    }),
+    (("Rent payments are offline",), {
+        "english": "Can I pay my rent online yet?",
+        "amharic": "ኪራዬን በመስመር ላይ መክፈል እችላለሁ?",
+        "afaan_oromo": "Kiraa koo toora interneetiin kaffaluu nan danda'aa?",
+    }),
+    (("Three Simple Steps",), {
+        "english": "What are the steps for tenants to find a home?",
+        "amharic": "ተከራዮች ቤት ለማግኘት ምን እርምጃዎችን ይከተላሉ?",
+        "afaan_oromo": "Kireeffattoonni mana argachuuf tarkaanfii akkamii hordofu?",
+    }),
+    (("Chapter 2",), {
+        "english": "What are the objectives of the project?",
+        "amharic": "የፕሮጀክቱ ዓላማዎች ምንድን ናቸው?",
+        "afaan_oromo": "Kaayyoon pirojektichaa maali?",
+    }),
+]
+
+GOLD_QUERIES: List[GoldQuery] = [
+    GoldQuery(query=query, language=language, anchors=anchors)
+    for anchors, queries in _GOLD_TOPICS
+    for language, query in queries.items()
+]
+
+# Queries the knowledge base cannot answer; a well-tuned threshold returns nothing for them.
+OUT_OF_DOMAIN_QUERIES: List[GoldQuery] = [
+    GoldQuery("What's the weather like in Addis Ababa today?", "english", ()),
+    GoldQuery("Who won the football match last night?", "english", ()),
+    GoldQuery("ዛሬ የአየር ሁኔታው እንዴት ነው?", "amharic", ()),
+    GoldQuery("ትናንት ማታ የእግር ኳስ ጨዋታውን ማን አሸነፈ?", "amharic", ()),
+    GoldQuery("Har'a haalli qilleensaa akkam?", "afaan_oromo", ()),
+    GoldQuery("Tapha kubbaa miilaa kaleessaa eenyutu mo'ate?", "afaan_oromo", ()),
+]
+
+def is_relevant(chunk: str, anchors: Iterable[str]) -> bool:
+    """A chunk is relevant to a gold query if it contains any of its anchors."""
+    return any(anchor in chunk for anchor in anchors)
+
+def first_relevant_rank(results: List[str], anchors: Iterable[str]) -> Optional[int]:
+    """Returns the 1-based rank of the first relevant result, or None if there is none."""
+    anchors = tuple(anchors)
+    for rank, chunk in enumerate(results, start=1):
+        if is_relevant(chunk, anchors):
+            return rank
+    return None
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def _summarize(rows: List[Dict[str, Any]], k: int) -> Dict[str, Any]:
+    latencies = [row["latency_ms"] for row in rows]
+    return {
+        "queries": len(rows),
+        f"recall@{k}": sum(1 for row in rows if row["rank"] is not None) / len(rows) if rows else 0.0,
+        "mrr": sum(1.0 / row["rank"] for row in rows if row["rank"] is not None) / len(rows) if rows else 0.0,
+        "latency_ms_mean": statistics.fmean(latencies) if latencies else 0.0,
+        "latency_ms_p50": _percentile(latencies, 50),
+        "latency_ms_p95": _percentile(latencies, 95),
+        "latency_ms_max": max(latencies) if latencies else 0.0,
+    }
+
+def evaluate_retrieval(search: SearchFn, k: int = 3, queries: Optional[List[GoldQuery]] = None, warmup: bool = True) -> Dict[str, Any]:
+    """
+    Runs every gold query through `search(query, k)` and reports relevance and latency together.
+
+    recall@k is the fraction of queries with at least one expected chunk in the top-k results,
+    MRR is the mean reciprocal rank of the first expected chunk (0 when it is missing).
+    Both are reported overall and per language, alongside per-query latency.
+    """
+    queries = GOLD_QUERIES if queries is None else queries
+    if warmup and queries:
+        # Keep lazy model/index loading out of the latency numbers.
+        search(queries[0].query, k)
+
+    rows: List[Dict[str, Any]] = []
+    for gold in queries:
+        start = time.perf_counter()
+        results = search(gold.query, k)
+        latency_ms = (time.perf_counter() - start) * 1000
+        rank = first_relevant_rank(results[:k], gold.anchors)
+        rows.append({
+            "query": gold.query,
+            "language": gold.language,
+            "rank": rank,
+            "latency_ms": latency_ms,
+        })
+
+    by_language = {}
+    for language in sorted({row["language"] for row in rows}):
+        by_language[language] = _summarize([row for row in rows if row["language"] == language], k)
+
+    return {
+        "k": k,
+        "overall": _summarize(rows, k),
+        "by_language": by_language,
+        "per_query": rows,
+    }
+
+def evaluate_out_of_domain(search: SearchFn, k: int = 3, queries: Optional[List[GoldQuery]] = None) -> Dict[str, Any]:
+    """
+    Measures how often out-of-domain queries come back empty (i.e. would skip the LLM call),
+    and how often in-domain gold queries are wrongly emptied by the same configuration.
+    """
+    queries = OUT_OF_DOMAIN_QUERIES if queries is None else queries
+    rejected = sum(1 for gold in queries if not search(gold.query, k))
+    false_rejects = sum(1 for gold in GOLD_QUERIES if not search(gold.query, k))
+    return {
+        "k": k,
+        "out_of_domain_rejection_rate": rejected / len(queries) if queries else 0.0,
+        "in_domain_false_rejection_rate": false_rejects / len(GOLD_QUERIES),
+    }
+
+def compression_report(documents, embeddings, k: int = 3, encodings: Optional[List[str]] = None,
+                       rescore_factor: int = 4) -> List[Dict[str, Any]]:
+    """
+    Builds one standalone store per vector encoding over the same chunks and embeddings,
+    and reports memory per vector (codes and rescoring vectors) and resident memory next
+    to recall@k, MRR, latency and top-k agreement with the exact float32 index.
+    """
+    from app.quantization import ENCODINGS
+    from app.vector_store import FAISSVectorStore
+
+    encodings = encodings or list(ENCODINGS)
+    embeddings = np.asarray(embeddings, dtype="float32")
+    reference = FAISSVectorStore.from_documents(documents, encoding="float32", embeddings=embeddings)
+    rows = []
+    for encoding in encodings:
+        store = FAISSVectorStore.from_documents(documents, encoding=encoding, rescore_factor=rescore_factor, embeddings=embeddings)
+        report = evaluate_retrieval(store_search(store), k=k)
+        agreement = statistics.fmean(
+            len(set(store.search(gold.query, k=k)) & set(reference.search(gold.query, k=k))) / k
+            for gold in GOLD_QUERIES
+        )
+        memory = store.memory_usage()
+        rows.append({
+            "encoding": encoding,
+            # Codes plus the float32 rescoring vectors, wherever they live
+            "bytes_per_vector": (memory["code_bytes"] + memory["rescore_bytes"]) / len(embeddings),
+            "resident_mb_per_million": memory["resident_bytes"] / len(embeddings) * 1e6 / 2**20,
+            f"recall@{k}": report["overall"][f"recall@{k}"],
+            "mrr": report["overall"]["mrr"],
+            "latency_ms_p50": report["overall"]["latency_ms_p50"],
+            f"agreement@{k}": agreement,
+        })
+    return rows
+
+def format_compression_report(rows: List[Dict[str, Any]], k: int) -> str:
+    lines = [f"{'encoding':<10}{'B/vec':>8}{'MB/1M':>9}{f'recall@{k}':>11}{'mrr':>8}{'p50 ms':>9}{f'agree@{k}':>10}"]
+    for row in rows:
+        lines.append(
+            f"{row['encoding']:<10}{row['bytes_per_vector']:>8.0f}{row['resident_mb_per_million']:>9.0f}"
+            f"{row[f'recall@{k}']:>11.3f}{row['mrr']:>8.3f}{row['latency_ms_p50']:>9.2f}{row[f'agreement@{k}']:>10.3f}"
+        )
+    return "\n".join(lines)
+
+def store_search(store, **search_kwargs) -> SearchFn:
+    """Adapts a FAISSVectorStore (or anything with a compatible `search`) to a SearchFn."""
+    def _search(query: str, k: int) -> List[str]:
+        return store.search(query, k=k, **search_kwargs)
+    return _search
+
+def format_report(report: Dict[str, Any], label: str = "") -> str:
+    """Renders an evaluation report as a small plain-text table."""
+    k = report["k"]
+    header = f"{'slice':<14}{'n':>4}{f'recall@{k}':>11}{'mrr':>8}{'p50 ms':>9}{'p95 ms':>9}"
+    lines = [f"== {label} (k={k}) ==" if label else f"== k={k} ==", header]
+    slices = [("overall", report["overall"])] + list(report["by_language"].items())
+    for name, summary in slices:
+        lines.append(
+            f"{name:<14}{summary['queries']:>4}{summary[f'recall@{k}']:>11.3f}{summary['mrr']:>8.3f}"
+            f"{summary['latency_ms_p50']:>9.2f}{summary['latency_ms_p95']:>9.2f}"
+        )
+    misses = [row for row in report["per_query"] if row["rank"] is None]
+    if misses:
+        lines.append("misses:")
+        lines.extend(f"  [{row['language']}] {row['query']}" for row in misses)
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate FAISS retrieval against the multilingual gold set.")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Cut-offs to evaluate.")
+    parser.add_argument("--compare-character-chunks", action="store_true",
+                        help="Also evaluate the old 500-character CharacterTextSplitter chunking.")
+    parser.add_argument("--compression", action="store_true",
+                        help="Report memory versus recall for float32, float16, int8 and binary vector encodings.")
+    args = parser.parse_args()
+
+    from app.config import config
+    from app.vector_store import faiss_vector_store
+
+    logger.info(f"Evaluating {len(GOLD_QUERIES)} gold queries.")
+    for k in args.k:
+        print(format_report(evaluate_retrieval(store_search(faiss_vector_store), k=k), label="default store"))
+        print()
+
+    if args.compare_character_chunks:
+        from langchain_text_splitters import CharacterTextSplitter
+        from app import knowledge_base as kb
+        from app.vector_store import FAISSVectorStore
+
+        combined_text = "\n\n".join([
+            " ".join(kb.AMHARIC_TRANSLATION_JSON.values()),
+            " ".join(kb.ENGLISH_TRANSLATION_JSON.values()),
+            " ".join(kb.AFAAN_OROMO_TRANSLATION_JSON.values()),
+            kb.FAQ_TEXT,
+            kb.DOCX_SUMMARY_TEXT,
+        ])
+        splitter = CharacterTextSplitter(separator="\n\n", chunk_size=500, chunk_overlap=50)
+        legacy_store = FAISSVectorStore.from_documents(splitter.split_text(combined_text))
+        for k in args.k:
+            print(format_report(evaluate_retrieval(store_search(legacy_store), k=k), label="character chunks"))
+            print()
+
+    if args.compression:
+        from app.knowledge_base import load_chunk_store, embedding_model
+
+        chunks = load_chunk_store()
+        chunk_embeddings = embedding_model.embed_documents(chunks.texts)
+        for k in args.k:
+            print(format_compression_report(compression_report(chunks, chunk_embeddings, k=k), k=k))
+            print()
+
+    thresholded = store_search(faiss_vector_store, max_distance=config.RETRIEVAL_MAX_DISTANCE, max_gap=config.RETRIEVAL_MAX_GAP)
+    print(format_report(evaluate_retrieval(thresholded, k=config.RETRIEVAL_K), label="thresholded store"))
+    print(evaluate_out_of_domain(thresholded, k=config.RETRIEVAL_K))
@@ -0,0 +1,92 @@
+import re
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence
+
+from app.lexical import tokenize
+from app.utils import detect_language
+
+# Lead-in telling the user this is an excerpt from the documents rather than a generated answer
+FALLBACK_PREFIXES: Dict[Literal["english", "amharic", "afaan_oromo"], str] = {
+    "english": "Here is what our help documents say:",
+    "amharic": "በእገዛ ሰነዶቻችን ውስጥ ያለው መረጃ ይህ ነው፦",
+    "afaan_oromo": "Galmeewwan gargaarsaa keenya keessatti kan argamu kana:",
+}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?።])\s+|\n+")
+_LABEL = re.compile(r"^(?:[QA]\d+:|\*\*[^*]+\*\*:?|[•*-])\s*")
+_BANNER = re.compile(r"^=+.*=+$")
+
+class ScoredSentence(NamedTuple):
+    score: float
+    chunk_rank: int
+    position: int
+    text: str
+
+def split_sentences(chunk: str) -> List[str]:
+    """Splits a chunk into answer sentences, dropping questions, section banners and Q/A labels."""
+    sentences = []
+    for raw in _SENTENCE_END.split(chunk):
+        sentence = raw.strip()
+        if not sentence or _BANNER.match(sentence):
+            continue
+        sentence = _LABEL.sub("", sentence).replace("**", "").strip()
+        if len(sentence) < 3 or sentence.endswith("?"):
+            continue
+        sentences.append(sentence)
+    return sentences
+
+def score_sentences(query: str, context: Sequence[str], context_scores: Sequence[float]) -> List[ScoredSentence]:
+    """
+    Scores each sentence by the relevance of its chunk (cosine similarity recovered from the
+    squared L2 distance of normalized embeddings: cos = 1 - d / 2) plus the fraction of query
+    terms it contains, with a small bonus for sentences early in their chunk.
+    """
+    query_terms = set(tokenize(query))
+    scored = []
+    for rank, chunk in enumerate(context):
+        distance = context_scores[rank] if rank < len(context_scores) else 2.0
+        relevance = max(0.0, 1.0 - distance / 2.0)
+        for position, sentence in enumerate(split_sentences(chunk)):
+            overlap = len(query_terms & set(tokenize(sentence))) / len(query_terms) if query_terms else 0.0
+            score = relevance + overlap + 0.1 / (1 + position)
+            scored.append(ScoredSentence(score, rank, position, sentence))
+    return scored
+
+def extractive_answer(query: str, language: str, context: Sequence[str], context_scores: Sequence[float],
+                      max_sentences: int = 3, max_chars: int = 600, min_relative_score: float = 0.6) -> Optional[str]:
+    """
+    Builds an answer from the best-matching sentences of the retrieved chunks, preferring
+    sentences in the query's language. Sentences scoring below `min_relative_score` times
+    the best score are dropped; the rest are shown in document order.
+    Returns None when the chunks contain no usable sentence.
+    """
+    # Over-long "sentences" are unpunctuated word lists (e.g. UI translation strings), not answers
+    scored = [sentence for sentence in score_sentences(query, context, context_scores) if len(sentence.text) <= max_chars]
+    if not scored:
+        return None
+    best = max(sentence.score for sentence in scored)
+    strong = [sentence for sentence in scored if sentence.score >= min_relative_score * best]
+    in_language = [sentence for sentence in strong if detect_language(sentence.text) == language]
+    # The FAQ and project documents are English; other languages fall back to English excerpts
+    candidates = in_language or strong
+
+    selected: List[ScoredSentence] = []
+    seen = set()
+    length = 0
+    for sentence in sorted(candidates, key=lambda s: -s.score):
+        if sentence.text in seen or (selected and length + len(sentence.text) > max_chars):
+            continue
+        selected.append(sentence)
+        seen.add(sentence.text)
+        length += len(sentence.text)
+        if len(selected) == max_sentences:
+            break
+
+    selected.sort(key=lambda s: (s.chunk_rank, s.position))
+    prefix = FALLBACK_PREFIXES.get(language, FALLBACK_PREFIXES["english"])
+    return prefix + "\n" + " ".join(_terminate(sentence.text) for sentence in selected)
+
+def _terminate(sentence: str) -> str:
+    """Bullet items have no final punctuation; add it so joined excerpts read as sentences."""
+    if sentence[-1] in ".!?።":
+        return sentence
+    return sentence + ("።" if detect_language(sentence) == "amharic" else ".")
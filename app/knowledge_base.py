@@ -1,9 +1,14 @@
 import json
-from typing import List
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from sentence_transformers import SentenceTransformer
+from typing import List, Optional
 import os
+import threading
+import time
+from app.chunk_store import ChunkStore
+from app.chunking import Section, TokenCounter, pack_section, split_faq, split_headed
+from app.embedding_worker import EmbeddingWorkerPool
+from app.memory import limit_threads, low_memory_enabled, release_memory, thread_limit
+from app.metrics import metrics
+from app.utils import logger
 
 # Hardcoded knowledge base content
 # --- translation.json (Amharic) ---
@@ -208,66 +213,196 @@ Specific:
 
 This platform is built with love by five Ethiopian developers to make renting simple, fair, and accessible for everyone."""
 
-def load_and_split_documents() -> List[str]:
+# (source, language, text) for the translation dictionaries; each becomes one chunk
+_TRANSLATION_SOURCES = [
+    ("translation.json", "amharic", AMHARIC_TRANSLATION_JSON),
+    ("translation copy.json", "english", ENGLISH_TRANSLATION_JSON),
+    ("translation copy 2.json", "afaan_oromo", AFAAN_OROMO_TRANSLATION_JSON),
+]
+
+def _default_token_counter() -> TokenCounter:
     """
-    Loads the hardcoded documents, extracts relevant text, and splits them into chunks.
+    Counts tokens with the embedding model's own tokenizer, so chunks never exceed what the
+    model actually embeds. The count includes the special tokens (<s>, </s>) the model adds to
+    every input, since they share max_seq_length. Character counts badly undercount Ge'ez-script text.
     """
-    all_texts = []
+    try:
+        tokenizer = MultilingualEmbeddings.get_tokenizer()
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable ({e}); falling back to an approximate token count.")
+        return approximate_token_count
+    return lambda text: len(tokenizer(text, add_special_tokens=True, verbose=False)["input_ids"])
+
+def approximate_token_count(text: str) -> int:
+    """
+    Rough subword estimate used only when the tokenizer cannot be loaded:
+    Ge'ez syllables are about one token each, Latin text about four characters per token.
+    """
+    geez = sum(1 for ch in text if "\u1200" <= ch <= "\u137f")
+    return geez + (len(text) - geez + 3) // 4
 
-    # Process JSONs: Extract values and concatenate
-    all_texts.append(" ".join(AMHARIC_TRANSLATION_JSON.values()))
-    all_texts.append(" ".join(ENGLISH_TRANSLATION_JSON.values()))
-    all_texts.append(" ".join(AFAAN_OROMO_TRANSLATION_JSON.values()))
+def load_chunk_store(max_tokens: Optional[int] = None, token_counter: Optional[TokenCounter] = None) -> ChunkStore:
+    """
+    Loads the hardcoded documents and chunks them along their structure:
+    one chunk per translation dictionary, one per FAQ question/answer pair and one per
+    heading-delimited section of the project summary (split at line boundaries when a
+    section exceeds the token budget). Source, section title and language are recorded
+    for every chunk.
+    """
+    max_tokens = max_tokens or int(os.getenv("CHUNK_MAX_TOKENS", "128"))
+    count_tokens = token_counter or _default_token_counter()
+    store = ChunkStore()
 
-    # Add full text from Faq.txt
-    all_texts.append(FAQ_TEXT)
+    for source, language, translations in _TRANSLATION_SOURCES:
+        section = Section(title="translations", lines=[" ".join(translations.values())])
+        for chunk in pack_section(section, max_tokens, count_tokens):
+            store.append(chunk, source=source, section="translations", language=language)
 
-    # Add summarized text from DOCX
-    all_texts.append(DOCX_SUMMARY_TEXT)
+    for source, sections in (("Faq.txt", split_faq(FAQ_TEXT)), ("Final project 1-4 final.docx", split_headed(DOCX_SUMMARY_TEXT))):
+        for section in sections:
+            for chunk in pack_section(section, max_tokens, count_tokens):
+                store.append(chunk, source=source, section=section.title, language="english")
 
-    combined_text = "\n\n".join(all_texts)
+    return store
 
-    # Split into chunks
-    text_splitter = CharacterTextSplitter(
-        separator="\n\n",
-        chunk_size=500,
-        chunk_overlap=50,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    chunks = text_splitter.split_text(combined_text)
-    return chunks
+def load_and_split_documents() -> List[str]:
+    """
+    Loads the hardcoded documents, extracts relevant text, and splits them into chunks.
+    """
+    return load_chunk_store().texts
 
 class MultilingualEmbeddings:
     """
     Wrapper for sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2 embeddings.
     Loads the model only once.
+
+    With EMBEDDING_WORKER_MODE=subprocess the model is never loaded in this process:
+    embedding calls go to a pool of worker subprocesses (see app/embedding_worker.py),
+    so torch inference does not compete with request handling.
+
+    In low-memory mode (LOW_MEMORY_MODE=true) an idle in-process model can be dropped with
+    `unload_if_idle`; the next embedding call loads it again.
     """
+    MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     _model = None
+    _model_lock = threading.Lock()
+    _last_used: float = 0.0
+    _worker_pool: Optional[EmbeddingWorkerPool] = None
+    _worker_pool_lock = threading.Lock()
+
+    @staticmethod
+    def uses_worker() -> bool:
+        return os.getenv("EMBEDDING_WORKER_MODE", "inprocess").lower() == "subprocess"
+
+    @classmethod
+    def get_worker_pool(cls) -> EmbeddingWorkerPool:
+        if cls._worker_pool is None:
+            with cls._worker_pool_lock:
+                if cls._worker_pool is None:
+                    cls._worker_pool = EmbeddingWorkerPool(
+                        size=int(os.getenv("EMBEDDING_WORKER_COUNT", "1")),
+                        timeout=float(os.getenv("EMBEDDING_WORKER_TIMEOUT_SECONDS", "10")),
+                        startup_timeout=float(os.getenv("EMBEDDING_WORKER_STARTUP_TIMEOUT_SECONDS", "120")),
+                        threads_per_worker=thread_limit() if low_memory_enabled() else None,
+                    )
+        return cls._worker_pool
+
+    @classmethod
+    def shutdown_workers(cls) -> None:
+        with cls._worker_pool_lock:
+            if cls._worker_pool is not None:
+                cls._worker_pool.shutdown()
+                cls._worker_pool = None
+
+    @classmethod
+    def get_tokenizer(cls):
+        """
+        The model's tokenizer; in subprocess and low-memory modes it is loaded on its own,
+        without the model weights, unless the model is already loaded.
+        """
+        if cls._model is None and (cls.uses_worker() or low_memory_enabled()):
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(cls.MODEL_NAME)
+        return cls.get_embedding_model().tokenizer
 
     @classmethod
     def get_embedding_model(cls):
-        if cls._model is None:
-            # Ensure that the model is downloaded to a persistent location if possible
-            # For Render free tier, it will download on each cold start.
-            # This model is relatively small (approx 100MB)
-            # Using a smaller model for memory optimization on Render's free tier.
-            # 'paraphrase-multilingual-MiniLM-L6-v2' is a smaller alternative to 'L12-v2'.
-            token = os.getenv("HUGGINGFACEHUB_API_TOKEN", None)
-            cls._model = SentenceTransformer(
-                "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-                device="cpu",
-                use_auth_token=token
-            )
-        return cls._model
+        cls._last_used = time.monotonic()
+        model = cls._model
+        if model is not None:
+            return model
+        with cls._model_lock:
+            if cls._model is None:
+                # Ensure that the model is downloaded to a persistent location if possible
+                # For Render free tier, it will download on each cold start.
+                # This model is relatively small (approx 100MB)
+                # Using a smaller model for memory optimization on Render's free tier.
+                # 'paraphrase-multilingual-MiniLM-L6-v2' is a smaller alternative to 'L12-v2'.
+                # Imported here so subprocess-worker mode never loads torch into the web process
+                from sentence_transformers import SentenceTransformer
+
+                if low_memory_enabled():
+                    limit_threads(thread_limit())
+                token = os.getenv("HUGGINGFACEHUB_API_TOKEN", None)
+                start = time.perf_counter()
+                cls._model = SentenceTransformer(
+                    cls.MODEL_NAME,
+                    device="cpu",
+                    use_auth_token=token
+                )
+                metrics.increment("embedding_model_loads")
+                logger.info(f"Loaded embedding model in {time.perf_counter() - start:.1f}s.")
+            return cls._model
 
+    @classmethod
+    def unload_if_idle(cls, idle_seconds: float) -> bool:
+        """
+        Drops the in-process model if it hasn't been used for `idle_seconds` and returns True.
+        Calls already holding the model finish with it; the next call reloads it.
+        """
+        with cls._model_lock:
+            if cls._model is None or time.monotonic() - cls._last_used < idle_seconds:
+                return False
+            cls._model = None
+        release_memory()
+        metrics.increment("embedding_model_unloads")
+        logger.info(f"Unloaded embedding model after {idle_seconds:.0f}s idle.")
+        return True
+
+    @classmethod
+    def memory_usage(cls) -> dict:
+        """Whether the in-process model is loaded, its parameter bytes and how long it has been idle."""
+        model = cls._model
+        usage = {
+            "mode": "subprocess" if cls.uses_worker() else "inprocess",
+            "loaded": model is not None,
+            "parameter_bytes": 0,
+            "idle_seconds": round(time.monotonic() - cls._last_used, 1) if cls._last_used else None,
+        }
+        if model is not None and hasattr(model, "parameters"):
+            usage["parameter_bytes"] = sum(p.numel() * p.element_size() for p in model.parameters())
+        return usage
+
+    # Embeddings are L2-normalized so FAISS L2 distances map directly to cosine similarity
+    # (squared distance = 2 - 2 * cosine) and distance thresholds are model-independent.
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.uses_worker():
+            # One worker request per batch, so EMBEDDING_WORKER_TIMEOUT_SECONDS bounds a batch
+            # rather than a whole corpus (an index build or tenant snapshot)
+            pool = self.get_worker_pool()
+            batch_size = max(1, int(os.getenv("EMBEDDING_BATCH_SIZE", "64")))
+            embeddings: List[List[float]] = []
+            for start in range(0, len(texts), batch_size):
+                embeddings.extend(pool.embed(texts[start:start + batch_size]).tolist())
+            return embeddings
         model = self.get_embedding_model()
-        return model.encode(texts).tolist()
+        return model.encode(texts, normalize_embeddings=True).tolist()
 
     def embed_query(self, text: str) -> List[float]:
+        if self.uses_worker():
+            return self.get_worker_pool().embed([text])[0].tolist()
         model = self.get_embedding_model()
-        return model.encode(text).tolist()
+        return model.encode(text, normalize_embeddings=True).tolist()
 
 # Initialize the embedding model globally but lazily
 # This will be used by the vector_store.py
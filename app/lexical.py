@@ -0,0 +1,155 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# \w covers Latin and Ge'ez letters; the Ethiopic wordspace and full stop (፡ ።) are separators
+_TOKEN = re.compile(r"[\w']+")
+# English function words carry no topical signal; Amharic and Oromo text has few stopwords in this corpus
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i",
+    "if", "in", "is", "it", "me", "my", "of", "on", "or", "the", "there", "this", "to", "what",
+    "when", "where", "which", "who", "will", "with", "you", "your",
+}
+# Files written next to a vector store snapshot by BM25Index.save
+LEXICAL_TERMS_FILE = "lexical_terms.json"
+LEXICAL_ARRAYS = ("offsets", "doc_ids", "tfs", "lengths", "idf")
+
+class LexicalHit(NamedTuple):
+    """A BM25 match: the chunk text, its score (higher is better) and its index in the store."""
+    text: str
+    score: float
+    doc_id: int
+
+def tokenize(text: str) -> List[str]:
+    tokens = _TOKEN.findall(unicodedata.normalize("NFKC", text).casefold())
+    return [token.strip("'") for token in tokens if token.strip("'") and token not in _STOPWORDS]
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunk texts. Complements dense retrieval on exact terms
+    (names, feature labels, Amharic and Oromo words the embedding model blurs together).
+
+    Postings are flat arrays (each term's (doc id, tf) pairs are a slice of `doc_ids`/`tfs`
+    between two `offsets`), so a snapshot can store them and `load(..., mmap=True)` serves
+    them file-backed like the index codes; only the term vocabulary is held in memory.
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        # Sequences (e.g. memory-mapped chunk texts) are referenced rather than copied
+        self.texts = texts if isinstance(texts, SequenceABC) else list(texts)
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths: List[int] = []
+        for doc_id, text in enumerate(self.texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        n = len(self.texts)
+        self._terms: Dict[str, int] = {term: i for i, term in enumerate(postings)}
+        self._offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(pairs) for pairs in postings.values()], out=self._offsets[1:])
+        pairs = np.array([pair for pairs in postings.values() for pair in pairs], dtype=np.int32).reshape(-1, 2)
+        self._doc_ids = np.ascontiguousarray(pairs[:, 0])
+        self._tfs = np.ascontiguousarray(pairs[:, 1])
+        self._lengths = np.array(lengths, dtype=np.int32)
+        self._idf = np.array(
+            [math.log(1 + (n - len(pairs) + 0.5) / (len(pairs) + 0.5)) for pairs in postings.values()], dtype=np.float64
+        )
+        self._avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        self._mapped = False
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def scores(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            t = self._terms.get(term)
+            if t is None:
+                continue
+            start, end = self._offsets[t], self._offsets[t + 1]
+            doc_ids, tfs = self._doc_ids[start:end], self._tfs[start:end].astype(np.float64)
+            norm = 1 - self.b + self.b * self._lengths[doc_ids] / self._avg_length
+            term_scores = self._idf[t] * tfs * (self.k1 + 1) / (tfs + self.k1 * norm)
+            for doc_id, score in zip(doc_ids.tolist(), term_scores.tolist()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        return scores
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[LexicalHit]:
+        """Top-k chunks by BM25 score; chunks scoring below `min_score` are dropped."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: (-item[1], item[0]))
+        return [LexicalHit(self.texts[doc_id], score, doc_id) for doc_id, score in ranked[:k] if score >= min_score]
+
+    def save(self, path: str) -> None:
+        """Writes the postings next to a snapshot (lexical_*.npy and the term vocabulary)."""
+        tmp_suffix = f".{os.getpid()}.tmp"
+        for name in LEXICAL_ARRAYS:
+            tmp_path = os.path.join(path, f"lexical_{name}{tmp_suffix}.npy")
+            np.save(tmp_path, getattr(self, f"_{name}"))
+            os.replace(tmp_path, os.path.join(path, f"lexical_{name}.npy"))
+        tmp_path = os.path.join(path, LEXICAL_TERMS_FILE + tmp_suffix)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": list(self._terms)}, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, LEXICAL_TERMS_FILE))
+
+    @classmethod
+    def load(cls, path: str, texts: Sequence[str], mmap: bool = False) -> Optional["BM25Index"]:
+        """
+        Reads postings written by `save` for these `texts`; with `mmap` the arrays stay
+        file-backed. Returns None if the snapshot has no (or mismatched) postings.
+        """
+        try:
+            with open(os.path.join(path, LEXICAL_TERMS_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(path, f"lexical_{name}.npy"), mmap_mode="r" if mmap else None)
+                      for name in LEXICAL_ARRAYS}
+        except (OSError, ValueError):
+            return None
+        if len(arrays["lengths"]) != len(texts) or len(arrays["offsets"]) != len(meta["terms"]) + 1:
+            return None
+
+        index = object.__new__(cls)
+        index.texts = texts
+        index.k1 = meta["k1"]
+        index.b = meta["b"]
+        index._terms = {term: i for i, term in enumerate(meta["terms"])}
+        for name, array in arrays.items():
+            setattr(index, f"_{name}", array)
+        index._avg_length = float(arrays["lengths"].mean()) if len(texts) else 0.0
+        index._mapped = mmap
+        return index
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Bytes of the postings arrays (file-backed when mapped) and an estimate of the
+        in-memory term vocabulary, which is always resident.
+        """
+        postings_bytes = sum(getattr(self, f"_{name}").nbytes for name in LEXICAL_ARRAYS)
+        vocabulary_bytes = sum(len(term.encode("utf-8")) + 100 for term in self._terms)
+        return {
+            "postings_bytes": postings_bytes,
+            "vocabulary_bytes": vocabulary_bytes,
+            "resident_bytes": vocabulary_bytes + (0 if self._mapped else postings_bytes),
+        }
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuses ranked lists of doc ids: each list contributes 1 / (k + rank) per doc.
+    Only ranks are used, so BM25 scores and L2 distances need no calibration against each other.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    # Stable sort: ties keep the order of the first ranking that contained them
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -1,12 +1,38 @@
+import asyncio
 import os
-from fastapi import FastAPI, HTTPException, status
+from typing import Annotated, Callable, Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from app.api.endpoints import router
-from app.services.knowledge_loader import KnowledgeLoader
-from app.services.vector_service import VectorDatabaseService
-import os
 from dotenv import load_dotenv
+from app.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    PRIORITY_ANONYMOUS,
+    PRIORITY_AUTHENTICATED,
+    PRIORITY_LANDLORD,
+)
+from app.auth import bearer_claims
+from app.chatbot_graph import answer_store, chatbot_graph, ChatbotState
+from app.coalescing import SingleFlight
+from app.config import config
+from app.knowledge_base import MultilingualEmbeddings
+from app.memory import (
+    configure_low_memory_mode,
+    idle_unload_seconds,
+    low_memory_enabled,
+    process_memory,
+    processes_rss,
+    rss_by_mapping,
+    start_idle_unloader,
+)
+from app.metrics import metrics
+from app.models import ChatRequest
+from app.precompute import AnswerPrecomputer, content_hash, start_precompute_scheduler
+from app.response_cache import EncodedResponse, ResponseCache, encoded_response
+from app.tenants import tenant_stores
+from app.utils import logger, normalize_query
+from app.vector_store import faiss_vector_store
 
 # Load environment variables
 load_dotenv()
@@ -16,9 +42,9 @@ if not os.getenv("GOOGLE_API_KEY"):
     raise ValueError("GOOGLE_API_KEY environment variable is not set")
 
 app = FastAPI(
-    title="Ethiopian Rental Management Chatbot",
-    description="Multilingual chatbot with vector DB and Gemini embeddings",
-    version="1.0.0"
+    title="Multilingual Chatbot API",
+    description="Backend for a multilingual chatbot using FastAPI, LangGraph, Gemini, and FAISS.",
+    version="1.0.0",
 )
 
 # Add security and performance middleware
@@ -31,62 +57,104 @@ async def security_headers(request: Request, call_next):
     response.headers["X-Frame-Options"] = "DENY"
     return response
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Responses smaller than this are sent uncompressed (also applied to precompressed answers)
+GZIP_MINIMUM_SIZE = 1000
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
-# Add CORS middleware
+# Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=["*"],  # Allows all origins
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["*"],  # Allows all methods
+    allow_headers=["*"],  # Allows all headers
 )
 
-# Initialize vector database on startup
-vector_service = VectorDatabaseService()
-knowledge_loader = KnowledgeLoader()
+# Identical (query, language, tenant) requests arriving while one is in flight share its result
+chat_coalescer = SingleFlight(name="chat")
 
-@app.on_event("startup")
-async def startup_event():
-    if not vector_service.is_initialized():
-        await knowledge_loader.load_all_documents()
-        await vector_service.initialize_knowledge_base()
+# Cached and precomputed answers, serialized and compressed once and served with an ETag
+response_cache = ResponseCache(max_entries=config.RESPONSE_CACHE_MAX_ENTRIES)
 
-from datetime import datetime
-import psutil
-from app.services.ai_service import AIService
+# Bounds concurrent graph executions; overload is shed with fast 429/503 responses
+chat_admission = AdmissionController(
+    max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    queue_timeout=config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    target_queue_delay=config.ADMISSION_TARGET_QUEUE_DELAY_SECONDS,
+    name="chat_admission",
+)
 
-# Load environment variables
-load_dotenv()
+def request_priority(http_request: Request) -> int:
+    """
+    Landlords are served first, then any other caller with a verified bearer token, then
+    everyone else. The role is read from the token's signed claims, never from client headers;
+    requests with a missing, invalid or expired token get the lowest priority.
+    """
+    claims = bearer_claims(http_request.headers.get("Authorization"), config.AUTH_TOKEN_SECRET)
+    if claims is None:
+        return PRIORITY_ANONYMOUS
+    if str(claims.get("role", "")).lower() == "landlord":
+        return PRIORITY_LANDLORD
+    return PRIORITY_AUTHENTICATED
 
-# Verify required environment variables
-if not os.getenv("GOOGLE_API_KEY"):
-    raise ValueError("GOOGLE_API_KEY environment variable is not set")
+def require_admin(http_request: Request) -> None:
+    """
+    Restricts operational endpoints to bearer tokens whose signed claims carry role "admin"
+    (mint one with `python -m app.auth --role admin`).
+    """
+    claims = bearer_claims(http_request.headers.get("Authorization"), config.AUTH_TOKEN_SECRET)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="A valid admin bearer token is required.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if str(claims.get("role", "")).lower() != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin role required.")
 
-app = FastAPI(
-    title="Multilingual Chatbot API",
-    description="Backend for a multilingual chatbot using FastAPI, LangGraph, Gemini, and FAISS.",
-    version="1.0.0",
-)
+# Canonical FAQ answers (answer_store) are generated ahead of time by a rate-limited background job
+precompute_scheduler = None
+# Low-memory mode: unloads the embedding model after an idle period
+idle_unloader = None
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
-)
+def _precompute_retrieve(question: str, language: str) -> list:
+    return faiss_vector_store.search(
+        question, k=config.RETRIEVAL_K, max_distance=config.RETRIEVAL_MAX_DISTANCE, max_gap=config.RETRIEVAL_MAX_GAP
+    )
 
+def _precompute_generate(question: str, language: str) -> str:
+    # skip_cache: regenerate rather than be served the answer being refreshed
+    result = chatbot_graph.invoke(
+        ChatbotState(query=question, language=language, skip_cache=True,
+                     latency_budget=config.PRECOMPUTE_LATENCY_BUDGET_SECONDS, context=[], response="")
+    )
+    # Extractive fallbacks are a stopgap for live traffic, not answers worth storing
+    return "" if result.get("fallback") else result.get("response", "")
 
-# Initialize services
-vector_service = VectorDatabaseService()
-knowledge_loader = KnowledgeLoader()
-ai_service = AIService()
+def _knowledge_base_hash() -> str:
+    faiss_vector_store.get_index()
+    return content_hash(faiss_vector_store._documents)
+
+answer_precomputer = AnswerPrecomputer(
+    answer_store,
+    retrieve_fn=_precompute_retrieve,
+    generate_fn=_precompute_generate,
+    kb_hash_fn=_knowledge_base_hash,
+    # Yield to live traffic: only generate while no chat request is being processed
+    is_busy=lambda: chat_admission.in_flight > 0,
+    min_interval=config.PRECOMPUTE_MIN_INTERVAL_SECONDS,
+)
 
 
 @app.on_event("startup")
 async def startup_event():
+    global idle_unloader
+    if low_memory_enabled():
+        configure_low_memory_mode()
+        if idle_unload_seconds() > 0 and not MultilingualEmbeddings.uses_worker():
+            idle_unloader = start_idle_unloader(MultilingualEmbeddings.unload_if_idle, idle_unload_seconds())
+
     logger.info("Application startup: Initializing FAISS vector store (if not already).")
     # Accessing faiss_vector_store instance triggers its lazy initialization
     # This ensures the model is loaded and index built on startup,
@@ -97,6 +165,18 @@ async def startup_event():
     else:
         logger.info("FAISS vector store ready.")
 
+    global precompute_scheduler
+    if config.PRECOMPUTE_ENABLED:
+        precompute_scheduler = start_precompute_scheduler(answer_precomputer, config.PRECOMPUTE_INTERVAL_HOURS)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    MultilingualEmbeddings.shutdown_workers()
+    if precompute_scheduler is not None:
+        precompute_scheduler.shutdown(wait=False)
+    if idle_unloader is not None:
+        idle_unloader.shutdown(wait=False)
+
 @app.get("/health", status_code=status.HTTP_200_OK)
 async def health_check():
     """
@@ -111,26 +191,40 @@ async def health_check():
     return {"status": "ok"}
 
 @app.post("/chat", status_code=status.HTTP_200_OK)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """
     Processes a user query and returns a multilingual response from the chatbot.
     """
-    logger.info(f"Received chat request: Query='{request.query}', Language='{request.language}'")
+    return await _serve_chat(request, http_request)
 
+@app.get("/chat/answer", status_code=status.HTTP_200_OK)
+async def chat_answer_endpoint(request: Annotated[ChatRequest, Query()], http_request: Request):
+    """
+    GET variant of /chat for the help widget, with the same parameters as query parameters.
+    Cached and precomputed answers carry an ETag; a conditional request whose If-None-Match
+    still matches is answered 304 Not Modified without running the graph.
+    """
+    return await _serve_chat(request, http_request, conditional=True)
 
+async def _serve_chat(request: ChatRequest, http_request: Request, conditional: bool = False):
+    """
+    Shared by POST /chat and GET /chat/answer: answers from the precomputed answers (looked
+    up once per request) or runs the graph under admission control.
+    `conditional` honours If-None-Match on precomputed answers.
+    """
+    logger.info(f"Received chat request: Query='{request.query}', Language='{request.language}'")
 
-@app.get("/metrics")
-async def application_metrics():
-    return {
-        "active_sessions": chat_engine.session_service.get_active_count(),
-        "total_queries": chat_engine.get_query_count(),
-        "language_distribution": chat_engine.translation_service.get_language_stats(),
-        "average_response_time": chat_engine.get_avg_response_time(),
-        "error_rate": chat_engine.get_error_rate()
-    }
+    if request.tenant_id and not tenant_stores.exists(request.tenant_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown tenant: {request.tenant_id}")
 
-    if not faiss_vector_store._index:
-        logger.error("FAISS index not available. Returning 500 error.")
+    # Exact canonical questions in a given language (and paraphrases the graph already matched)
+    # are answered here; otherwise the graph's branches detect the language and match paraphrases.
+    # Precomputed answers come from the shared FAQ, so tenants (with their own policies) skip them.
+    precomputed = None if request.tenant_id else _cached_answer(request.query, request.language)
+    if precomputed is not None:
+        logger.info(f"Serving precomputed answer for query: '{request.query}'")
+        metrics.increment("precomputed_hits")
+        return encoded_response(precomputed, http_request.headers, GZIP_MINIMUM_SIZE, conditional=conditional)
 
     # The get_index() method will handle initialization if needed.
     if faiss_vector_store.get_index() is None:
@@ -141,15 +235,64 @@ async def application_metrics():
             detail="Chatbot service is not ready. Please try again later."
         )
 
+    key = (normalize_query(request.query), request.language, request.tenant_id)
+    if chat_coalescer.is_in_flight(key):
+        # Joining an execution that is already running costs no extra capacity
+        return await _answer_chat(request, key, http_request)
+
+    try:
+        await chat_admission.acquire(request_priority(http_request))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail="The chatbot is busy. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    # The slot is released when the graph execution finishes, not when this handler exits:
+    # a cancelled handler leaves the graph thread running
+    return await _answer_chat(request, key, http_request, on_done=chat_admission.release_callback())
+
+def _cached_answer(query: str, language: Optional[str]) -> Optional[EncodedResponse]:
+    """
+    The encoded answer for an exact canonical question in a given language, or for a query
+    the graph has already served from the precomputed answers (while that answer is
+    unchanged). Never runs the graph or detects the language.
+    """
+    key = (normalize_query(query), language)
+    answer = answer_store.lookup_exact(query, language) if language else None
+    if answer is not None:
+        return response_cache.encoded(key, answer, question=query, language=language)
+    entry = response_cache.get(key)
+    if entry is not None and answer_store.lookup_exact(entry.question, entry.language) == entry.answer:
+        metrics.increment("response_cache_hits")
+        return entry.encoded
+    return None
+
+async def _answer_chat(request: ChatRequest, key, http_request: Request,
+                       on_done: Optional[Callable[[], None]] = None):
+    """
+    Runs (or joins) the graph execution for a chat request. Without a requested language,
+    the graph's detect_language branch resolves it. `on_done` is called once that
+    execution has finished.
+    """
     try:
         # LangGraph expects a dictionary for initial state
-        initial_state = ChatbotState(query=request.query, language=request.language or "english")
-        
-        # Invoke the chatbot graph
-        result = chatbot_graph.invoke(initial_state)
-        
+        initial_state = ChatbotState(query=request.query, language=request.language, context=[], response="")
+        if request.tenant_id:
+            initial_state["tenant_id"] = request.tenant_id
+
+        # Invoke the chatbot graph off the event loop, sharing the execution with any
+        # identical request that is already in flight. Cancelling cannot stop the graph
+        # thread, so the execution stays joinable until it finishes.
+        result = await chat_coalescer.do(
+            key,
+            lambda: asyncio.to_thread(chatbot_graph.invoke, initial_state),
+            interruptible=False,
+            on_done=on_done,
+        )
+
         response_text = result.get("response", "Sorry, I couldn't generate a response.")
-        
+
         if "Sorry, I encountered an issue" in response_text:
             logger.error(f"LLM generation failed for query: '{request.query}'")
             raise HTTPException(
@@ -158,6 +301,16 @@ async def application_metrics():
             )
 
         logger.info(f"Chat response generated for query: '{request.query}'")
+        if not request.tenant_id and result.get("cached_question") and result.get("cached_response") == response_text:
+            # A paraphrase served from the precomputed answers: keep it encoded for repeat requests
+            encoded = response_cache.encoded(
+                (normalize_query(request.query), request.language), response_text,
+                question=result["cached_question"], language=result.get("language") or request.language,
+            )
+            return encoded_response(encoded, http_request.headers, GZIP_MINIMUM_SIZE)
+        if result.get("fallback"):
+            # Gemini failed or overran the latency budget; the answer is extracted from the documents
+            return {"response": response_text, "fallback": True}
         return {"response": response_text}
     except HTTPException:
         raise # Re-raise HTTPExceptions
@@ -168,5 +321,56 @@ async def application_metrics():
             detail="An unexpected error occurred. Please try again."
         )
 
+@app.get("/metrics")
+async def application_metrics():
+    """
+    Returns in-process counters, including how often retrieval short-circuits the LLM
+    and how many chat requests were coalesced onto an in-flight execution.
+    """
+    counters = metrics.snapshot()
+    retrievals = counters.get("retrieval_queries", 0)
+    short_circuits = counters.get("no_context_short_circuits", 0)
+    return {
+        "counters": counters,
+        "no_context_rate": short_circuits / retrievals if retrievals else 0.0,
+        "chat_coalesced": counters.get("chat_coalesced", 0),
+        "precomputed_hits": counters.get("precomputed_hits", 0),
+        "response_cache": {
+            "entries": len(response_cache),
+            "hits": counters.get("response_cache_hits", 0),
+            "not_modified": counters.get("responses_not_modified", 0),
+        },
+        "llm_fallbacks": counters.get("llm_fallbacks", 0),
+        "precomputed_version": answer_store.current_version(),
+        "chat_in_flight": chat_coalescer.in_flight(),
+        # Aggregates only: the per-tenant breakdown (customer names) is on the admin /debug/memory
+        "tenants": tenant_stores.stats(per_tenant=False),
+        "tenant_cold_loads": counters.get("tenant_cold_loads", 0),
+        "tenant_cold_load_seconds": counters.get("tenant_cold_load_seconds", 0.0),
+        "admission": {
+            "in_flight": chat_admission.in_flight,
+            "queued": chat_admission.queue_length(),
+            "rejected_429": counters.get("chat_admission_rejected_429", 0),
+            "rejected_503": counters.get("chat_admission_rejected_503", 0),
+        },
+    }
 
-        
\ No newline at end of file
+@app.get("/debug/memory", dependencies=[Depends(require_admin)])
+async def debug_memory():
+    """
+    Breaks this worker's RSS down by component: anonymous vs file-backed pages, resident
+    bytes per mapping category, and the sizes of the embedding model, vector stores and
+    embedding worker processes. Admin only: the report exposes process and file layout.
+    """
+    workers = MultilingualEmbeddings._worker_pool
+    return {
+        "low_memory_mode": low_memory_enabled(),
+        "process": process_memory(),
+        "mappings": rss_by_mapping([os.path.dirname(faiss_vector_store._snapshot_path), tenant_stores.snapshot_dir]),
+        "components": {
+            "embedding_model": MultilingualEmbeddings.memory_usage(),
+            "vector_store": faiss_vector_store.memory_usage() if faiss_vector_store._index is not None else {},
+            "tenant_stores": tenant_stores.stats(),
+            "embedding_workers": processes_rss(workers.pids()) if workers is not None else {},
+        },
+    }
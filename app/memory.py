@@ -0,0 +1,162 @@
+import ctypes
+import ctypes.util
+import gc
+import os
+import sys
+from typing import Dict, Iterable, List, Optional
+
+from app.utils import logger
+
+# Native thread pools that otherwise size themselves to every core (each thread costs stack and malloc arenas)
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+# glibc mallopt parameter capping the number of malloc arenas
+_M_ARENA_MAX = -8
+
+def low_memory_enabled() -> bool:
+    """LOW_MEMORY_MODE=true: capped thread pools, idle model unloading and memory-mapped snapshots."""
+    return os.getenv("LOW_MEMORY_MODE", "false").lower() == "true"
+
+def thread_limit() -> int:
+    return max(1, int(os.getenv("LOW_MEMORY_THREADS", "1")))
+
+def idle_unload_seconds() -> float:
+    """Seconds without an embedding call after which the in-process model is unloaded (0 disables)."""
+    return float(os.getenv("LOW_MEMORY_IDLE_UNLOAD_SECONDS", "300"))
+
+def _libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+    except OSError:
+        return None
+
+def limit_threads(threads: int) -> None:
+    """
+    Caps torch, FAISS and BLAS thread pools at `threads`. The environment variables cover
+    libraries loaded later and subprocesses (e.g. embedding workers); pools that already
+    exist are resized directly.
+    """
+    for name in _THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    libc = _libc()
+    if libc is not None and hasattr(libc, "mallopt"):
+        libc.mallopt(_M_ARENA_MAX, 2)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    if "faiss" in sys.modules:
+        sys.modules["faiss"].omp_set_num_threads(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        pass
+    else:
+        threadpool_limits(limits=threads)
+
+def release_memory() -> None:
+    """Collects garbage and hands freed heap pages back to the OS (glibc keeps them otherwise)."""
+    gc.collect()
+    libc = _libc()
+    if libc is not None and hasattr(libc, "malloc_trim"):
+        libc.malloc_trim(0)
+
+def _proc_status() -> Dict[str, int]:
+    """Memory fields of /proc/self/status in bytes (Linux only; empty elsewhere)."""
+    fields = {}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return fields
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """
+    RSS of this process split into anonymous memory (heap, model weights, in-memory indexes)
+    and file-backed pages (shared libraries, memory-mapped snapshots), plus peak RSS.
+    File-backed pages can be dropped by the kernel under pressure; anonymous ones cannot.
+    """
+    status = _proc_status()
+    report = {
+        "rss_bytes": status.get("VmRSS"),
+        "anon_bytes": status.get("RssAnon"),
+        "file_bytes": status.get("RssFile"),
+        "shmem_bytes": status.get("RssShmem"),
+        "peak_rss_bytes": status.get("VmHWM"),
+    }
+    if report["rss_bytes"] is None:
+        import psutil
+        report["rss_bytes"] = psutil.Process().memory_info().rss
+    return report
+
+def rss_by_mapping(snapshot_dirs: Iterable[str] = (), top: int = 10) -> Dict[str, object]:
+    """
+    Resident bytes per mapping category: the heap and other anonymous memory, memory-mapped
+    snapshot files, and the largest shared libraries (torch, FAISS, BLAS) by file name.
+    """
+    import psutil
+
+    roots = [os.path.abspath(d) + os.sep for d in snapshot_dirs if d]
+    anonymous = snapshots = 0
+    libraries: Dict[str, int] = {}
+    for mapping in psutil.Process().memory_maps(grouped=True):
+        path = mapping.path
+        if not path.startswith("/"):
+            anonymous += mapping.rss
+        elif any(path.startswith(root) for root in roots):
+            snapshots += mapping.rss
+        else:
+            name = os.path.basename(path)
+            libraries[name] = libraries.get(name, 0) + mapping.rss
+    largest = sorted(libraries.items(), key=lambda item: -item[1])[:top]
+    return {
+        "anonymous_bytes": anonymous,
+        "snapshot_bytes": snapshots,
+        "library_bytes": sum(libraries.values()),
+        "largest_libraries": dict(largest),
+    }
+
+def processes_rss(pids: List[int]) -> Dict[int, int]:
+    """RSS of helper processes such as embedding workers; processes that exited are skipped."""
+    import psutil
+
+    usage = {}
+    for pid in pids:
+        try:
+            usage[pid] = psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            continue
+    return usage
+
+def configure_low_memory_mode() -> None:
+    """Applies the thread caps; called once at startup when LOW_MEMORY_MODE is on."""
+    threads = thread_limit()
+    limit_threads(threads)
+    logger.info(f"Low-memory mode: thread pools capped at {threads}, "
+                f"embedding model unloaded after {idle_unload_seconds():.0f}s idle.")
+
+def start_idle_unloader(unload_if_idle, idle_seconds: float, check_interval: Optional[float] = None):
+    """
+    Calls `unload_if_idle(idle_seconds)` on an APScheduler background thread, every
+    `check_interval` seconds (a quarter of the idle period by default).
+    """
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    interval = check_interval or max(1.0, idle_seconds / 4)
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(
+        unload_if_idle,
+        "interval",
+        seconds=interval,
+        args=[idle_seconds],
+        max_instances=1,
+        coalesce=True,
+        id="unload_idle_embedding_model",
+    )
+    scheduler.start()
+    return scheduler
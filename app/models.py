@@ -1,11 +1,19 @@
 from typing import Literal, Optional
 from pydantic import BaseModel, Field, field_validator
 
+# Tenant ids name snapshot directories (see app/tenants.py), so they are restricted to a safe character set
+TENANT_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
 class ChatRequest(BaseModel):
     query: str = Field(..., min_length=1, description="The user's query in any supported language.")
     language: Optional[Literal["english", "amharic", "afaan_oromo"]] = Field(
         None, description="Optional: Forces the response language. If not provided, language is auto-detected."
     )
+    tenant_id: Optional[str] = Field(
+        None,
+        pattern=TENANT_ID_PATTERN,
+        description="Optional: Property-management company whose own knowledge base is searched alongside the shared one.",
+    )
 
     @field_validator('language', mode='before')
     @classmethod
@@ -0,0 +1,195 @@
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils import logger
+
+Encoder = Callable[[List[str]], np.ndarray]
+EncoderFactory = Callable[[int], Encoder]
+
+def default_encoder_factory(num_threads: int) -> Encoder:
+    """
+    Loads the multilingual embedding model inside a worker process.
+    Each worker gets its own model and a share of the CPU threads, so workers don't oversubscribe cores.
+    """
+    import torch
+    torch.set_num_threads(num_threads)
+    from app.knowledge_base import MultilingualEmbeddings
+
+    model = MultilingualEmbeddings.get_embedding_model()
+    return lambda texts: model.encode(texts, normalize_embeddings=True, batch_size=len(texts))
+
+# Per-process state, set by _init_worker in each pool worker
+_worker_encoder: Optional[Encoder] = None
+_worker_barrier = None
+# Seconds warm-up tasks wait for the slowest worker to start and load its model
+WARM_UP_TIMEOUT_SECONDS = 600
+
+def _init_worker(encoder_factory: EncoderFactory, num_threads: int, barrier=None) -> None:
+    global _worker_encoder, _worker_barrier
+    _worker_encoder = encoder_factory(num_threads)
+    _worker_barrier = barrier
+
+def _encode_batch(batch: List[str]) -> np.ndarray:
+    return np.asarray(_worker_encoder(batch), dtype="float32")
+
+def _warm_up(batch: List[str]) -> None:
+    """
+    Encodes a tiny batch, then holds this worker at the barrier until every worker has done
+    the same, so each warm-up task lands on a different worker.
+    """
+    _encode_batch(batch)
+    _worker_barrier.wait(WARM_UP_TIMEOUT_SECONDS)
+
+class ParallelEmbedder:
+    """
+    Embeds a corpus across a pool of worker processes, each holding its own model.
+
+    Chunks are cut into batches of `batch_size`; batches are yielded in corpus order as
+    they complete, so callers can stream them straight into an index. With a
+    `checkpoint_dir`, every finished batch is saved, and an interrupted build resumes
+    by loading finished batches instead of re-embedding them.
+    """
+
+    def __init__(self, workers: int = 2, batch_size: int = 64, checkpoint_dir: Optional[str] = None,
+                 encoder_factory: EncoderFactory = default_encoder_factory, model_id: str = "default"):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.checkpoint_dir = checkpoint_dir
+        self.encoder_factory = encoder_factory
+        self.model_id = model_id
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _run_dir(self, texts: List[str]) -> Optional[str]:
+        """Checkpoint directory for this corpus, batch size and model, so stale batches are never reused."""
+        if not self.checkpoint_dir:
+            return None
+        digest = hashlib.sha256(f"{self.model_id}|{self.batch_size}".encode("utf-8"))
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        path = os.path.join(self.checkpoint_dir, digest.hexdigest()[:16])
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def _batch_path(run_dir: str, batch_no: int) -> str:
+        return os.path.join(run_dir, f"batch_{batch_no:06d}.npy")
+
+    def _pool(self, barrier=None) -> ProcessPoolExecutor:
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        context = multiprocessing.get_context("spawn")  # forking a process with torch threads can deadlock
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                   initializer=_init_worker, initargs=(self.encoder_factory, threads, barrier))
+
+    def warm_pool(self, sample: List[str]) -> ProcessPoolExecutor:
+        """
+        A pool whose workers have all started, loaded their model and encoded `sample`,
+        for timing embedding alone (pass it to `iter_embeddings`).
+        """
+        barrier = multiprocessing.get_context("spawn").Barrier(self.workers)
+        pool = self._pool(barrier)
+        try:
+            for future in [pool.submit(_warm_up, sample) for _ in range(self.workers)]:
+                future.result()
+        except BaseException:
+            pool.shutdown(cancel_futures=True)
+            raise
+        return pool
+
+    def iter_embeddings(self, texts: List[str], pool: Optional[ProcessPoolExecutor] = None) -> Iterator[np.ndarray]:
+        """
+        Yields one float32 array per batch, in corpus order. Runs on `pool` if given
+        (e.g. from `warm_pool`), otherwise on a pool of its own.
+        """
+        if pool is not None:
+            yield from self._iter_embeddings(texts, pool)
+            return
+        with self._pool() as own_pool:
+            yield from self._iter_embeddings(texts, own_pool)
+
+    def _iter_embeddings(self, texts: List[str], pool: ProcessPoolExecutor) -> Iterator[np.ndarray]:
+        batches = self._batches(texts)
+        run_dir = self._run_dir(texts)
+        done = set()
+        if run_dir:
+            done = {i for i in range(len(batches)) if os.path.exists(self._batch_path(run_dir, i))}
+            if done:
+                logger.info(f"Resuming embedding: {len(done)}/{len(batches)} batches already checkpointed.")
+
+        pending = [i for i in range(len(batches)) if i not in done]
+        results = pool.map(_encode_batch, [batches[i] for i in pending])
+        for i in range(len(batches)):
+            if i in done:
+                yield np.load(self._batch_path(run_dir, i))
+                continue
+            # pool.map returns in submission order, which is corpus order for pending batches
+            embeddings = next(results)
+            if run_dir:
+                tmp_path = self._batch_path(run_dir, i) + ".tmp.npy"
+                np.save(tmp_path, embeddings)
+                os.replace(tmp_path, self._batch_path(run_dir, i))
+            yield embeddings
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embeds the whole corpus and returns an (n, d) float32 array."""
+        batches = list(self.iter_embeddings(texts))
+        return np.vstack(batches) if batches else np.zeros((0, 0), dtype="float32")
+
+    def clear_checkpoints(self, texts: List[str]) -> None:
+        run_dir = self._run_dir(texts)
+        if not run_dir:
+            return
+        for name in os.listdir(run_dir):
+            os.remove(os.path.join(run_dir, name))
+        os.rmdir(run_dir)
+
+def benchmark_scaling(texts: List[str], max_workers: int, batch_size: int = 64,
+                      encoder_factory: EncoderFactory = default_encoder_factory) -> List[Tuple[int, float]]:
+    """
+    Measures chunks per second for 1..max_workers processes embedding the whole corpus.
+    Every worker is started and has loaded its model before the clock starts, so start-up
+    is excluded without letting any batch run outside the timed window.
+    """
+    results = []
+    for workers in range(1, max_workers + 1):
+        embedder = ParallelEmbedder(workers=workers, batch_size=batch_size, encoder_factory=encoder_factory)
+        with embedder.warm_pool(texts[:1]) as pool:
+            start = time.perf_counter()
+            count = sum(len(batch) for batch in embedder.iter_embeddings(texts, pool=pool))
+            elapsed = time.perf_counter() - start
+        results.append((workers, count / elapsed if elapsed > 0 else float("inf")))
+        logger.info(f"{workers} worker(s): {results[-1][1]:.1f} chunks/s ({count} chunks)")
+    return results
+
+def format_scaling_chart(results: List[Tuple[int, float]], width: int = 40) -> str:
+    """Renders chunks/s per worker count as a text bar chart with speed-up over one worker."""
+    peak = max(rate for _, rate in results) or 1.0
+    baseline = results[0][1] or 1.0
+    lines = ["workers  chunks/s  speed-up"]
+    for workers, rate in results:
+        bar = "#" * max(1, round(width * rate / peak))
+        lines.append(f"{workers:>7}  {rate:>8.1f}  {rate / baseline:>7.2f}x  {bar}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chart embedding throughput for 1..N worker processes.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=50, help="Replicate the knowledge base to build a larger corpus.")
+    args = parser.parse_args()
+
+    from app.knowledge_base import load_and_split_documents
+
+    corpus = load_and_split_documents() * args.repeat
+    print(f"Embedding {len(corpus)} chunks with batch size {args.batch_size}")
+    print(format_scaling_chart(benchmark_scaling(corpus, args.max_workers, args.batch_size)))
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.chunking import split_faq
+from app.knowledge_base import FAQ_TEXT, embedding_model
+from app.metrics import metrics
+from app.utils import logger, normalize_query
+
+LANGUAGES = ("english", "amharic", "afaan_oromo")
+FAILED_RESPONSE_MARKER = "Sorry, I encountered an issue"
+
+class CanonicalQuestion(NamedTuple):
+    """A question taken verbatim from FAQ_TEXT, e.g. ("Q4", "What payment methods ...?")."""
+    question_id: str
+    question: str
+
+def extract_canonical_questions(faq_text: str = FAQ_TEXT) -> List[CanonicalQuestion]:
+    """Returns the FAQ's questions in order, identified by their Qn label."""
+    questions = []
+    for section in split_faq(faq_text):
+        label = section.lines[0].split(":", 1)[0]
+        questions.append(CanonicalQuestion(question_id=label, question=section.title))
+    return questions
+
+def content_hash(texts: List[str]) -> str:
+    """Stable hash of an ordered list of texts."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+class AnswerStore:
+    """
+    Versioned store of precomputed answers, persisted as JSON.
+
+    Each version is keyed by the hash of the knowledge-base chunks it was generated from.
+    An entry remembers the hash of the context chunks its answer was generated from, so
+    after the knowledge base changes only entries whose context changed are regenerated.
+    """
+
+    def __init__(self, path: Optional[str] = None, keep_versions: int = 2):
+        self.path = path
+        self.keep_versions = keep_versions
+        self._lock = threading.RLock()
+        self._data: Dict = {"current": None, "versions": {}}
+        self._exact: Dict[tuple, str] = {}
+        self._question_vectors: Optional[np.ndarray] = None
+        self._question_keys: List[str] = []
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+            self._reindex()
+
+    @staticmethod
+    def entry_key(question_id: str, language: str) -> str:
+        return f"{question_id}:{language}"
+
+    def current_version(self) -> Optional[str]:
+        return self._data["current"]
+
+    def entries(self, kb_hash: Optional[str] = None) -> Dict[str, Dict]:
+        kb_hash = kb_hash or self._data["current"]
+        return self._data["versions"].get(kb_hash, {}).get("entries", {}) if kb_hash else {}
+
+    def start_version(self, kb_hash: str) -> None:
+        """
+        Makes `kb_hash` current. The previous version's entries are carried over marked stale:
+        they are not served until a refresh confirms their context is unchanged (`confirm`)
+        or regenerates them (`put`), so an answer from the old knowledge base is never served
+        as current when its regeneration fails, finds no context or is postponed.
+        """
+        with self._lock:
+            if self._data["current"] == kb_hash:
+                return
+            previous = self.entries()
+            self._data["versions"][kb_hash] = {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "entries": {key: dict(entry, stale=True) for key, entry in previous.items()},
+            }
+            self._data["current"] = kb_hash
+            for old in list(self._data["versions"])[:-self.keep_versions]:
+                del self._data["versions"][old]
+            self._reindex()
+
+    def put(self, question_id: str, question: str, language: str, answer: str, source_hash: str) -> None:
+        with self._lock:
+            self.entries()[self.entry_key(question_id, language)] = {
+                "question": question,
+                "language": language,
+                "answer": answer,
+                "source_hash": source_hash,
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._reindex()
+
+    def confirm(self, question_id: str, language: str) -> None:
+        """Serves a carried-over entry again: its retrieved context is unchanged in the current version."""
+        with self._lock:
+            entry = self.entries().get(self.entry_key(question_id, language))
+            if entry is not None and entry.pop("stale", False):
+                self._reindex()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def servable_entries(self) -> Dict[str, Dict]:
+        """Current entries, excluding stale ones carried over from the previous version."""
+        return {key: entry for key, entry in self.entries().items() if not entry.get("stale")}
+
+    def _reindex(self) -> None:
+        self._exact = {
+            (normalize_query(entry["question"]), entry["language"]): entry["answer"]
+            for entry in self.servable_entries().values()
+        }
+        # Question embeddings are rebuilt lazily on the next semantic lookup
+        self._question_vectors = None
+        self._question_keys = []
+
+    def lookup_exact(self, query: str, language: str) -> Optional[str]:
+        """Answer for a query that is exactly (after normalization) a canonical question."""
+        return self._exact.get((normalize_query(query), language))
+
+    def match_question(self, query: str, min_similarity: float, query_embedding=None) -> Optional[str]:
+        """
+        The canonical question whose embedding is closest to the query's, if it is close enough.
+        The embedding model is multilingual, so Amharic or Afaan Oromo paraphrases
+        match the English canonical questions. Pass `query_embedding` when the query is already embedded.
+        """
+        with self._lock:
+            entries = self.servable_entries()
+            if not entries:
+                return None
+            if self._question_vectors is None:
+                questions = sorted({entry["question"] for entry in entries.values()})
+                self._question_keys = questions
+                self._question_vectors = np.array(embedding_model.embed_documents(questions), dtype="float32")
+            vectors, questions = self._question_vectors, self._question_keys
+
+        if query_embedding is None:
+            query_embedding = embedding_model.embed_query(query)
+        query_vector = np.array(query_embedding, dtype="float32")
+        similarities = vectors @ query_vector  # embeddings are normalized, so this is cosine
+        best = int(np.argmax(similarities))
+        if similarities[best] < min_similarity:
+            return None
+        return questions[best]
+
+class AnswerPrecomputer:
+    """
+    Generates answers for the canonical FAQ questions in every language through the
+    chatbot graph, without competing with live traffic: generations are spaced by
+    `min_interval` seconds and deferred while `is_busy()` reports in-flight requests.
+    """
+
+    def __init__(self, store: AnswerStore, retrieve_fn: Callable[[str, str], List[str]],
+                 generate_fn: Callable[[str, str], str], kb_hash_fn: Callable[[], str],
+                 is_busy: Callable[[], bool] = lambda: False, min_interval: float = 5.0,
+                 busy_poll: float = 1.0, max_busy_wait: float = 300.0, sleep: Callable[[float], None] = time.sleep):
+        self.store = store
+        self.retrieve_fn = retrieve_fn
+        self.generate_fn = generate_fn
+        self.kb_hash_fn = kb_hash_fn
+        self.is_busy = is_busy
+        self.min_interval = min_interval
+        self.busy_poll = busy_poll
+        self.max_busy_wait = max_busy_wait
+        self.sleep = sleep
+        self._run_lock = threading.Lock()
+
+    def _wait_for_idle(self) -> bool:
+        waited = 0.0
+        while self.is_busy():
+            if waited >= self.max_busy_wait:
+                return False
+            self.sleep(self.busy_poll)
+            waited += self.busy_poll
+        return True
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Brings the store up to date with the current knowledge base.
+        Returns counts of generated, unchanged and failed entries.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            logger.info("Answer precomputation already running; skipping.")
+            return {"generated": 0, "unchanged": 0, "failed": 0}
+        try:
+            return self._refresh()
+        finally:
+            self._run_lock.release()
+
+    def _refresh(self) -> Dict[str, int]:
+        self.store.start_version(self.kb_hash_fn())
+        counts = {"generated": 0, "unchanged": 0, "failed": 0}
+        last_generation = None
+        for canonical in extract_canonical_questions():
+            for language in LANGUAGES:
+                key = AnswerStore.entry_key(canonical.question_id, language)
+                context = self.retrieve_fn(canonical.question, language)
+                if not context:
+                    # Nothing relevant retrieved; a generated answer would only say so
+                    counts["failed"] += 1
+                    continue
+                source_hash = content_hash(context)
+                existing = self.store.entries().get(key)
+                if existing and existing["source_hash"] == source_hash:
+                    self.store.confirm(canonical.question_id, language)
+                    counts["unchanged"] += 1
+                    continue
+
+                if last_generation is not None:
+                    self.sleep(max(0.0, self.min_interval - (time.monotonic() - last_generation)))
+                if not self._wait_for_idle():
+                    logger.info("Live traffic persisted; postponing remaining precomputation.")
+                    self.store.save()
+                    return counts
+
+                last_generation = time.monotonic()
+                try:
+                    answer = self.generate_fn(canonical.question, language)
+                except Exception as e:
+                    logger.error(f"Precomputing {key} failed: {e}")
+                    answer = ""
+                if not answer or FAILED_RESPONSE_MARKER in answer:
+                    counts["failed"] += 1
+                    continue
+                self.store.put(canonical.question_id, canonical.question, language, answer, source_hash)
+                counts["generated"] += 1
+                metrics.increment("precomputed_generations")
+
+        self.store.save()
+        logger.info(f"Answer precomputation finished: {counts}")
+        return counts
+
+def start_precompute_scheduler(precomputer: AnswerPrecomputer, interval_hours: float, initial_delay: float = 30.0):
+    """
+    Runs `precomputer.refresh` on an APScheduler background thread: once shortly after
+    startup, then every `interval_hours`.
+    """
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(
+        precomputer.refresh,
+        "interval",
+        hours=interval_hours,
+        next_run_time=datetime.now() + timedelta(seconds=initial_delay),
+        max_instances=1,
+        coalesce=True,
+        id="precompute_answers",
+    )
+    scheduler.start()
+    logger.info(f"Answer precomputation scheduled every {interval_hours}h.")
+    return scheduler
@@ -0,0 +1,158 @@
+import os
+import tempfile
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+# Supported vector encodings, from largest to smallest per vector (for d=384):
+#   float32 1536 B, float16 768 B, int8 384 B, binary 48 B
+ENCODINGS = ("float32", "float16", "int8", "binary")
+
+_SCALAR_QUANTIZERS = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+def pack_binary(vectors: np.ndarray) -> np.ndarray:
+    """One bit per dimension (the sign), packed into uint8 codes for IndexBinaryFlat."""
+    return np.packbits(vectors > 0, axis=1)
+
+def _in_memory_filesystem(path: str) -> bool:
+    """True when `path` is on tmpfs/ramfs, whose pages are RAM (shmem) rather than page cache."""
+    path = os.path.realpath(path)
+    fs_type, mount_len = None, -1
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                prefix = mount_point.rstrip("/") + "/"
+                if (path == mount_point or path.startswith(prefix)) and len(mount_point) > mount_len:
+                    fs_type, mount_len = fields[2], len(mount_point)
+    except OSError:
+        return False
+    return fs_type in ("tmpfs", "ramfs")
+
+class RescoringIndex:
+    """
+    Two-stage index with the same `search(x, k) -> (D, I)` interface as a FAISS index.
+
+    Stage one shortlists `k * rescore_factor` candidates on compressed codes
+    (float16 / int8 scalar quantization, or binary codes compared by Hamming distance).
+    Stage two rescores the shortlist with exact squared L2 distances against the
+    float32 vectors. These always live in a memory-mapped file (`rescore_path`, or an
+    unlinked temporary file under VECTOR_STORE_PATH) so only the codes and the rows
+    rescoring touches stay resident. A file on tmpfs is backed by RAM, so it is reported
+    as resident.
+    """
+
+    def __init__(self, vectors: np.ndarray, encoding: str, rescore_factor: int = 4,
+                 rescore_path: Optional[str] = None):
+        if encoding not in _SCALAR_QUANTIZERS and encoding != "binary":
+            raise ValueError(f"Unsupported compressed encoding: {encoding}")
+        if encoding == "binary" and rescore_factor < 1:
+            raise ValueError("Binary codes need exact rescoring (rescore_factor >= 1) to produce L2 distances.")
+
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        self.ntotal, self.d = vectors.shape
+        self.encoding = encoding
+        self.rescore_factor = rescore_factor
+
+        if encoding == "binary":
+            self._coarse = faiss.IndexBinaryFlat(self.d)
+            self._coarse.add(pack_binary(vectors))
+        else:
+            self._coarse = faiss.IndexScalarQuantizer(self.d, _SCALAR_QUANTIZERS[encoding], faiss.METRIC_L2)
+            self._coarse.train(vectors)
+            self._coarse.add(vectors)
+
+        self._full: Optional[np.ndarray] = None
+        self._full_in_ram = False
+        if rescore_factor > 0:
+            self._full = self._store_full_vectors(vectors, rescore_path)
+            self._full_in_ram = _in_memory_filesystem(self._full.filename)
+
+    @staticmethod
+    def _store_full_vectors(vectors: np.ndarray, rescore_path: Optional[str]) -> np.memmap:
+        if rescore_path:
+            os.makedirs(os.path.dirname(rescore_path) or ".", exist_ok=True)
+            # Replaced atomically: other workers may have the current file mapped, and
+            # truncating it under them would fault their reads
+            tmp_path = f"{rescore_path}.{os.getpid()}.tmp"
+            vectors.tofile(tmp_path)
+            os.replace(tmp_path, rescore_path)
+            # Read-only mapping: pages are loaded on demand and can be evicted under pressure
+            return np.memmap(rescore_path, dtype="float32", mode="r", shape=vectors.shape)
+
+        # Not the system temp dir: /tmp is often tmpfs, where the "mapped" vectors would sit in RAM
+        scratch_dir = os.getenv("VECTOR_STORE_PATH", "vector_store")
+        os.makedirs(scratch_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".f32", dir=scratch_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                vectors.tofile(f)
+            return np.memmap(tmp_path, dtype="float32", mode="r", shape=vectors.shape)
+        finally:
+            # The mapping keeps the data reachable; the file is gone once the index is
+            os.unlink(tmp_path)
+
+    def code_nbytes(self) -> int:
+        """Bytes held by the compressed codes (what must stay resident)."""
+        if self.encoding == "binary":
+            return self.ntotal * self._coarse.code_size
+        return self.ntotal * self._coarse.sa_code_size()
+
+    def rescore_nbytes(self) -> int:
+        """Bytes of float32 vectors kept for rescoring (0 when disabled)."""
+        return 0 if self._full is None else self._full.nbytes
+
+    def resident_nbytes(self) -> int:
+        """Resident bytes: codes, plus full vectors unless they are mapped from a disk-backed file."""
+        full = 0 if self._full is None or not self._full_in_ram else self._full.nbytes
+        return self.code_nbytes() + full
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.ascontiguousarray(x, dtype="float32")
+        shortlist = min(self.ntotal, k * self.rescore_factor) if self._full is not None else k
+        if self.encoding == "binary":
+            _, candidates = self._coarse.search(pack_binary(x), shortlist)
+        else:
+            distances, candidates = self._coarse.search(x, shortlist)
+            if self._full is None:
+                return distances, candidates
+
+        D = np.full((len(x), k), np.inf, dtype="float32")
+        I = np.full((len(x), k), -1, dtype="int64")
+        for row, query in enumerate(x):
+            ids = candidates[row][candidates[row] >= 0]
+            exact = ((np.asarray(self._full[ids]) - query) ** 2).sum(axis=1)
+            order = np.argsort(exact)[:k]
+            D[row, :len(order)] = exact[order]
+            I[row, :len(order)] = ids[order]
+        return D, I
+
+def build_index(vectors: np.ndarray, encoding: str = "float32", rescore_factor: int = 4,
+                rescore_path: Optional[str] = None):
+    """
+    Builds the search index for `vectors` with the requested encoding.
+    float32 keeps the exact IndexFlatL2; other encodings return a RescoringIndex.
+    """
+    if encoding == "float32":
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(np.ascontiguousarray(vectors, dtype="float32"))
+        return index
+    return RescoringIndex(vectors, encoding, rescore_factor=rescore_factor, rescore_path=rescore_path)
+
+def index_memory(index) -> dict:
+    """Code, rescoring and resident bytes for either index type."""
+    if isinstance(index, RescoringIndex):
+        return {
+            "code_bytes": index.code_nbytes(),
+            "rescore_bytes": index.rescore_nbytes(),
+            "resident_bytes": index.resident_nbytes(),
+        }
+    code_bytes = index.ntotal * index.d * 4
+    return {"code_bytes": code_bytes, "rescore_bytes": 0, "resident_bytes": code_bytes}
@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from app.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+class EncodedResponse(NamedTuple):
+    """A JSON body serialized once, with its precompressed forms and validator."""
+    body: bytes
+    gzip: bytes
+    br: Optional[bytes]
+    etag: str
+
+class CachedAnswer(NamedTuple):
+    """
+    A cached or precomputed answer. `question` and `language` are the canonical question
+    and answer language it was stored under, so the entry can be checked against the
+    answer store before it is reused (requests without a language are keyed by None).
+    """
+    answer: str
+    question: str
+    encoded: EncodedResponse
+    language: Optional[str] = None
+
+def encode_payload(payload: Dict) -> EncodedResponse:
+    """
+    Serializes `payload` exactly like FastAPI's JSONResponse and compresses it once.
+    The ETag is weak: the identity, gzip and brotli bodies are the same representation.
+    """
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return EncodedResponse(
+        body=body,
+        gzip=gzip.compress(body, compresslevel=9, mtime=0),
+        br=brotli.compress(body, quality=11) if brotli is not None else None,
+        etag=f'W/"{hashlib.sha256(body).hexdigest()[:32]}"',
+    )
+
+def _accepted_codings(accept_encoding: str) -> Dict[str, float]:
+    codings = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            codings[coding.strip().lower()] = quality
+    return codings
+
+def negotiate_encoding(accept_encoding: str, encoded: EncodedResponse) -> str:
+    """Picks "br", "gzip" or "identity" from an Accept-Encoding header, preferring brotli."""
+    codings = _accepted_codings(accept_encoding)
+    wildcard = codings.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding == "br" and encoded.br is None:
+            continue
+        if codings.get(coding, wildcard) > 0:
+            return coding
+    return "identity"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+def encoded_response(encoded: EncodedResponse, request_headers: Headers, minimum_size: int = 0,
+                     conditional: bool = False) -> Response:
+    """
+    Serves precomputed bytes directly: the best accepted precompressed body (bodies below
+    `minimum_size` are sent uncompressed, as GZipMiddleware would), with ETag and Vary
+    headers. With `conditional`, a matching If-None-Match yields 304 Not Modified.
+    A response that already carries Content-Encoding is passed through by GZipMiddleware.
+    """
+    headers = {"ETag": encoded.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if conditional and etag_matches(request_headers.get("if-none-match"), encoded.etag):
+        metrics.increment("responses_not_modified")
+        return Response(status_code=304, headers=headers)
+
+    coding = "identity"
+    if len(encoded.body) >= minimum_size:
+        coding = negotiate_encoding(request_headers.get("accept-encoding", ""), encoded)
+    content = {"br": encoded.br, "gzip": encoded.gzip}.get(coding) or encoded.body
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(content=content, media_type="application/json", headers=headers)
+
+class ResponseCache:
+    """
+    LRU of serialized, precompressed answers keyed by (normalized query, language).
+    An entry is reused only while its answer is unchanged, so refreshed precomputed
+    answers are re-encoded on first use instead of served stale.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CachedAnswer]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def encoded(self, key: Hashable, answer: str, question: str, language: Optional[str] = None) -> EncodedResponse:
+        """The encoded {"response": answer} body, encoding and storing it unless already cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.answer == answer:
+                self._entries.move_to_end(key)
+                metrics.increment("response_cache_hits")
+                return entry.encoded
+
+        encoded = encode_payload({"response": answer})
+        metrics.increment("response_cache_encodes")
+        with self._lock:
+            self._entries[key] = CachedAnswer(answer, question, encoded, language)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return encoded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
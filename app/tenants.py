@@ -0,0 +1,233 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+from app.knowledge_base import embedding_model
+from app.lexical import LexicalHit
+from app.memory import low_memory_enabled
+from app.metrics import metrics
+from app.models import TENANT_ID_PATTERN
+from app.utils import detect_language, logger
+from app.vector_store import SNAPSHOT_INDEX_FILE, FAISSVectorStore, SearchHit, faiss_vector_store, select_hits
+
+_TENANT_ID = re.compile(TENANT_ID_PATTERN)
+
+class _LoadedTenant(NamedTuple):
+    store: FAISSVectorStore
+    resident_bytes: int
+    load_seconds: float
+
+def store_resident_bytes(store: FAISSVectorStore) -> int:
+    usage = store.memory_usage()
+    lexical = usage.get("lexical") or {}
+    return usage.get("resident_bytes", 0) + usage.get("chunk_bytes", 0) + lexical.get("resident_bytes", 0)
+
+class TenantStoreManager:
+    """
+    Per-tenant vector stores, loaded on first use from snapshots in `snapshot_dir/<tenant_id>/`
+    and evicted least-recently-used first once their resident bytes exceed `memory_budget_bytes`.
+
+    The tenant just loaded is never evicted, even if it alone exceeds the budget.
+    Cold-load time and resident bytes are recorded per tenant (see `stats`).
+    """
+
+    def __init__(self, snapshot_dir: str, memory_budget_bytes: int):
+        self.snapshot_dir = snapshot_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaded: "OrderedDict[str, _LoadedTenant]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def valid_tenant_id(tenant_id: str) -> bool:
+        return bool(_TENANT_ID.match(tenant_id))
+
+    def snapshot_path(self, tenant_id: str) -> str:
+        if not self.valid_tenant_id(tenant_id):
+            raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+        return os.path.join(self.snapshot_dir, tenant_id)
+
+    def exists(self, tenant_id: str) -> bool:
+        """True if the tenant is loaded or has a snapshot on disk."""
+        if not self.valid_tenant_id(tenant_id):
+            return False
+        return tenant_id in self._loaded or os.path.exists(os.path.join(self.snapshot_path(tenant_id), SNAPSHOT_INDEX_FILE))
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(tenant.resident_bytes for tenant in self._loaded.values())
+
+    def get(self, tenant_id: str) -> Optional[FAISSVectorStore]:
+        """Returns the tenant's store, loading it on first use; None if the tenant has no snapshot."""
+        with self._lock:
+            loaded = self._loaded.get(tenant_id)
+            if loaded is not None:
+                self._loaded.move_to_end(tenant_id)
+                metrics.increment("tenant_store_hits")
+                return loaded.store
+            if not self.exists(tenant_id):
+                return None
+            load_lock = self._load_locks.setdefault(tenant_id, threading.Lock())
+
+        # Concurrent requests for a cold tenant wait for one load instead of each loading it
+        with load_lock:
+            with self._lock:
+                loaded = self._loaded.get(tenant_id)
+                if loaded is not None:
+                    self._loaded.move_to_end(tenant_id)
+                    return loaded.store
+            return self._load(tenant_id)
+
+    def _load(self, tenant_id: str) -> FAISSVectorStore:
+        start = time.perf_counter()
+        store = FAISSVectorStore.load(self.snapshot_path(tenant_id), mmap=low_memory_enabled())
+        load_seconds = time.perf_counter() - start
+        resident = store_resident_bytes(store)
+        metrics.increment("tenant_cold_loads")
+        metrics.increment("tenant_cold_load_seconds", load_seconds)
+        logger.info(f"Loaded tenant '{tenant_id}' in {load_seconds * 1000:.1f}ms "
+                    f"({len(store._documents)} chunks, {resident / 1024:.0f} KiB).")
+
+        with self._lock:
+            self._loaded[tenant_id] = _LoadedTenant(store, resident, load_seconds)
+            self._evict(keep=tenant_id)
+        return store
+
+    def _evict(self, keep: str) -> None:
+        # Called with self._lock held
+        total = sum(tenant.resident_bytes for tenant in self._loaded.values())
+        for tenant_id in list(self._loaded):
+            if total <= self.memory_budget_bytes:
+                break
+            if tenant_id == keep:
+                continue
+            total -= self._loaded.pop(tenant_id).resident_bytes
+            metrics.increment("tenant_evictions")
+            logger.info(f"Evicted tenant '{tenant_id}' to stay within the {self.memory_budget_bytes} byte budget.")
+        if total > self.memory_budget_bytes:
+            logger.warning(f"Tenant '{keep}' alone exceeds the tenant memory budget ({total} bytes).")
+
+    def evict(self, tenant_id: str) -> bool:
+        """Drops a tenant's store, e.g. after its snapshot was rebuilt."""
+        with self._lock:
+            return self._loaded.pop(tenant_id, None) is not None
+
+    def stats(self, per_tenant: bool = True) -> Dict:
+        """
+        Loaded count, resident bytes and budget, plus (with `per_tenant`) resident bytes and
+        cold-load time per loaded tenant in LRU order (oldest first). Tenant ids name customer
+        companies, so the breakdown is for admin endpoints only.
+        """
+        with self._lock:
+            tenants = {
+                tenant_id: {
+                    "chunks": len(tenant.store._documents),
+                    "resident_bytes": tenant.resident_bytes,
+                    "load_seconds": round(tenant.load_seconds, 4),
+                }
+                for tenant_id, tenant in self._loaded.items()
+            }
+        stats = {
+            "loaded": len(tenants),
+            "resident_bytes": sum(tenant["resident_bytes"] for tenant in tenants.values()),
+            "memory_budget_bytes": self.memory_budget_bytes,
+        }
+        if per_tenant:
+            stats["tenants"] = tenants
+        return stats
+
+tenant_stores = TenantStoreManager(
+    snapshot_dir=os.getenv("TENANT_SNAPSHOT_DIR", "tenants"),
+    memory_budget_bytes=int(float(os.getenv("TENANT_MEMORY_BUDGET_MB", "256")) * 1024 * 1024),
+)
+
+def _offset_ids(hits: List, offset: int) -> List:
+    return [hit._replace(doc_id=hit.doc_id + offset) for hit in hits]
+
+def search_with_tenant(tenant_id: str, query: str, k: int = 3, max_distance: Optional[float] = None,
+                       max_gap: Optional[float] = None, base: FAISSVectorStore = faiss_vector_store,
+                       query_embedding=None) -> List[SearchHit]:
+    """
+    Dense search over the shared base corpus and the tenant's own corpus with one query embedding.
+    Both use the same embedding model, so distances are comparable and hits are merged by distance.
+    Tenant doc ids are offset by the size of the base corpus so the two id spaces don't collide.
+    """
+    try:
+        if query_embedding is None:
+            query_embedding = embedding_model.embed_query(query)
+        hits = base.search_embedding(query_embedding, k=k, max_distance=max_distance)
+    except Exception as e:
+        logger.error(f"Error during search for tenant '{tenant_id}': {e}", exc_info=True)
+        return []
+    try:
+        tenant = tenant_stores.get(tenant_id)
+        if tenant is not None:
+            tenant_hits = tenant.search_embedding(query_embedding, k=k, max_distance=max_distance)
+            hits += _offset_ids(tenant_hits, len(base._documents))
+    except Exception as e:
+        # An unreadable tenant snapshot degrades to the base corpus rather than failing the request
+        logger.error(f"Error searching the snapshot of tenant '{tenant_id}': {e}", exc_info=True)
+    hits.sort(key=lambda hit: hit.distance)
+    return select_hits(hits, max_gap=max_gap)[:k]
+
+def lexical_search_with_tenant(tenant_id: str, query: str, k: int = 3, min_score: float = 0.0,
+                               base: FAISSVectorStore = faiss_vector_store) -> List[LexicalHit]:
+    """
+    BM25 search over the base and tenant corpora, using the same doc id offset as `search_with_tenant`.
+    Scores come from separate indexes (different idf statistics) and are only used for ranking.
+    """
+    hits = base.lexical_search(query, k=k, min_score=min_score)
+    try:
+        tenant = tenant_stores.get(tenant_id)
+        if tenant is not None:
+            hits += _offset_ids(tenant.lexical_search(query, k=k, min_score=min_score), len(base._documents))
+    except Exception as e:
+        # An unreadable tenant snapshot degrades to the base corpus rather than failing the request
+        logger.error(f"Error searching the snapshot of tenant '{tenant_id}': {e}", exc_info=True)
+    hits.sort(key=lambda hit: -hit.score)
+    return hits[:k]
+
+def build_tenant_snapshot(tenant_id: str, text: str, snapshot_dir: Optional[str] = None,
+                          source: Optional[str] = None, language: Optional[str] = None) -> str:
+    """
+    Chunks a tenant's FAQ ("Qn:/An:" pairs) or policy document (headed sections), embeds it
+    and writes the snapshot. Returns the snapshot path. Chunks are tagged with `language`,
+    or with the language detected in their section when it is not given.
+    """
+    from app.chunk_store import ChunkStore
+    from app.chunking import pack_section, split_faq, split_headed
+    from app.knowledge_base import _default_token_counter
+
+    manager = TenantStoreManager(snapshot_dir, 0) if snapshot_dir else tenant_stores
+    path = manager.snapshot_path(tenant_id)
+    sections = split_faq(text) or split_headed(text)
+    count_tokens = _default_token_counter()
+    max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "128"))
+    chunks = ChunkStore()
+    for section in sections:
+        section_language = language or detect_language("\n".join(section.lines))
+        for chunk in pack_section(section, max_tokens, count_tokens):
+            chunks.append(chunk, source=source or tenant_id, section=section.title, language=section_language)
+
+    FAISSVectorStore.from_documents(chunks).save(path)
+    tenant_stores.evict(tenant_id)
+    logger.info(f"Wrote snapshot for tenant '{tenant_id}' ({len(chunks)} chunks) to {path}.")
+    return path
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a tenant knowledge-base snapshot from a text file.")
+    parser.add_argument("tenant_id")
+    parser.add_argument("file", help="FAQ (Q1:/A1: pairs) or policy document with headed sections.")
+    parser.add_argument("--snapshot-dir", default=None)
+    parser.add_argument("--language", choices=["english", "amharic", "afaan_oromo"], default=None,
+                        help="Language of the whole document (detected per section by default).")
+    args = parser.parse_args()
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        build_tenant_snapshot(args.tenant_id, f.read(), snapshot_dir=args.snapshot_dir,
+                              source=os.path.basename(args.file), language=args.language)
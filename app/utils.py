@@ -1,4 +1,6 @@
 import logging
+import re
+import unicodedata
 from typing import Literal, Dict
 
 # Configure logging
@@ -15,3 +17,54 @@ LANGUAGE_MAP: Dict[Literal["english", "amharic", "afaan_oromo"], str] = {
 def get_gemini_language_code(lang: Literal["english", "amharic", "afaan_oromo"]) -> str:
     """Maps internal language codes to Gemini-compatible language names."""
     return LANGUAGE_MAP.get(lang, "English") # Default to English if somehow an invalid lang gets through
+
+# Localized replies used when retrieval finds nothing relevant and the LLM call is skipped
+NO_CONTEXT_RESPONSES: Dict[Literal["english", "amharic", "afaan_oromo"], str] = {
+    "english": "I'm sorry, I don't have that information. Please ask about renting, listing properties or using the Rental Management System.",
+    "amharic": "ይቅርታ፣ ስለዚህ ጉዳይ መረጃ የለኝም። እባክዎ ስለ ኪራይ፣ ንብረት ስለመዘርዘር ወይም የኪራይ አስተዳደር ስርዓቱን ስለመጠቀም ይጠይቁ።",
+    "afaan_oromo": "Dhiifama, odeeffannoo kana hin qabu. Maaloo waa'ee kiraa, qabeenya galmeessuu ykn Sirna Bulchiinsa Kiraayii fayyadamuu gaafadhu.",
+}
+
+def get_no_context_response(lang: Literal["english", "amharic", "afaan_oromo"]) -> str:
+    """Returns the localized "I don't have that information" reply."""
+    return NO_CONTEXT_RESPONSES.get(lang, NO_CONTEXT_RESPONSES["english"])
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query for exact-match keys (coalescing, caches): Unicode NFKC,
+    case-folded, with whitespace collapsed.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+# Frequent English function words; Afaan Oromo text rarely contains them
+_ENGLISH_MARKERS = {
+    "the", "a", "an", "is", "are", "what", "how", "do", "does", "i", "my", "can", "to", "of",
+    "for", "in", "you", "your", "with", "which", "who", "where", "when", "should", "have",
+}
+# Frequent Afaan Oromo words (question words, pronouns, particles)
+_OROMO_MARKERS = {
+    "akkam", "akkamii", "akkamitti", "akkamittan", "maali", "maal", "eenyu", "eenyutu", "eessa",
+    "yoom", "meeqa", "maaloo", "koo", "kee", "nan", "ni", "fi", "ykn", "kun", "kana", "isin",
+    "ani", "jira", "jiraa", "danda'a", "danda'aa", "qaba", "hin", "irratti", "keessa", "wajjin",
+}
+_WORD = re.compile(r"[a-z']+")
+# Long vowels and glottal stops are typical of Oromo spelling and rare in English
+_OROMO_SPELLING = re.compile(r"aa|ii|uu|[a-z]'[a-z]|dh[aeiou]|x[aeiou]")
+
+def detect_language(text: str) -> Literal["english", "amharic", "afaan_oromo"]:
+    """
+    Cheap script and word heuristics: Ge'ez script means Amharic; Latin text is scored
+    for Afaan Oromo against English by marker words and spelling patterns.
+    """
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        return "english"
+    ethiopic = sum(1 for ch in letters if "\u1200" <= ch <= "\u137f")
+    if ethiopic / len(letters) >= 0.3:
+        return "amharic"
+
+    words = _WORD.findall(unicodedata.normalize("NFKC", text).casefold())
+    english = sum(1 for word in words if word in _ENGLISH_MARKERS)
+    oromo = 2 * sum(1 for word in words if word in _OROMO_MARKERS)
+    oromo += sum(1 for word in words if _OROMO_SPELLING.search(word))
+    return "afaan_oromo" if oromo > english else "english"
@@ -1,15 +1,69 @@
+import json
+import os
 import faiss
 import numpy as np
-from typing import List, Tuple, Optional
-from app.knowledge_base import load_and_split_documents, embedding_model
+from typing import List, Tuple, Optional, NamedTuple, Union
+from app.chunk_store import ChunkMetadata, ChunkStore
+from app.knowledge_base import load_chunk_store, embedding_model, MultilingualEmbeddings
+from app.lexical import BM25Index, LexicalHit
+from app.memory import low_memory_enabled, release_memory
+from app.parallel_embedding import ParallelEmbedder
+from app.precompute import content_hash
+from app.quantization import build_index, index_memory
 from app.utils import logger
 import threading
 
+# Snapshot layout written by FAISSVectorStore.save and read by FAISSVectorStore.load
+SNAPSHOT_INDEX_FILE = "index.faiss"
+SNAPSHOT_CHUNKS_FILE = "chunks.jsonl"
+SNAPSHOT_MANIFEST_FILE = "manifest.json"
+# Zero-copy mapping of flat index codes (FAISS >= 1.9); older versions copy the codes into memory
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+class SearchHit(NamedTuple):
+    """A retrieved chunk with its squared L2 distance to the query (lower is closer)."""
+    text: str
+    distance: float
+    doc_id: int
+
+def select_hits(hits: List[SearchHit], max_distance: Optional[float] = None,
+                max_gap: Optional[float] = None) -> List[SearchHit]:
+    """
+    Applies the distance threshold and score-gap cut-off to hits sorted by distance.
+    """
+    selected: List[SearchHit] = []
+    for hit in hits:
+        if max_distance is not None and hit.distance > max_distance:
+            break
+        if max_gap is not None and selected and hit.distance - selected[-1].distance > max_gap:
+            break
+        selected.append(hit)
+    return selected
+
 class FAISSVectorStore:
     _instance = None
     _lock = threading.Lock()
     _index: Optional[faiss.IndexFlatL2] = None
     _documents: List[str] = []
+    _chunk_store: Optional[ChunkStore] = None
+    # BM25 index over the same chunks, built on first lexical search
+    _lexical: Optional[BM25Index] = None
+    # Vector encoding: float32 (exact), float16, int8 (scalar quantization) or binary (Hamming codes)
+    _encoding: str = os.getenv("VECTOR_ENCODING", "float32")
+    # Compressed encodings shortlist k * factor candidates before exact rescoring
+    _rescore_factor: int = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+    # When set, float32 rescoring vectors are memory-mapped from this directory instead of held in RAM
+    _rescore_path: Optional[str] = (
+        os.path.join(os.environ["VECTOR_STORE_PATH"], "rescore_vectors.f32") if os.getenv("VECTOR_STORE_PATH") else None
+    )
+    # Parallel corpus embedding across worker processes (1 = embed in-process)
+    _embedding_workers: int = int(os.getenv("EMBEDDING_WORKERS", "1"))
+    _embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    # When set, finished batches are checkpointed here so an interrupted build can resume
+    _embedding_checkpoint_dir: Optional[str] = os.getenv("EMBEDDING_CHECKPOINT_DIR") or None
+    # Low-memory mode serves the index and chunk texts memory-mapped from a snapshot here
+    _snapshot_path: str = os.path.join(os.getenv("VECTOR_STORE_PATH", "vector_store"), "base")
+    _mapped: bool = False
 
     def __new__(cls):
         # Double-checked locking for thread-safe singleton creation
@@ -28,27 +82,181 @@ class FAISSVectorStore:
 
         logger.info("Initializing FAISS vector store...")
         try:
-            self._documents = load_and_split_documents()
+            self._chunk_store = load_chunk_store()
+            self._documents = self._chunk_store.texts
             if not self._documents:
                 logger.warning("No documents loaded for FAISS index.")
                 return
 
-            # Embed documents
-            document_embeddings = embedding_model.embed_documents(self._documents)
-            if not document_embeddings:
-                logger.error("Embedding documents failed, no embeddings returned.")
+            if low_memory_enabled() and self._encoding == "float32":
+                self._serve_mapped_snapshot()
                 return
-                
-            dimension = len(document_embeddings[0])
-            
-            # Create FAISS index
-            self._index = faiss.IndexFlatL2(dimension)
-            self._index.add(np.array(document_embeddings).astype('float32'))
-            logger.info(f"FAISS index initialized with {len(self._documents)} documents.")
+            self._build_index()
         except Exception as e:
             logger.error(f"Error initializing FAISS vector store: {e}", exc_info=True)
             self._index = None # Ensure index is None on failure
             self._documents = []
+            self._chunk_store = None
+
+    def _build_index(self, document_embeddings: Optional[np.ndarray] = None):
+        """Embeds the loaded documents and builds the FAISS index over them."""
+        if document_embeddings is None and self._embedding_workers > 1:
+            self._build_index_parallel()
+            return
+        if document_embeddings is None:
+            document_embeddings = embedding_model.embed_documents(self._documents)
+        if len(document_embeddings) == 0:
+            logger.error("Embedding documents failed, no embeddings returned.")
+            return
+
+        # Create FAISS index; compressed encodings shortlist on codes and rescore exactly
+        self._index = build_index(
+            np.array(document_embeddings).astype('float32'),
+            encoding=self._encoding,
+            rescore_factor=self._rescore_factor,
+            rescore_path=self._rescore_path,
+        )
+        logger.info(f"FAISS index initialized with {len(self._documents)} documents ({self._encoding}).")
+
+    def _build_index_parallel(self):
+        """
+        Embeds the documents across a process pool. Exact float32 indexes are filled
+        batch by batch as results stream in; compressed encodings need every vector
+        (for quantizer training) and are built once all batches are in.
+        """
+        embedder = ParallelEmbedder(
+            workers=self._embedding_workers,
+            batch_size=self._embedding_batch_size,
+            checkpoint_dir=self._embedding_checkpoint_dir,
+            model_id=MultilingualEmbeddings.MODEL_NAME,
+        )
+        if self._encoding != "float32":
+            self._build_index(embedder.embed(self._documents))
+            return
+
+        index = None
+        for batch in embedder.iter_embeddings(self._documents):
+            if index is None:
+                index = faiss.IndexFlatL2(batch.shape[1])
+            index.add(batch)
+        self._index = index
+        logger.info(f"FAISS index initialized with {len(self._documents)} documents "
+                    f"({self._embedding_workers} embedding workers).")
+
+    def _serve_mapped_snapshot(self):
+        """
+        Low-memory mode: serves the index and chunk texts from a memory-mapped snapshot.
+        The snapshot is (re)built only when the chunks changed, so a warm start embeds nothing;
+        the in-memory copy used to build it is dropped once it is written.
+        """
+        fingerprint = content_hash(self._documents)
+        if read_manifest(self._snapshot_path).get("fingerprint") != fingerprint:
+            logger.info(f"Building snapshot of {len(self._documents)} chunks at {self._snapshot_path}.")
+            self._build_index()
+            if self._index is None:
+                return
+            self.save(self._snapshot_path)
+            self._index = None
+            self._lexical = None
+            release_memory()
+
+        mapped = FAISSVectorStore.load(self._snapshot_path, mmap=True)
+        self._chunk_store = mapped._chunk_store
+        self._documents = mapped._documents
+        self._lexical = mapped._lexical
+        self._index = mapped._index
+        self._mapped = True
+        release_memory()
+        logger.info(f"FAISS index memory-mapped from {self._snapshot_path} ({len(self._documents)} documents).")
+
+    @classmethod
+    def from_documents(cls, documents: Union[List[str], ChunkStore], encoding: str = "float32",
+                       rescore_factor: int = 4, embeddings: Optional[np.ndarray] = None) -> "FAISSVectorStore":
+        """
+        Builds a standalone store over the given chunks, bypassing the singleton.
+        Used by the evaluation harness to compare retrieval configurations; pass
+        precomputed `embeddings` to compare encodings without re-embedding.
+        """
+        store = object.__new__(cls)
+        store._index = None
+        store._encoding = encoding
+        store._rescore_factor = rescore_factor
+        store._rescore_path = None
+        store._chunk_store = documents if isinstance(documents, ChunkStore) else None
+        store._documents = list(documents.texts if isinstance(documents, ChunkStore) else documents)
+        if store._documents:
+            store._build_index(embeddings)
+        return store
+
+    def save(self, path: str) -> None:
+        """
+        Writes a snapshot: the FAISS index (index.faiss), the chunks with their metadata
+        (chunks.jsonl), the BM25 postings (lexical_*) and a manifest with the chunk
+        fingerprint. Only exact float32 indexes can be snapshotted.
+        """
+        if not isinstance(self._index, faiss.Index):
+            raise ValueError("Only float32 (IndexFlatL2) stores can be saved as snapshots.")
+        os.makedirs(path, exist_ok=True)
+        # Files are replaced atomically: a process with the old snapshot memory-mapped keeps reading it
+        tmp_suffix = f".{os.getpid()}.tmp"
+        tmp_index = os.path.join(path, SNAPSHOT_INDEX_FILE + tmp_suffix)
+        faiss.write_index(self._index, tmp_index)
+        os.replace(tmp_index, os.path.join(path, SNAPSHOT_INDEX_FILE))
+        tmp_path = os.path.join(path, SNAPSHOT_CHUNKS_FILE + tmp_suffix)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for doc_id, text in enumerate(self._documents):
+                metadata = self.chunk_metadata(doc_id)
+                row = {"text": text, **(metadata._asdict() if metadata else {})}
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, os.path.join(path, SNAPSHOT_CHUNKS_FILE))
+        self._lexical_index().save(path)
+        manifest = {
+            "chunks": len(self._documents),
+            "model": MultilingualEmbeddings.MODEL_NAME,
+            "fingerprint": content_hash(self._documents),
+        }
+        with open(os.path.join(path, SNAPSHOT_MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "FAISSVectorStore":
+        """
+        Loads a standalone store from a snapshot written by `save`. With `mmap` the index
+        codes, chunk texts and BM25 postings are memory-mapped from the snapshot files instead
+        of copied into memory; the files must not be rewritten while the store is in use.
+        Snapshots written without postings build them on the first lexical search.
+        """
+        store = object.__new__(cls)
+        store._encoding = "float32"
+        store._rescore_factor = 0
+        store._rescore_path = None
+        store._mapped = mmap
+        store._chunk_store = ChunkStore.read_jsonl(os.path.join(path, SNAPSHOT_CHUNKS_FILE), mmap_texts=mmap)
+        store._documents = store._chunk_store.texts
+        store._lexical = BM25Index.load(path, store._documents, mmap=mmap)
+        index_path = os.path.join(path, SNAPSHOT_INDEX_FILE)
+        store._index = faiss.read_index(index_path, _MMAP_FLAG) if mmap else faiss.read_index(index_path)
+        if store._index.ntotal != len(store._documents):
+            raise ValueError(f"Snapshot {path} is inconsistent: {store._index.ntotal} vectors, {len(store._documents)} chunks.")
+        return store
+
+    def memory_usage(self) -> dict:
+        """Bytes used by the index codes, rescoring vectors, chunk texts and BM25 postings."""
+        usage = index_memory(self._index) if self._index is not None else {}
+        usage["chunk_bytes"] = self._chunk_store.nbytes() if self._chunk_store is not None else sum(
+            len(text.encode("utf-8")) for text in self._documents
+        )
+        usage["chunk_mapped_bytes"] = self._chunk_store.mapped_nbytes() if self._chunk_store is not None else 0
+        usage["lexical"] = self._lexical.memory_usage() if self._lexical is not None else None
+        # Mapped index pages are file-backed: resident while searched, reclaimable under pressure
+        usage["mapped"] = self._mapped
+        return usage
+
+    def chunk_metadata(self, doc_id: int) -> Optional[ChunkMetadata]:
+        """Returns source, section title and language for a chunk, if recorded."""
+        if self._chunk_store is None:
+            return None
+        return self._chunk_store.metadata(doc_id)
 
     def get_index(self):
         """Returns the FAISS index, initializing it if necessary."""
@@ -59,9 +267,13 @@ class FAISSVectorStore:
                     self._initialize_store()
         return self._index
 
-    def search(self, query: str, k: int = 3) -> List[str]:
+    def search_with_scores(self, query: str, k: int = 3, max_distance: Optional[float] = None,
+                           max_gap: Optional[float] = None, query_embedding=None) -> List["SearchHit"]:
         """
-        Searches the FAISS index for the top-k most similar documents.
+        Searches the FAISS index and returns up to k hits with their L2 distances.
+        Hits beyond `max_distance` are dropped and, when `max_gap` is set, the list is cut
+        at the first jump in distance larger than the gap (adaptive k).
+        The query is embedded here unless the caller already has its `query_embedding`.
         """
         index = self.get_index()
         if index is None:
@@ -69,18 +281,61 @@ class FAISSVectorStore:
             return []
 
         try:
-            query_embedding = embedding_model.embed_query(query)
-            D, I = index.search(np.array([query_embedding]).astype('float32'), k)
-            
-            results = []
-            for i in I[0]:
-                if i != -1: # -1 indicates no result found for that slot
-                    results.append(self._documents[i])
-            return results
+            if query_embedding is None:
+                query_embedding = embedding_model.embed_query(query)
+            return self.search_embedding(query_embedding, k=k, max_distance=max_distance, max_gap=max_gap)
         except Exception as e:
             logger.error(f"Error during FAISS search: {e}", exc_info=True)
             return []
 
+    def search_embedding(self, query_embedding, k: int = 3, max_distance: Optional[float] = None,
+                         max_gap: Optional[float] = None) -> List["SearchHit"]:
+        """
+        Same as `search_with_scores` for an already-embedded query, so one embedding can be
+        searched against several stores (e.g. the base corpus and a tenant's).
+        """
+        index = self.get_index()
+        if index is None:
+            return []
+        D, I = index.search(np.array([query_embedding]).astype('float32'), k)
+
+        hits = []
+        for distance, i in zip(D[0], I[0]):
+            if i != -1: # -1 indicates no result found for that slot
+                hits.append(SearchHit(text=self._documents[i], distance=float(distance), doc_id=int(i)))
+        return select_hits(hits, max_distance=max_distance, max_gap=max_gap)
+
+    def lexical_search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[LexicalHit]:
+        """
+        BM25 search over the same chunks as the FAISS index; doc ids are shared, so
+        lexical and dense rankings can be fused.
+        """
+        if self.get_index() is None:
+            return []
+        return self._lexical_index().search(query, k=k, min_score=min_score)
+
+    def _lexical_index(self) -> BM25Index:
+        lexical = self._lexical
+        if lexical is None or len(lexical) != len(self._documents):
+            lexical = self._lexical = BM25Index(self._documents)
+        return lexical
+
+    def search(self, query: str, k: int = 3, max_distance: Optional[float] = None,
+               max_gap: Optional[float] = None) -> List[str]:
+        """
+        Searches the FAISS index for the top-k most similar documents.
+        """
+        hits = self.search_with_scores(query, k=k, max_distance=max_distance, max_gap=max_gap)
+        return [hit.text for hit in hits]
+
+def read_manifest(path: str) -> dict:
+    """The manifest written by `FAISSVectorStore.save`, or {} if the snapshot is missing or unreadable."""
+    try:
+        with open(os.path.join(path, SNAPSHOT_MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
 # Global instance for lazy loading
 faiss_vector_store = FAISSVectorStore()
 
@@ -0,0 +1,140 @@
+import asyncio
+import time
+import pytest
+from app.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    PRIORITY_ANONYMOUS,
+    PRIORITY_AUTHENTICATED,
+    PRIORITY_LANDLORD,
+)
+
+def test_admits_up_to_limit_then_queues():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, max_queue=4, queue_timeout=1.0)
+        await controller.acquire()
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        assert controller.queue_length() == 1
+        controller.release(service_time=0.01)
+        await waiter
+        assert controller.in_flight == 2
+        assert controller.queue_length() == 0
+
+    asyncio.run(scenario())
+
+def test_full_queue_rejects_with_429_and_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=1.0, target_queue_delay=10)
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.status_code == 429
+        assert rejected.value.retry_after >= 1
+        waiter.cancel()
+
+    asyncio.run(scenario())
+
+def test_queue_deadline_rejects_with_503():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        await controller.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.status_code == 503
+        assert controller.queue_length() == 0
+
+    asyncio.run(scenario())
+
+def test_priority_order_and_displacement():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=2, queue_timeout=1.0, target_queue_delay=10)
+        await controller.acquire()
+        order = []
+
+        async def wait(name, priority):
+            await controller.acquire(priority)
+            order.append(name)
+
+        anonymous = asyncio.ensure_future(wait("anonymous", PRIORITY_ANONYMOUS))
+        authenticated = asyncio.ensure_future(wait("authenticated", PRIORITY_AUTHENTICATED))
+        await asyncio.sleep(0)
+        # Queue is full; a landlord displaces the anonymous waiter
+        landlord = asyncio.ensure_future(wait("landlord", PRIORITY_LANDLORD))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await anonymous
+
+        controller.release(service_time=0.01)
+        await landlord
+        controller.release(service_time=0.01)
+        await authenticated
+        return order
+
+    assert asyncio.run(scenario()) == ["landlord", "authenticated"]
+
+def _p99(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+
+def test_p99_latency_bounded_under_3x_overload():
+    """
+    Load-test scenario: capacity is 4 concurrent requests x 50 ms = 80 req/s.
+    Offer 240 req/s (3x) for one second and check admitted requests stay fast
+    while the excess is shed quickly rather than queued until it times out.
+    """
+    service_time = 0.05
+    max_in_flight = 4
+    offered_rps = 3 * max_in_flight / service_time
+    queue_timeout = 0.5
+    target_queue_delay = 0.1
+
+    async def scenario():
+        controller = AdmissionController(
+            max_in_flight=max_in_flight, max_queue=8, queue_timeout=queue_timeout,
+            target_queue_delay=target_queue_delay,
+        )
+        admitted, rejected = [], []
+
+        async def one_request():
+            start = time.monotonic()
+            try:
+                async with controller.admit():
+                    await asyncio.sleep(service_time)
+                admitted.append(time.monotonic() - start)
+            except AdmissionRejected:
+                rejected.append(time.monotonic() - start)
+
+        tasks = []
+        for _ in range(int(offered_rps)):
+            tasks.append(asyncio.ensure_future(one_request()))
+            await asyncio.sleep(1 / offered_rps)
+        await asyncio.gather(*tasks)
+        return admitted, rejected
+
+    admitted, rejected = asyncio.run(scenario())
+
+    assert admitted and rejected
+    # Roughly capacity is served; the rest is shed
+    assert len(admitted) <= 1.5 * max_in_flight / service_time
+    # Queueing delay of admitted requests stays near its target, far below the queue timeout
+    assert _p99(admitted) < service_time + 2 * target_queue_delay
+    # Rejections are fast, not timeouts
+    assert _p99(rejected) < queue_timeout
+
+def test_release_callback_holds_the_slot_until_called():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        await controller.acquire()
+        release = controller.release_callback()
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        release()
+        assert controller.in_flight == 0
+        await controller.acquire()
+
+    asyncio.run(scenario())
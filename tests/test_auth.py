@@ -0,0 +1,27 @@
+import time
+from app.auth import _b64encode, bearer_claims, sign_token, verify_token
+
+SECRET = "test-secret"
+
+def test_signed_token_roundtrip():
+    token = sign_token({"role": "landlord", "exp": time.time() + 60}, SECRET)
+    assert verify_token(token, SECRET)["role"] == "landlord"
+    assert bearer_claims(f"Bearer {token}", SECRET)["role"] == "landlord"
+
+def test_forged_tampered_and_expired_tokens_are_rejected():
+    token = sign_token({"role": "tenant"}, SECRET)
+    header, payload, signature = token.split(".")
+    forged_payload = _b64encode(b'{"role":"landlord"}')
+    assert verify_token(f"{header}.{forged_payload}.{signature}", SECRET) is None
+    assert verify_token(token, "other-secret") is None
+    unsigned = _b64encode(b'{"alg":"none","typ":"JWT"}')
+    assert verify_token(f"{unsigned}.{forged_payload}.", SECRET) is None
+    assert verify_token(sign_token({"role": "landlord", "exp": time.time() - 1}, SECRET), SECRET) is None
+    assert verify_token("not-a-token", SECRET) is None
+    assert verify_token(token, "") is None  # no secret configured: nothing verifies
+
+def test_bearer_header_parsing():
+    token = sign_token({"role": "tenant"}, SECRET)
+    assert bearer_claims(None, SECRET) is None
+    assert bearer_claims(f"Basic {token}", SECRET) is None
+    assert bearer_claims("Bearer ", SECRET) is None
@@ -1,27 +1,110 @@
-from app.chatbot_graph import retrieve, generate, ChatbotState, chatbot_graph
-from app.vector_store import faiss_vector_store
+from app.chatbot_graph import (
+    embed_query, dense_retrieve, lexical_retrieve, cache_probe, detect_query_language, merge, generate, no_context,
+    route_after_merge, ChatbotState, chatbot_graph, answer_store,
+)
+from app.config import config
+from app.evaluation import GOLD_QUERIES, OUT_OF_DOMAIN_QUERIES
+from app.lexical import LexicalHit
+from app.metrics import metrics
+from app.utils import NO_CONTEXT_RESPONSES, detect_language
+from app.vector_store import faiss_vector_store, SearchHit
 from unittest.mock import patch, MagicMock
+import time
 import pytest
 from typing import Dict, Any
 
 @pytest.fixture
 def mock_faiss_search():
-    with patch('app.vector_store.FAISSVectorStore.search') as mock_search:
-        mock_search.return_value = ["context chunk 1", "context chunk 2"]
+    with patch('app.vector_store.FAISSVectorStore.search_with_scores') as mock_search:
+        mock_search.return_value = [SearchHit("context chunk 1", 0.4, 0), SearchHit("context chunk 2", 0.5, 1)]
         yield mock_search
 
+@pytest.fixture
+def mock_embed_query():
+    with patch('app.chatbot_graph.embedding_model.embed_query', return_value=[0.6, 0.8]) as mock_embed:
+        yield mock_embed
+
 @pytest.fixture
 def mock_llm_invoke():
     with patch('app.chatbot_graph.llm.invoke') as mock_invoke:
         mock_invoke.return_value = MagicMock(content="Mocked LLM response")
         yield mock_invoke
 
-def test_retrieve_node(mock_faiss_search):
+def test_dense_retrieve_node(mock_faiss_search):
     state = ChatbotState(query="test query", language="english")
-    result = retrieve(state)
-    assert "context" in result
-    assert result["context"] == ["context chunk 1", "context chunk 2"]
-    mock_faiss_search.assert_called_once_with("test query", k=3)
+    result = dense_retrieve(state)
+    assert [hit.text for hit in result["dense_hits"]] == ["context chunk 1", "context chunk 2"]
+    assert "dense_retrieve" in result["branch_timings"]
+    mock_faiss_search.assert_called_once_with(
+        "test query", k=config.RETRIEVAL_K, max_distance=config.RETRIEVAL_MAX_DISTANCE, max_gap=config.RETRIEVAL_MAX_GAP,
+        query_embedding=None,
+    )
+
+@patch('app.vector_store.FAISSVectorStore.lexical_search', return_value=[LexicalHit("chunk", 6.0, 4)])
+def test_lexical_retrieve_node(mock_lexical):
+    result = lexical_retrieve(ChatbotState(query="payment methods", language="english"))
+    assert result["lexical_hits"] == [LexicalHit("chunk", 6.0, 4)]
+    mock_lexical.assert_called_once_with("payment methods", k=config.RETRIEVAL_K, min_score=config.LEXICAL_MIN_SCORE)
+
+def test_embed_query_node_degrades_to_per_branch_embedding():
+    with patch('app.chatbot_graph.embedding_model.embed_query', side_effect=RuntimeError("model unavailable")):
+        assert embed_query(ChatbotState(query="q"))["query_embedding"] is None
+
+@patch('app.vector_store.FAISSVectorStore.lexical_search', return_value=[])
+@patch('app.vector_store.FAISSVectorStore.search_with_scores', return_value=[])
+def test_graph_embeds_the_query_once(mock_faiss, mock_lexical, mock_embed_query):
+    with patch.object(answer_store, 'match_question', return_value=None) as mock_match:
+        chatbot_graph.invoke(ChatbotState(query="what's the weather", language="english"))
+    mock_embed_query.assert_called_once_with("what's the weather")
+    assert mock_match.call_args.kwargs["query_embedding"] == [0.6, 0.8]
+    assert mock_faiss.call_args.kwargs["query_embedding"] == [0.6, 0.8]
+
+def test_cache_probe_respects_skip_cache():
+    with patch.object(answer_store, 'match_question', return_value="What if I forget my password?") as mock_match:
+        assert cache_probe(ChatbotState(query="forgot password", language="english"))["cached_question"] == \
+            "What if I forget my password?"
+        assert cache_probe(ChatbotState(query="forgot password", language="english", skip_cache=True))["cached_question"] is None
+        assert cache_probe(ChatbotState(query="forgot password", language="english", tenant_id="acme"))["cached_question"] is None
+    mock_match.assert_called_once()
+
+def test_detect_language_on_gold_queries():
+    for gold in GOLD_QUERIES + OUT_OF_DOMAIN_QUERIES:
+        assert detect_language(gold.query) == gold.language, gold.query
+    assert detect_query_language(ChatbotState(query="Akkam jirtu?"))["detected_language"] == "afaan_oromo"
+
+def test_merge_fuses_dense_and_lexical_rankings():
+    state = ChatbotState(
+        query="q",
+        language=None,
+        detected_language="amharic",
+        dense_hits=[SearchHit("a", 0.4, 0), SearchHit("b", 0.6, 1)],
+        lexical_hits=[LexicalHit("b", 9.0, 1), LexicalHit("c", 5.0, 2)],
+    )
+    result = merge(state)
+    # "b" is ranked by both branches, so it fuses ahead of "a"; "c" is lexical-only
+    assert result["context"] == ["b", "a", "c"][:config.RETRIEVAL_K]
+    assert result["context_scores"] == [0.6, 0.4, config.RETRIEVAL_MAX_DISTANCE][:config.RETRIEVAL_K]
+    assert result["language"] == "amharic"
+    assert result["cached_response"] is None
+
+def test_merge_forced_language_and_cached_answer():
+    with patch.object(answer_store, 'lookup_exact', return_value="cached answer") as mock_lookup:
+        result = merge(ChatbotState(query="q", language="english", detected_language="afaan_oromo",
+                                    cached_question="Q?", dense_hits=[], lexical_hits=[]))
+    mock_lookup.assert_called_once_with("Q?", "english")
+    assert result["language"] == "english"
+    assert result["cached_response"] == "cached answer"
+
+def test_route_after_merge():
+    assert route_after_merge(ChatbotState(query="q", language="english", cached_response="hi", context=[])) == "serve_cached"
+    assert route_after_merge(ChatbotState(query="q", language="english", context=["chunk"])) == "generate"
+    assert route_after_merge(ChatbotState(query="q", language="english", context=[])) == "no_context"
+
+def test_no_context_node_is_localized():
+    before = metrics.get("no_context_short_circuits")
+    result = no_context(ChatbotState(query="የአየር ሁኔታው እንዴት ነው?", language="amharic"))
+    assert result["response"] == NO_CONTEXT_RESPONSES["amharic"]
+    assert metrics.get("no_context_short_circuits") == before + 1
 
 def test_generate_node_success(mock_llm_invoke):
     state = ChatbotState(query="test query", language="english", context=["context chunk 1"])
@@ -35,11 +118,42 @@ def test_generate_node_llm_failure(mock_llm_invoke):
     state = ChatbotState(query="test query", language="english", context=["context chunk 1"])
     result = generate(state)
     assert "response" in result
-    assert "Sorry, I encountered an issue" in result["response"]
+    assert result["fallback"] is True
+    assert "context chunk 1" in result["response"]
+
+FAQ_CHUNK = (
+    "Q7: What if I forget my password?\nA7: Click on the \"Forgot Password\" link on the login page "
+    "and follow the instructions to reset your password."
+)
 
-@patch('app.vector_store.FAISSVectorStore.search', return_value=["graph context 1"])
+@patch('app.chatbot_graph._invoke_llm')
+def test_generate_falls_back_when_llm_is_slow(mock_invoke_llm):
+    mock_invoke_llm.side_effect = lambda *args: time.sleep(1.0) or "late answer"
+    state = ChatbotState(query="I forgot my password", language="english", context=[FAQ_CHUNK],
+                         context_scores=[0.4], latency_budget=0.2)
+    before = metrics.get("llm_timeouts")
+    start = time.perf_counter()
+    result = generate(state)
+    assert time.perf_counter() - start < 0.6
+    assert result["fallback"] is True
+    assert "Forgot Password" in result["response"]
+    assert metrics.get("llm_timeouts") == before + 1
+
+@patch('app.chatbot_graph._invoke_llm', side_effect=RuntimeError("503 from upstream"))
+def test_generate_falls_back_when_llm_fails(mock_invoke_llm):
+    state = ChatbotState(query="ፓስወርድ ረሳሁ", language="amharic", context=[FAQ_CHUNK], context_scores=[0.5])
+    result = generate(state)
+    assert result["fallback"] is True
+    assert result["response"].startswith("በእገዛ ሰነዶቻችን")
+
+@patch('app.chatbot_graph._invoke_llm', return_value="Gemini answer")
+def test_generate_within_budget_is_not_flagged(mock_invoke_llm):
+    result = generate(ChatbotState(query="q", language="english", context=[FAQ_CHUNK], context_scores=[0.4]))
+    assert result == {"response": "Gemini answer"}
+
+@patch('app.vector_store.FAISSVectorStore.search_with_scores', return_value=[SearchHit("graph context 1", 0.3, 0)])
 @patch('app.chatbot_graph.llm.invoke', return_value=MagicMock(content="Graph test response"))
-def test_chatbot_graph_end_to_end(mock_llm, mock_faiss):
+def test_chatbot_graph_end_to_end(mock_llm, mock_faiss, mock_embed_query):
     # Ensure FAISS is initialized for the graph to run
     _ = faiss_vector_store
     
@@ -48,5 +162,44 @@ def test_chatbot_graph_end_to_end(mock_llm, mock_faiss):
     
     assert "response" in result
     assert result["response"] == "Graph test response"
-    mock_faiss.assert_called_once_with("graph query", k=3)
+    mock_faiss.assert_called_once()
     mock_llm.assert_called_once()
+
+@patch('app.vector_store.FAISSVectorStore.lexical_search', return_value=[])
+@patch('app.vector_store.FAISSVectorStore.search_with_scores', return_value=[])
+@patch('app.chatbot_graph.llm')
+def test_chatbot_graph_short_circuits_without_context(mock_llm, mock_faiss, mock_lexical, mock_embed_query):
+    result = chatbot_graph.invoke(ChatbotState(query="what's the weather", language="english"))
+    assert result["response"] == NO_CONTEXT_RESPONSES["english"]
+    mock_llm.invoke.assert_not_called()
+
+@patch('app.vector_store.FAISSVectorStore.lexical_search', return_value=[])
+@patch('app.vector_store.FAISSVectorStore.search_with_scores', return_value=[SearchHit("chunk", 0.3, 0)])
+def test_chatbot_graph_serves_cached_paraphrase(mock_faiss, mock_lexical, mock_embed_query):
+    with patch.object(answer_store, 'match_question', return_value="Q?"), \
+            patch.object(answer_store, 'lookup_exact', return_value="የተዘጋጀ መልስ"):
+        result = chatbot_graph.invoke(ChatbotState(query="ሰላም፣ የይለፍ ቃሌን ረሳሁ"))
+    assert result["language"] == "amharic"
+    assert result["response"] == "የተዘጋጀ መልስ"
+
+def test_branches_run_concurrently(mock_embed_query):
+    delay = 0.3
+
+    def slow(value):
+        def fn(*args, **kwargs):
+            time.sleep(delay)
+            return value
+        return fn
+
+    with patch('app.vector_store.FAISSVectorStore.search_with_scores', side_effect=slow([])), \
+            patch('app.vector_store.FAISSVectorStore.lexical_search', side_effect=slow([])), \
+            patch.object(answer_store, 'match_question', side_effect=slow(None)):
+        start = time.perf_counter()
+        result = chatbot_graph.invoke(ChatbotState(query="q", language="english"))
+        elapsed = time.perf_counter() - start
+
+    timings = result["branch_timings"]
+    assert set(timings) == {"embed_query", "cache_probe", "detect_language", "dense_retrieve", "lexical_retrieve"}
+    assert all(timings[name] >= delay for name in ("cache_probe", "dense_retrieve", "lexical_retrieve"))
+    # Critical path is the slowest branch, not the sum of the three slow ones
+    assert elapsed < 2 * delay
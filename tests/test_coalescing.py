@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from app.coalescing import SingleFlight
+from app.metrics import metrics
+from app.utils import normalize_query
+
+def test_normalize_query():
+    assert normalize_query("  How do I   REGISTER? ") == "how do i register?"
+    assert normalize_query("ሰላም  ሰላም") == "ሰላም ሰላም"
+
+def test_identical_calls_share_one_execution():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"response": "shared"}
+
+    async def scenario():
+        flight = SingleFlight(name="test_share")
+        results = await asyncio.gather(*(flight.do(("q", "english"), work) for _ in range(5)))
+        return flight, results
+
+    before = metrics.get("test_share_coalesced")
+    flight, results = asyncio.run(scenario())
+    assert calls == 1
+    assert all(result == {"response": "shared"} for result in results)
+    assert metrics.get("test_share_coalesced") == before + 4
+    assert flight.in_flight() == 0
+
+def test_different_keys_run_separately():
+    calls = []
+
+    async def scenario():
+        flight = SingleFlight(name="test_keys")
+
+        def work_for(key):
+            async def work():
+                calls.append(key)
+                await asyncio.sleep(0.01)
+                return key
+            return work
+
+        return await asyncio.gather(flight.do("a", work_for("a")), flight.do("b", work_for("b")))
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+def test_errors_propagate_to_every_waiter():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def scenario():
+        flight = SingleFlight(name="test_errors")
+        return await asyncio.gather(*(flight.do("q", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_cancelled_waiter_does_not_cancel_shared_work():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight(name="test_cancel_one")
+        first = asyncio.ensure_future(flight.do("q", work))
+        second = asyncio.ensure_future(flight.do("q", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+def test_last_waiter_cancelling_cancels_work():
+    state = {"finished": False}
+
+    async def work():
+        await asyncio.sleep(0.2)
+        state["finished"] = True
+        return "late"
+
+    async def scenario():
+        flight = SingleFlight(name="test_cancel_all")
+        caller = asyncio.ensure_future(flight.do("q", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        assert flight.in_flight() == 0
+        # A new caller starts a fresh execution instead of joining the cancelled one
+        return await flight.do("q", work)
+
+    assert asyncio.run(scenario()) == "late"
+
+def test_uninterruptible_work_stays_joinable_after_its_callers_leave():
+    calls = []
+    done = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "finished"
+
+    async def scenario():
+        flight = SingleFlight(name="test_uninterruptible")
+        caller = asyncio.ensure_future(flight.do("q", work, interruptible=False, on_done=lambda: done.append(1)))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # The abandoned execution is still running and still holds the caller's on_done
+        assert flight.is_in_flight("q") and not done
+        result = await flight.do("q", work)
+        assert flight.in_flight() == 0
+        return result
+
+    assert asyncio.run(scenario()) == "finished"
+    assert calls == [1] and done == [1]
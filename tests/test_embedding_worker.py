@@ -0,0 +1,142 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.embedding_worker import (
+    EmbeddingWorkerError, EmbeddingWorkerPool, EmbeddingWorkerTimeout, RemoteEncodeError,
+    decode_request, decode_response, encode_error, encode_request, encode_response, serve,
+)
+from app.knowledge_base import MultilingualEmbeddings
+
+def _fake_encode(texts):
+    if "fail" in texts:
+        raise ValueError("cannot embed 'fail'")
+    return np.array([[len(text), text.count("a"), 1.0] for text in texts], dtype="float32")
+
+# A stand-in worker: same protocol and serve loop, with fake vectors and scripted misbehaviour
+FAKE_WORKER = f"""
+import os, sys, time
+sys.path.insert(0, {os.getcwd()!r})
+from app.embedding_worker import serve
+from tests.test_embedding_worker import _fake_encode
+
+def encode(texts):
+    if "crash" in texts:
+        os._exit(3)
+    if "slow" in texts:
+        time.sleep(5)
+    return _fake_encode(texts)
+
+serve(sys.stdin.buffer, sys.stdout.buffer, encode, ready_dim=3)
+"""
+
+def _reader(data):
+    return io.BytesIO(data).read
+
+def test_request_roundtrip_with_multilingual_text():
+    texts = ["How do I register?", "ሰላም አለም", "Akkam jirtu", ""]
+    read = _reader(encode_request(texts))
+    assert decode_request(read) == texts
+    assert decode_request(read) is None  # clean end of stream
+
+def test_response_roundtrip_is_compact_float32():
+    vectors = np.arange(12, dtype="float32").reshape(3, 4) / 7
+    payload = encode_response(vectors)
+    assert len(payload) == 12 + vectors.nbytes
+    np.testing.assert_array_equal(decode_response(_reader(payload)), vectors)
+
+def test_error_response_and_truncated_stream():
+    with pytest.raises(RemoteEncodeError, match="boom"):
+        decode_response(_reader(encode_error("boom")))
+    with pytest.raises(EmbeddingWorkerError):
+        decode_response(_reader(encode_response(np.ones((2, 3)))[:-1]))
+
+def test_serve_over_os_pipe():
+    request_r, request_w = os.pipe()
+    response_r, response_w = os.pipe()
+    with os.fdopen(request_r, "rb") as in_stream, os.fdopen(response_w, "wb") as out_stream:
+        server = threading.Thread(target=serve, args=(in_stream, out_stream, _fake_encode), kwargs={"ready_dim": 3})
+        server.start()
+        with os.fdopen(request_w, "wb") as client_out, os.fdopen(response_r, "rb") as client_in:
+            read = client_in.read
+            assert decode_response(read).shape == (0, 3)  # ready announcement
+
+            client_out.write(encode_request(["aa", "abc"]))
+            client_out.flush()
+            np.testing.assert_array_equal(decode_response(read), [[2, 2, 1], [3, 1, 1]])
+
+            # An encoding error is reported, and the worker keeps serving
+            client_out.write(encode_request(["fail"]))
+            client_out.flush()
+            with pytest.raises(RemoteEncodeError, match="cannot embed"):
+                decode_response(read)
+            client_out.write(encode_request(["a"]))
+            client_out.flush()
+            assert decode_response(read).tolist() == [[1, 1, 1]]
+            client_out.close()  # EOF ends the serve loop
+            server.join(timeout=5)
+            assert not server.is_alive()
+
+@pytest.fixture
+def pool():
+    pool = EmbeddingWorkerPool(size=1, timeout=2.0, startup_timeout=30.0, command=[sys.executable, "-c", FAKE_WORKER])
+    yield pool
+    pool.shutdown()
+
+def test_pool_embeds_in_a_subprocess(pool):
+    np.testing.assert_array_equal(pool.embed(["aa", "b"]), [[2, 2, 1], [1, 0, 1]])
+    pids = pool.pids()
+    assert len(pids) == 1 and pids[0] != os.getpid()
+    assert pool.embed([]).shape == (0, 0)
+
+def test_pool_reports_remote_errors_without_restarting(pool):
+    pool.embed(["a"])
+    pid = pool.pids()
+    with pytest.raises(RemoteEncodeError):
+        pool.embed(["fail"])
+    assert pool.pids() == pid
+
+def test_pool_restarts_dead_and_timed_out_workers(pool):
+    pool.embed(["a"])
+    first = pool.pids()
+
+    with pytest.raises(EmbeddingWorkerError):
+        pool.embed(["crash"])  # dies, is retried once on a fresh worker, dies again
+    assert pool.embed(["a"]).tolist() == [[1, 1, 1]]
+    second = pool.pids()
+    assert second != first
+
+    with pytest.raises(EmbeddingWorkerTimeout):
+        pool.embed(["slow"])
+    assert pool.pids() == []
+    assert pool.embed(["a"]).tolist() == [[1, 1, 1]]
+    assert pool.pids() not in ([], second)
+
+def test_multilingual_embeddings_uses_worker_pool_in_subprocess_mode(pool):
+    with patch.dict(os.environ, {"EMBEDDING_WORKER_MODE": "subprocess"}), \
+            patch.object(MultilingualEmbeddings, '_worker_pool', pool), \
+            patch.object(MultilingualEmbeddings, 'get_embedding_model') as mock_model:
+        embeddings = MultilingualEmbeddings()
+        assert embeddings.embed_documents(["aa", "b"]) == [[2.0, 2.0, 1.0], [1.0, 0.0, 1.0]]
+        assert embeddings.embed_query("aaa") == [3.0, 3.0, 1.0]
+    mock_model.assert_not_called()
+
+def test_subprocess_mode_embeds_documents_in_bounded_requests(pool):
+    texts = [f"text {i}" + "a" * (i % 3) for i in range(7)]
+    with patch.dict(os.environ, {"EMBEDDING_WORKER_MODE": "subprocess", "EMBEDDING_BATCH_SIZE": "3"}), \
+            patch.object(MultilingualEmbeddings, '_worker_pool', pool), \
+            patch.object(pool, 'embed', wraps=pool.embed) as mock_embed:
+        embeddings = MultilingualEmbeddings().embed_documents(texts)
+    assert [len(call.args[0]) for call in mock_embed.call_args_list] == [3, 3, 1]
+    assert embeddings == _fake_encode(texts).tolist()
+
+def test_subprocess_mode_keeps_torch_out_of_the_web_process():
+    env = dict(os.environ, EMBEDDING_WORKER_MODE="subprocess", GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY") or "test-key")
+    script = "import sys, app.main; print('torch' in sys.modules, 'sentence_transformers' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, cwd=os.getcwd(), timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "False False"
@@ -0,0 +1,86 @@
+from app.evaluation import (
+    GOLD_QUERIES,
+    GoldQuery,
+    compression_report,
+    evaluate_out_of_domain,
+    evaluate_retrieval,
+    first_relevant_rank,
+    format_compression_report,
+    format_report,
+    store_search,
+)
+from app.knowledge_base import FAQ_TEXT, DOCX_SUMMARY_TEXT, load_and_split_documents
+from unittest.mock import MagicMock, patch
+import numpy as np
+
+def test_gold_set_covers_all_languages():
+    languages = {gold.language for gold in GOLD_QUERIES}
+    assert languages == {"english", "amharic", "afaan_oromo"}
+    # Every topic is asked once per language
+    assert len(GOLD_QUERIES) % 3 == 0
+
+def test_gold_anchors_exist_in_knowledge_base():
+    corpus = FAQ_TEXT + DOCX_SUMMARY_TEXT
+    chunks = load_and_split_documents()
+    for gold in GOLD_QUERIES:
+        assert any(anchor in corpus for anchor in gold.anchors)
+        assert any(first_relevant_rank([chunk], gold.anchors) for chunk in chunks)
+
+def test_first_relevant_rank():
+    assert first_relevant_rank(["a", "Q2: register", "Q1: types"], ("Q1:",)) == 3
+    assert first_relevant_rank(["a", "b"], ("Q1:",)) is None
+
+def test_evaluate_retrieval_metrics():
+    queries = [
+        GoldQuery("hit first", "english", ("Q1:",)),
+        GoldQuery("hit second", "amharic", ("Q1:",)),
+        GoldQuery("miss", "afaan_oromo", ("Q1:",)),
+    ]
+    answers = {
+        "hit first": ["Q1: types", "other"],
+        "hit second": ["other", "Q1: types"],
+        "miss": ["other", "other"],
+    }
+    report = evaluate_retrieval(lambda query, k: answers[query][:k], k=2, queries=queries, warmup=False)
+
+    assert report["overall"]["recall@2"] == 2 / 3
+    assert report["overall"]["mrr"] == (1 + 0.5) / 3
+    assert report["by_language"]["amharic"]["mrr"] == 0.5
+    assert report["by_language"]["afaan_oromo"]["recall@2"] == 0.0
+    assert len(report["per_query"]) == 3
+    assert all(row["latency_ms"] >= 0 for row in report["per_query"])
+    assert "miss" in format_report(report)
+
+def test_store_search_passes_configuration():
+    store = MagicMock()
+    store.search.return_value = ["chunk"]
+    search = store_search(store)
+    assert search("query", 5) == ["chunk"]
+    store.search.assert_called_once_with("query", k=5)
+
+def test_evaluate_out_of_domain():
+    # A search that only answers the gold queries rejects every out-of-domain query
+    gold_texts = {gold.query for gold in GOLD_QUERIES}
+    search = lambda query, k: ["chunk"] if query in gold_texts else []
+    report = evaluate_out_of_domain(search, k=3)
+    assert report["out_of_domain_rejection_rate"] == 1.0
+    assert report["in_domain_false_rejection_rate"] == 0.0
+
+@patch('app.vector_store.embedding_model')
+def test_compression_report_covers_all_encodings(mock_embedding):
+    # Documents embed to distinct unit vectors; each gold query maps onto its expected chunk
+    documents = [f"{gold.anchors[0]} chunk" for gold in GOLD_QUERIES[::3]]
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((len(documents), 64)).astype("float32")
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    by_query = {gold.query: embeddings[i // 3] for i, gold in enumerate(GOLD_QUERIES)}
+    mock_embedding.embed_query.side_effect = lambda text: by_query[text].tolist()
+
+    rows = compression_report(documents, embeddings, k=3)
+    assert [row["encoding"] for row in rows] == ["float32", "float16", "int8", "binary"]
+    assert rows[0]["bytes_per_vector"] == 64 * 4
+    # Binary codes still carry float32 rescoring vectors, but only the codes stay resident
+    assert rows[-1]["bytes_per_vector"] == 64 / 8 + 64 * 4
+    assert rows[-1]["resident_mb_per_million"] < rows[0]["resident_mb_per_million"] / 16
+    assert all(row["recall@3"] == 1.0 for row in rows)
+    assert "binary" in format_compression_report(rows, k=3)
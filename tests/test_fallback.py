@@ -0,0 +1,44 @@
+from app.fallback import FALLBACK_PREFIXES, extractive_answer, score_sentences, split_sentences
+
+FAQ_CHUNK = (
+    "Q4: What payment methods are supported?\n"
+    "A4: We accept various payment methods including bank transfers, credit/debit cards, and mobile money."
+)
+LIMITATIONS_CHUNK = (
+    "**Current Limitations**:\n"
+    "• Rent payments are offline (cash/bank) – online payment coming soon\n"
+    "• Map shows location only (no navigation yet)"
+)
+AMHARIC_CHUNK = "ክፍያ በባንክ ማስተላለፍ ይቻላል። ስልክ ኢሜይል"
+
+def test_split_sentences_drops_questions_and_labels():
+    assert split_sentences(FAQ_CHUNK) == [
+        "We accept various payment methods including bank transfers, credit/debit cards, and mobile money."
+    ]
+    assert split_sentences(LIMITATIONS_CHUNK) == [
+        "Rent payments are offline (cash/bank) – online payment coming soon",
+        "Map shows location only (no navigation yet)",
+    ]
+    assert split_sentences("=== Section ===\nText here.") == ["Text here."]
+
+def test_scores_prefer_closer_chunks_and_query_terms():
+    scored = score_sentences("payment methods", [FAQ_CHUNK, LIMITATIONS_CHUNK], [0.4, 1.2])
+    best = max(scored, key=lambda s: s.score)
+    assert best.chunk_rank == 0
+    assert all(s.score < best.score for s in scored if s.chunk_rank == 1)
+
+def test_extractive_answer_is_prefixed_and_punctuated():
+    answer = extractive_answer("Can I pay rent online?", "english", [LIMITATIONS_CHUNK], [0.5])
+    assert answer.startswith(FALLBACK_PREFIXES["english"])
+    assert "Rent payments are offline (cash/bank) – online payment coming soon." in answer
+
+def test_extractive_answer_prefers_query_language():
+    answer = extractive_answer("ክፍያ", "amharic", [FAQ_CHUNK, AMHARIC_CHUNK], [0.6, 0.6])
+    assert answer == FALLBACK_PREFIXES["amharic"] + "\nክፍያ በባንክ ማስተላለፍ ይቻላል።"
+    # No Oromo sentences in the context: English excerpts are used with an Oromo lead-in
+    answer = extractive_answer("kaffaltii", "afaan_oromo", [FAQ_CHUNK], [0.6])
+    assert answer.startswith(FALLBACK_PREFIXES["afaan_oromo"]) and "bank transfers" in answer
+
+def test_extractive_answer_without_usable_sentences():
+    assert extractive_answer("q", "english", [], []) is None
+    assert extractive_answer("q", "english", ["Q1: Only a question?"], [0.3]) is None
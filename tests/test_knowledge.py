@@ -1,4 +1,15 @@
-from app.knowledge_base import load_and_split_documents, MultilingualEmbeddings
+from app.knowledge_base import (
+    load_and_split_documents,
+    load_chunk_store,
+    approximate_token_count,
+    _default_token_counter,
+    MultilingualEmbeddings,
+    FAQ_TEXT,
+    DOCX_SUMMARY_TEXT,
+)
+from app.chunk_store import ChunkStore, ChunkMetadata
+from app.chunking import Section, pack_section
+from unittest.mock import patch
 import pytest
 import os
 
@@ -29,3 +40,79 @@ def test_embedding_model_embed_query():
     embedding = MultilingualEmbeddings().embed_query(query)
     assert isinstance(embedding, list)
     assert len(embedding) > 0 # Check if embedding is generated
+
+def _word_count(text):
+    return len(text.split())
+
+def test_chunker_keeps_faq_pairs_together():
+    store = load_chunk_store(max_tokens=128, token_counter=_word_count)
+    faq_rows = store.rows_where("source", "Faq.txt")
+    assert len(faq_rows) == 10
+    for row in faq_rows:
+        text = store[row]
+        assert text.startswith("Q") and "\nA" in text
+        assert store.metadata(row).section in FAQ_TEXT
+
+def test_chunker_splits_on_headings_and_records_metadata():
+    store = load_chunk_store(max_tokens=128, token_counter=_word_count)
+    sections = store.column("section")
+    assert "Key Features" in sections
+    assert "Chapter 2 – Objectives" in sections
+    key_features = store[sections.index("Key Features")]
+    # Bullets of a section stay in the same chunk
+    assert "Pay-per-post" in key_features and "Responsive design" in key_features
+    assert set(store.column("language")) == {"english", "amharic", "afaan_oromo"}
+
+def test_chunker_respects_token_budget():
+    store = load_chunk_store(max_tokens=20, token_counter=_word_count)
+    assert all(_word_count(text) <= 20 for text in store.texts)
+    # Bullets are only ever split between lines, never mid-line
+    bullet_lines = [line for line in DOCX_SUMMARY_TEXT.splitlines() if line.startswith("•")]
+    chunk_lines = {line for text in store.texts for line in text.splitlines()}
+    assert all(line in chunk_lines for line in bullet_lines if _word_count(line) <= 20)
+
+def test_pack_section_repeats_heading_on_continuation():
+    section = Section(title="Heading", lines=["**Heading**", "• one two three", "• four five six"])
+    chunks = pack_section(section, max_tokens=5, count_tokens=_word_count)
+    assert chunks == ["**Heading**\n• one two three", "**Heading**\n• four five six"]
+
+class _WordTokenizer:
+    """Stands in for the model tokenizer: one token per word, wrapped in <s> ... </s>."""
+    def tokenize(self, text):
+        return text.split()
+
+    def __call__(self, text, add_special_tokens=True, verbose=True):
+        ids = list(range(len(text.split())))
+        return {"input_ids": [0] + ids + [2] if add_special_tokens else ids}
+
+def test_token_counter_includes_special_tokens():
+    with patch.object(MultilingualEmbeddings, 'get_tokenizer', return_value=_WordTokenizer()):
+        count_tokens = _default_token_counter()
+    assert count_tokens("pay rent by telebirr") == 6
+    section = Section(title="Payments", lines=["word " * 10] * 5)
+    # Every packed chunk fits the model's input window including <s> and </s>
+    assert all(count_tokens(chunk) <= 16 for chunk in pack_section(section, 16, count_tokens))
+
+def test_approximate_token_count_weights_geez_script():
+    assert approximate_token_count("ሰላም") == 3
+    assert approximate_token_count("abcdefgh") == 2
+
+def test_chunk_store_columns():
+    store = ChunkStore()
+    store.append("first", source="a.txt", section="Intro", language="english")
+    store.append("second", source="a.txt", section="Body", language="amharic")
+    assert len(store) == 2
+    assert store[1] == "second"
+    assert store.metadata(1) == ChunkMetadata(source="a.txt", section="Body", language="amharic")
+    assert store.column("source") == ["a.txt", "a.txt"]
+    assert store.rows_where("language", "amharic") == [1]
+    assert store.rows_where("language", "klingon") == []
+    assert store.nbytes() > 0
+
+def test_chunk_store_columns_outgrow_16_bit_codes():
+    store = ChunkStore()
+    for i in range(70_000):
+        store.append("text", source="a.txt", section=f"Section {i}", language="english")
+    assert store.metadata(69_999).section == "Section 69999"
+    assert store.metadata(0).section == "Section 0"
+    assert store.rows_where("section", "Section 65536") == [65_536]
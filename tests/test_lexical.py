@@ -0,0 +1,42 @@
+import numpy as np
+from app.lexical import BM25Index, LexicalHit, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    "Q4: What payment methods are supported? A4: Telebirr, CBE Birr and bank transfer.",
+    "Q7: What if I forget my password? A7: Use the Forgot Password link on the login page.",
+    "የኪራይ አስተዳደር ስርዓት፡ ንብረቶች፣ ኪራይ፣ ክፍያ።",
+]
+
+def test_tokenize_drops_stopwords_and_splits_ethiopic_punctuation():
+    assert tokenize("What is the Payment method?") == ["payment", "method"]
+    assert tokenize("ንብረቶች፣ ኪራይ።") == ["ንብረቶች", "ኪራይ"]
+
+def test_bm25_ranks_term_matches():
+    index = BM25Index(DOCS)
+    hits = index.search("forgot my password", k=3)
+    assert hits[0].doc_id == 1 and hits[0].score > 0
+    assert [hit.doc_id for hit in index.search("ኪራይ ክፍያ")] == [2]
+    assert index.search("weather tomorrow") == []
+
+def test_bm25_min_score_filters_weak_matches():
+    index = BM25Index(DOCS)
+    best = index.search("telebirr payment", k=1)[0]
+    assert index.search("telebirr payment", k=1, min_score=best.score + 1) == []
+    assert isinstance(best, LexicalHit)
+
+def test_saved_postings_map_back_with_identical_scores(tmp_path):
+    index = BM25Index(DOCS)
+    index.save(str(tmp_path))
+    mapped = BM25Index.load(str(tmp_path), DOCS, mmap=True)
+    assert isinstance(mapped._doc_ids, np.memmap)
+    for query in ("forgot my password", "telebirr payment", "ኪራይ ክፍያ"):
+        assert mapped.search(query, k=3) == index.search(query, k=3)
+    assert mapped.memory_usage()["resident_bytes"] < index.memory_usage()["resident_bytes"]
+    assert BM25Index.load(str(tmp_path), DOCS[:2]) is None
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[0, 1, 2], [1, 3]], k=60)
+    assert [doc_id for doc_id, _ in fused] == [1, 0, 3, 2]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+    # Ties keep the order of the first ranking
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([[5], [7]])] == [5, 7]
@@ -57,7 +57,15 @@ def test_chat_auto_detect_success(mock_invoke):
     response = client.post("/chat", json={"query": "Hello"})
     assert response.status_code == 200
     assert response.json() == {"response": "This is an auto-detected response."}
-    mock_invoke.assert_called_once_with({'query': 'Hello', 'language': 'english', 'context': [], 'response': ''}) # Default to english
+    # Left to the graph's detect_language branch
+    mock_invoke.assert_called_once_with({'query': 'Hello', 'language': None, 'context': [], 'response': ''})
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_flags_fallback_answers(mock_invoke):
+    mock_invoke.return_value = {"response": "Here is what our help documents say:\nUse the Forgot Password link.", "fallback": True}
+    response = client.post("/chat", json={"query": "forgot password", "language": "english"})
+    assert response.status_code == 200
+    assert response.json()["fallback"] is True
 
 def test_chat_empty_query():
     response = client.post("/chat", json={"query": ""})
@@ -79,3 +87,206 @@ def test_chat_faiss_not_ready():
     response = client.post("/chat", json={"query": "Hello"})
     assert response.status_code == 500
     assert "Chatbot service is not ready" in response.json()["detail"]
+
+def test_metrics_reports_no_context_rate():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.json()
+    assert "counters" in body
+    assert 0.0 <= body["no_context_rate"] <= 1.0
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_metrics_expose_coalescing(mock_invoke):
+    mock_invoke.return_value = {"response": "ok"}
+    client.post("/chat", json={"query": "Hello", "language": "english"})
+    body = client.get("/metrics").json()
+    assert "chat_coalesced" in body
+    assert body["chat_in_flight"] == 0
+
+@patch('app.main.chat_admission.acquire')
+def test_chat_overload_returns_retry_after(mock_acquire):
+    from app.admission import AdmissionRejected
+    mock_acquire.side_effect = AdmissionRejected(429, "Too many requests are waiting.", 3)
+    response = client.post("/chat", json={"query": "Hello"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+
+def test_request_priority_comes_from_verified_token():
+    from starlette.requests import Request
+    from app.admission import PRIORITY_ANONYMOUS, PRIORITY_AUTHENTICATED, PRIORITY_LANDLORD
+    from app.auth import sign_token
+    from app.main import request_priority
+
+    def priority(headers):
+        scope = {"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+        return request_priority(Request(scope))
+
+    with patch('app.main.config.AUTH_TOKEN_SECRET', "test-secret"):
+        landlord = sign_token({"role": "landlord"}, "test-secret")
+        tenant = sign_token({"role": "tenant"}, "test-secret")
+        assert priority({"Authorization": f"Bearer {landlord}"}) == PRIORITY_LANDLORD
+        assert priority({"Authorization": f"Bearer {tenant}"}) == PRIORITY_AUTHENTICATED
+        # Self-declared roles and unverifiable credentials get the lowest priority
+        assert priority({"X-User-Role": "landlord"}) == PRIORITY_ANONYMOUS
+        assert priority({"Authorization": "Bearer anything"}) == PRIORITY_ANONYMOUS
+        assert priority({"Authorization": f"Bearer {sign_token({'role': 'landlord'}, 'guessed')}"}) == PRIORITY_ANONYMOUS
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_serves_precomputed_answer_without_graph(mock_invoke):
+    from app.main import answer_store
+    answer_store.start_version("test-kb")
+    answer_store.put("Q7", "What if I forget my password?", "english", "Use the Forgot Password link.", "h")
+    try:
+        response = client.post("/chat", json={"query": "what if i forget my password?", "language": "english"})
+        assert response.status_code == 200
+        assert response.json() == {"response": "Use the Forgot Password link."}
+        mock_invoke.assert_not_called()
+    finally:
+        answer_store._data = {"current": None, "versions": {}}
+        answer_store._reindex()
+
+def test_admission_slot_is_held_until_an_abandoned_graph_execution_finishes():
+    import asyncio
+    import time
+    from starlette.requests import Request
+    from app.main import ChatRequest, _serve_chat, chat_admission, chat_coalescer
+
+    def slow_invoke(state):
+        time.sleep(0.2)
+        return {"response": "late answer"}
+
+    async def scenario():
+        http_request = Request({"type": "http", "headers": []})
+        handler = asyncio.ensure_future(_serve_chat(ChatRequest(query="slow question", language="english"), http_request))
+        await asyncio.sleep(0.05)
+        handler.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await handler
+        # The graph thread is still running: its slot stays taken and its execution joinable
+        assert chat_admission.in_flight == 1 and chat_coalescer.in_flight() == 1
+        await asyncio.sleep(0.3)
+        assert chat_admission.in_flight == 0 and chat_coalescer.in_flight() == 0
+
+    with patch('app.chatbot_graph.chatbot_graph.invoke', side_effect=slow_invoke):
+        asyncio.run(scenario())
+
+def test_chat_unknown_tenant_is_404():
+    response = client.post("/chat", json={"query": "Hello", "tenant_id": "no-such-company"})
+    assert response.status_code == 404
+
+def test_chat_invalid_tenant_id():
+    response = client.post("/chat", json={"query": "Hello", "tenant_id": "../etc"})
+    assert response.status_code == 422
+
+@patch('app.main.tenant_stores.exists', return_value=True)
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_passes_tenant_to_graph(mock_invoke, mock_exists):
+    mock_invoke.return_value = {"response": "Tenant answer"}
+    response = client.post("/chat", json={"query": "Late fees?", "language": "english", "tenant_id": "acme"})
+    assert response.status_code == 200
+    mock_invoke.assert_called_once_with(
+        {'query': 'Late fees?', 'language': 'english', 'context': [], 'response': '', 'tenant_id': 'acme'}
+    )
+    tenants = client.get("/metrics").json()["tenants"]
+    assert set(tenants) == {"loaded", "resident_bytes", "memory_budget_bytes"}
+
+def test_debug_memory_requires_admin_token():
+    from app.auth import sign_token
+
+    with patch('app.main.config.AUTH_TOKEN_SECRET', "test-secret"):
+        assert client.get("/debug/memory").status_code == 401
+        forged = sign_token({"role": "admin"}, "guessed")
+        assert client.get("/debug/memory", headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+        landlord = sign_token({"role": "landlord"}, "test-secret")
+        assert client.get("/debug/memory", headers={"Authorization": f"Bearer {landlord}"}).status_code == 403
+
+def test_debug_memory_breakdown():
+    from app.auth import sign_token
+
+    with patch('app.main.config.AUTH_TOKEN_SECRET', "test-secret"):
+        admin = sign_token({"role": "admin"}, "test-secret")
+        response = client.get("/debug/memory", headers={"Authorization": f"Bearer {admin}"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["process"]["rss_bytes"] > 0
+    assert set(body["mappings"]) >= {"anonymous_bytes", "snapshot_bytes", "library_bytes"}
+    assert set(body["components"]) == {"embedding_model", "vector_store", "tenant_stores", "embedding_workers"}
+
+@pytest.fixture
+def precomputed_password_answer():
+    from app.main import answer_store, response_cache
+    answer_store.start_version("test-kb")
+    answer_store.put("Q7", "What if I forget my password?", "english", "Use the Forgot Password link. " * 40, "h")
+    yield answer_store
+    answer_store._data = {"current": None, "versions": {}}
+    answer_store._reindex()
+    response_cache.clear()
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_answer_get_supports_conditional_requests(mock_invoke, precomputed_password_answer):
+    params = {"query": "What if I forget my password?", "language": "english"}
+    response = client.get("/chat/answer", params=params, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["response"].startswith("Use the Forgot Password link.")
+    etag = response.headers["etag"]
+
+    not_modified = client.get("/chat/answer", params=params, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    mock_invoke.assert_not_called()
+
+    # A refreshed answer invalidates the old ETag
+    precomputed_password_answer.put("Q7", "What if I forget my password?", "english", "Reset it from the login page.", "h2")
+    changed = client.get("/chat/answer", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json() == {"response": "Reset it from the login page."}
+    assert changed.headers["etag"] != etag
+    assert client.get("/metrics").json()["response_cache"]["not_modified"] >= 1
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_answer_get_counts_each_precomputed_hit_once(mock_invoke, precomputed_password_answer):
+    from app.metrics import metrics
+    params = {"query": "What if I forget my password?", "language": "english"}
+    client.get("/chat/answer", params=params)
+    hits, cache_hits = metrics.get("precomputed_hits"), metrics.get("response_cache_hits")
+    client.get("/chat/answer", params=params)
+    assert metrics.get("precomputed_hits") == hits + 1
+    assert metrics.get("response_cache_hits") == cache_hits + 1
+    mock_invoke.assert_not_called()
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_answer_get_caches_paraphrases_served_by_the_graph(mock_invoke, precomputed_password_answer):
+    answer = precomputed_password_answer.lookup_exact("What if I forget my password?", "english")
+    mock_invoke.return_value = {
+        "response": answer, "cached_question": "What if I forget my password?", "cached_response": answer,
+    }
+    params = {"query": "I forgot my password", "language": "english"}
+    first = client.get("/chat/answer", params=params)
+    assert first.status_code == 200 and first.json() == {"response": answer}
+    assert client.get("/chat/answer", params=params, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+    mock_invoke.assert_called_once()
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_answer_get_caches_graph_answers_for_requests_without_a_language(mock_invoke, precomputed_password_answer):
+    question = "What if I forget my password?"
+    answer = precomputed_password_answer.lookup_exact(question, "english")
+    mock_invoke.return_value = {
+        "response": answer, "language": "english", "cached_question": question, "cached_response": answer,
+    }
+    first = client.get("/chat/answer", params={"query": question})
+    assert first.status_code == 200 and first.json() == {"response": answer}
+    assert mock_invoke.call_args.args[0]["language"] is None
+    again = client.get("/chat/answer", params={"query": question}, headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    mock_invoke.assert_called_once()
+
+@patch('app.chatbot_graph.chatbot_graph.invoke')
+def test_chat_answer_get_runs_graph_for_uncached_queries(mock_invoke):
+    mock_invoke.return_value = {"response": "Generated answer"}
+    response = client.get("/chat/answer", params={"query": "Can I pay rent in cash?", "language": "English"})
+    assert response.status_code == 200
+    assert response.json() == {"response": "Generated answer"}
+    assert "etag" not in response.headers
+    assert client.get("/chat/answer", params={"query": ""}).status_code == 422
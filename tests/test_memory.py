@@ -0,0 +1,182 @@
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+from app.chunk_store import ChunkStore, MappedTexts
+from app.knowledge_base import MultilingualEmbeddings
+from app.memory import process_memory
+from app.vector_store import FAISSVectorStore, read_manifest
+
+# Peak RSS allowed for a low-memory worker running the workload below: the app stack,
+# torch, one copy of the embedding model and the mapped 20k-chunk snapshot
+PEAK_RSS_BUDGET_MB = float(os.getenv("LOW_MEMORY_TEST_PEAK_RSS_MB", "1024"))
+# The same workload with a stub encoder: what the worker needs besides the model
+STUB_PEAK_RSS_BUDGET_MB = float(os.getenv("LOW_MEMORY_TEST_STUB_PEAK_RSS_MB", "400"))
+
+def _chunks(texts):
+    store = ChunkStore()
+    for i, text in enumerate(texts):
+        store.append(text, source=f"doc{i % 2}.txt", section="FAQ", language="amharic" if i == 1 else "english")
+    return store
+
+def _unit_vectors(n, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_mapped_snapshot_matches_in_memory_load(tmp_path):
+    texts = ["How do I register?", "ሰላም አለም", 'Quotes "and" \\ backslashes', "Akkam jirtu"]
+    embeddings = _unit_vectors(len(texts))
+    FAISSVectorStore.from_documents(_chunks(texts), embeddings=embeddings).save(str(tmp_path))
+    assert read_manifest(str(tmp_path))["chunks"] == 4
+
+    copied = FAISSVectorStore.load(str(tmp_path))
+    mapped = FAISSVectorStore.load(str(tmp_path), mmap=True)
+    assert isinstance(mapped._documents, MappedTexts)
+    assert list(mapped._documents) == texts and mapped._documents[-1] == texts[-1]
+    assert mapped._documents[1:3] == texts[1:3]
+    assert mapped.chunk_metadata(1).language == "amharic"
+    for query in embeddings:
+        assert mapped.search_embedding(query, k=2) == copied.search_embedding(query, k=2)
+    assert mapped.lexical_search("register", k=1)[0].doc_id == 0
+    # BM25 postings were saved with the snapshot and are mapped, not rebuilt in memory
+    assert mapped._lexical._mapped and mapped.memory_usage()["lexical"]["resident_bytes"] < \
+        copied.memory_usage()["lexical"]["resident_bytes"]
+
+    usage = mapped.memory_usage()
+    assert usage["mapped"] and not copied.memory_usage()["mapped"]
+    assert usage["chunk_mapped_bytes"] > 0 == copied.memory_usage()["chunk_mapped_bytes"]
+    assert usage["chunk_bytes"] < copied.memory_usage()["chunk_bytes"]
+
+def test_low_memory_store_builds_snapshot_once(tmp_path):
+    def build_store(texts):
+        store = object.__new__(FAISSVectorStore)
+        store._index = None
+        store._snapshot_path = str(tmp_path / "base")
+        with patch('app.vector_store.load_chunk_store', return_value=_chunks(texts)):
+            store._initialize_store()
+        return store
+
+    with patch.dict(os.environ, {"LOW_MEMORY_MODE": "true"}), patch('app.vector_store.embedding_model') as mock_model:
+        mock_model.embed_documents.side_effect = lambda texts: _unit_vectors(len(texts)).tolist()
+        first = build_store(["alpha", "beta"])
+        assert first._mapped and list(first._documents) == ["alpha", "beta"]
+        assert first.get_index().ntotal == 2
+
+        # A warm start with the same chunks maps the existing snapshot without embedding
+        second = build_store(["alpha", "beta"])
+        assert second._mapped and mock_model.embed_documents.call_count == 1
+
+        changed = build_store(["alpha", "beta", "gamma"])
+        assert changed.get_index().ntotal == 3 and mock_model.embed_documents.call_count == 2
+
+def test_idle_model_is_unloaded_and_reloaded_lazily():
+    with patch.object(MultilingualEmbeddings, '_model', None), \
+            patch('sentence_transformers.SentenceTransformer') as mock_transformer:
+        mock_transformer.return_value.encode.return_value = np.array([1.0, 0.0])
+        embeddings = MultilingualEmbeddings()
+        assert embeddings.embed_query("hello") == [1.0, 0.0]
+        assert not MultilingualEmbeddings.unload_if_idle(60)
+        assert MultilingualEmbeddings.memory_usage()["loaded"]
+
+        assert MultilingualEmbeddings.unload_if_idle(0)
+        assert MultilingualEmbeddings._model is None
+        assert not MultilingualEmbeddings.unload_if_idle(0)
+
+        assert embeddings.embed_query("hello again") == [1.0, 0.0]
+        assert mock_transformer.call_count == 2
+
+def test_process_memory_breakdown():
+    report = process_memory()
+    assert report["rss_bytes"] > 0
+    if sys.platform.startswith("linux"):
+        assert report["anon_bytes"] + report["file_bytes"] <= report["rss_bytes"] + report["shmem_bytes"]
+        assert report["peak_rss_bytes"] >= report["rss_bytes"]
+
+# Runs a low-memory worker as deployed: the whole app imported, the embedding model
+# loaded in-process, queries embedded and searched (dense and BM25) against a mapped
+# snapshot, and the model unloaded between rounds as the idle unloader would
+WORKLOAD = """
+import json, os, sys
+sys.path.insert(0, {cwd!r})
+os.environ["LOW_MEMORY_MODE"] = "true"
+{stub_encoder}
+from app.main import app
+from app.evaluation import GOLD_QUERIES
+from app.knowledge_base import MultilingualEmbeddings, embedding_model
+from app.memory import configure_low_memory_mode, process_memory
+from app.vector_store import FAISSVectorStore
+
+configure_low_memory_mode()
+store = FAISSVectorStore.load({snapshot!r}, mmap=True)
+for _ in range(3):
+    for gold in GOLD_QUERIES:
+        hits = store.search_embedding(embedding_model.embed_query(gold.query), k=5)
+        assert all(len(hit.text) > 0 for hit in hits)
+        store.lexical_search(gold.query, k=5)
+    loaded = process_memory()
+    parameter_bytes = MultilingualEmbeddings.memory_usage()["parameter_bytes"]
+    assert MultilingualEmbeddings.unload_if_idle(0)
+final = process_memory()
+print(json.dumps({{"loaded": loaded, "final": final, "parameter_bytes": parameter_bytes,
+                  "store": store.memory_usage()}}))
+"""
+
+# Stands in for sentence-transformers so the workload runs without the model (or torch):
+# texts map to fixed pseudo-random unit vectors of the model's dimension
+STUB_ENCODER = """
+import types, zlib
+import numpy as np
+
+class StubEncoder:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def encode(self, texts, normalize_embeddings=True):
+        rows = [np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(384).astype("float32")
+                for t in ([texts] if isinstance(texts, str) else texts)]
+        rows = np.stack([row / np.linalg.norm(row) for row in rows])
+        return rows[0] if isinstance(texts, str) else rows
+
+sys.modules["sentence_transformers"] = types.ModuleType("sentence_transformers")
+sys.modules["sentence_transformers"].SentenceTransformer = StubEncoder
+"""
+
+def _model_is_cached() -> bool:
+    from huggingface_hub import try_to_load_from_cache
+    return isinstance(try_to_load_from_cache(MultilingualEmbeddings.MODEL_NAME, "config.json"), str)
+
+def _run_workload(snapshot_dir, stub_encoder: str = "") -> dict:
+    n, dim = 20000, 384
+    texts = [f"Chunk {i}: " + "rental policy text " * 15 for i in range(n)]
+    FAISSVectorStore.from_documents(texts, embeddings=_unit_vectors(n, dim)).save(str(snapshot_dir))
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = WORKLOAD.format(cwd=repo_root, snapshot=str(snapshot_dir), stub_encoder=stub_encoder)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=600, cwd=repo_root)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="peak RSS is read from /proc")
+def test_low_memory_workload_without_model_stays_within_rss_budget(tmp_path):
+    report = _run_workload(tmp_path, stub_encoder=STUB_ENCODER)
+    store = report["store"]
+
+    # Everything but the model: the app stack and the mapped snapshot, whose texts stay on disk
+    assert report["final"]["peak_rss_bytes"] / 1024 / 1024 < STUB_PEAK_RSS_BUDGET_MB
+    assert store["mapped"] and store["lexical"]["resident_bytes"] == store["lexical"]["vocabulary_bytes"]
+    assert store["chunk_mapped_bytes"] > 20000 * 100 > store["chunk_bytes"]
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="peak RSS is read from /proc")
+def test_low_memory_workload_stays_within_rss_budget(tmp_path):
+    if not _model_is_cached():
+        pytest.skip(f"{MultilingualEmbeddings.MODEL_NAME} is not in the local Hugging Face cache")
+    report = _run_workload(tmp_path)
+    loaded, final = report["loaded"], report["final"]
+
+    # Peak RSS of the whole worker since it started, not growth over a baseline
+    assert final["peak_rss_bytes"] / 1024 / 1024 < PEAK_RSS_BUDGET_MB
+    # The index, texts and postings stay file-backed, and unloading the model returns its weights
+    assert final["anon_bytes"] < loaded["anon_bytes"] - report["parameter_bytes"] / 2
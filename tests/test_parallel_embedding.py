@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.parallel_embedding import ParallelEmbedder, benchmark_scaling, format_scaling_chart
+
+TEXTS = [f"chunk {i}" for i in range(10)]
+
+def _fake_vectors(texts):
+    # Deterministic per-text vectors, so results can be compared across runs and processes
+    return np.array([[len(text), sum(map(ord, text)) % 97, i % 3] for i, text in
+                     ((int(text.split()[-1]), text) for text in texts)], dtype="float32")
+
+class _FakeEncoderFactory:
+    """Picklable encoder factory for spawned workers; fails on any batch containing `fail_on`."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+
+    def __call__(self, num_threads):
+        def encode(texts):
+            if self.fail_on in texts:
+                raise RuntimeError(f"refusing to embed {self.fail_on!r}")
+            return _fake_vectors(texts)
+        return encode
+
+def test_embeddings_are_returned_in_corpus_order():
+    embedder = ParallelEmbedder(workers=2, batch_size=3, encoder_factory=_FakeEncoderFactory())
+    batches = list(embedder.iter_embeddings(TEXTS))
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    np.testing.assert_array_equal(np.vstack(batches), _fake_vectors(TEXTS))
+
+def test_interrupted_build_resumes_from_checkpoints(tmp_path):
+    failing = ParallelEmbedder(workers=2, batch_size=3, checkpoint_dir=str(tmp_path),
+                               encoder_factory=_FakeEncoderFactory(fail_on="chunk 7"))
+    with pytest.raises(RuntimeError):
+        failing.embed(TEXTS)
+    run_dir = failing._run_dir(TEXTS)
+    assert sorted(os.listdir(run_dir)) == ["batch_000000.npy", "batch_000001.npy"]
+
+    # Checkpointed batches must not be re-embedded: this encoder fails on the first batch
+    resumed = ParallelEmbedder(workers=2, batch_size=3, checkpoint_dir=str(tmp_path),
+                               encoder_factory=_FakeEncoderFactory(fail_on="chunk 0"))
+    np.testing.assert_array_equal(resumed.embed(TEXTS), _fake_vectors(TEXTS))
+    assert len(os.listdir(run_dir)) == 4
+
+    resumed.clear_checkpoints(TEXTS)
+    assert os.listdir(tmp_path) == []
+
+def test_checkpoints_are_keyed_by_corpus_and_batch_size(tmp_path):
+    embedder = ParallelEmbedder(batch_size=3, checkpoint_dir=str(tmp_path))
+    assert embedder._run_dir(TEXTS) != embedder._run_dir(TEXTS[:-1])
+    assert embedder._run_dir(TEXTS) != ParallelEmbedder(batch_size=4, checkpoint_dir=str(tmp_path))._run_dir(TEXTS)
+
+def test_warm_pool_starts_every_worker_before_timing():
+    embedder = ParallelEmbedder(workers=2, batch_size=3, encoder_factory=_FakeEncoderFactory())
+    with embedder.warm_pool(TEXTS[:1]) as pool:
+        # Both warm-up tasks met at the barrier, so both workers are up before any batch runs
+        assert len(pool._processes) == 2
+        np.testing.assert_array_equal(np.vstack(list(embedder.iter_embeddings(TEXTS, pool=pool))), _fake_vectors(TEXTS))
+
+def test_benchmark_and_scaling_chart():
+    results = benchmark_scaling(TEXTS * 4, max_workers=2, batch_size=4, encoder_factory=_FakeEncoderFactory())
+    assert [workers for workers, _ in results] == [1, 2]
+    assert all(rate > 0 for _, rate in results)
+
+    chart = format_scaling_chart([(1, 100.0), (2, 180.0)], width=10)
+    lines = chart.splitlines()
+    assert lines[0].split() == ["workers", "chunks/s", "speed-up"]
+    assert "1.80x" in lines[2] and lines[2].endswith("#" * 10)
+
+def test_vector_store_streams_parallel_batches_into_index():
+    from app.vector_store import FAISSVectorStore
+
+    class _FakeEmbedder:
+        def __init__(self, **kwargs):
+            pass
+
+        def iter_embeddings(self, texts):
+            for start in range(0, len(texts), 3):
+                yield _fake_vectors(texts[start:start + 3])
+
+    with patch('app.vector_store.ParallelEmbedder', _FakeEmbedder), \
+            patch.object(FAISSVectorStore, '_embedding_workers', 2):
+        store = FAISSVectorStore.from_documents(TEXTS)
+    assert store.get_index().ntotal == len(TEXTS)
+    _, I = store.get_index().search(_fake_vectors(["chunk 4"]), 1)
+    assert I[0, 0] == 4
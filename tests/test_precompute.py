@@ -0,0 +1,131 @@
+from app.precompute import (
+    AnswerPrecomputer,
+    AnswerStore,
+    content_hash,
+    extract_canonical_questions,
+)
+from unittest.mock import patch
+
+def test_extract_canonical_questions():
+    questions = extract_canonical_questions()
+    assert len(questions) == 10
+    assert questions[0].question_id == "Q1"
+    assert questions[3].question == "What payment methods are accepted for rent?"
+
+def _precomputer(store, contexts, answers, **kwargs):
+    calls = []
+
+    def generate(question, language):
+        calls.append((question, language))
+        return answers.get(language, f"{language} answer to {question}")
+
+    precomputer = AnswerPrecomputer(
+        store,
+        retrieve_fn=lambda question, language: contexts.get(question, ["shared chunk"]),
+        generate_fn=generate,
+        kb_hash_fn=kwargs.pop("kb_hash_fn", lambda: "kb1"),
+        min_interval=0,
+        sleep=lambda seconds: None,
+        **kwargs,
+    )
+    return precomputer, calls
+
+def test_refresh_generates_all_languages_and_serves_exact_matches():
+    store = AnswerStore()
+    precomputer, calls = _precomputer(store, {}, {})
+    counts = precomputer.refresh()
+    assert counts == {"generated": 30, "unchanged": 0, "failed": 0}
+    assert len(calls) == 30
+    assert store.current_version() == "kb1"
+    answer = store.lookup_exact("  what PAYMENT methods are accepted for rent? ", "amharic")
+    assert answer == "amharic answer to What payment methods are accepted for rent?"
+
+def test_refresh_only_regenerates_changed_sources():
+    store = AnswerStore()
+    contexts = {}
+    precomputer, calls = _precomputer(store, contexts, {}, kb_hash_fn=lambda: "kb1")
+    precomputer.refresh()
+
+    # New knowledge-base version in which only Q4's retrieved context changed
+    contexts["What payment methods are accepted for rent?"] = ["updated payment chunk"]
+    calls.clear()
+    precomputer.kb_hash_fn = lambda: "kb2"
+    counts = precomputer.refresh()
+    assert counts == {"generated": 3, "unchanged": 27, "failed": 0}
+    assert {question for question, _ in calls} == {"What payment methods are accepted for rent?"}
+    assert store.current_version() == "kb2"
+
+def test_answers_from_the_previous_version_are_not_served_until_confirmed():
+    store = AnswerStore()
+    contexts = {}
+    precomputer, _ = _precomputer(store, contexts, {}, kb_hash_fn=lambda: "kb1")
+    precomputer.refresh()
+
+    # kb2: Q4's context changed but its regeneration fails, and Q7 no longer retrieves anything
+    contexts["What payment methods are accepted for rent?"] = ["updated payment chunk"]
+    contexts["What if I forget my password?"] = []
+    failure = "Sorry, I encountered an issue while generating a response."
+    precomputer.generate_fn = lambda question, language: failure
+    precomputer.kb_hash_fn = lambda: "kb2"
+    counts = precomputer.refresh()
+    assert counts == {"generated": 0, "unchanged": 24, "failed": 6}
+    assert store.lookup_exact("What payment methods are accepted for rent?", "english") is None
+    assert store.lookup_exact("What if I forget my password?", "english") is None
+    assert store.lookup_exact("How do I register as a new user?", "english") is not None
+
+def test_new_version_is_not_served_before_refresh_confirms_it():
+    store = AnswerStore()
+    store.start_version("kb1")
+    store.put("Q1", "What property types can I list or search for?", "english", "Apartments and more.", "h")
+    store.start_version("kb2")
+    assert store.lookup_exact("What property types can I list or search for?", "english") is None
+    store.confirm("Q1", "english")
+    assert store.lookup_exact("What property types can I list or search for?", "english") == "Apartments and more."
+
+def test_failed_generations_are_not_stored():
+    store = AnswerStore()
+    failure = "Sorry, I encountered an issue while generating a response."
+    precomputer, _ = _precomputer(store, {}, {"english": failure})
+    counts = precomputer.refresh()
+    assert counts["failed"] == 10
+    assert store.lookup_exact("How do I register as a new user?", "english") is None
+    assert store.lookup_exact("How do I register as a new user?", "amharic") is not None
+
+def test_refresh_yields_to_live_traffic():
+    store = AnswerStore()
+    precomputer, calls = _precomputer(store, {}, {}, is_busy=lambda: True, max_busy_wait=2, busy_poll=1)
+    counts = precomputer.refresh()
+    assert counts["generated"] == 0
+    assert calls == []
+
+def test_store_persists_versions(tmp_path):
+    path = str(tmp_path / "answers.json")
+    store = AnswerStore(path=path)
+    store.start_version("kb1")
+    store.put("Q1", "What property types can I list or search for?", "english", "Apartments and more.", content_hash(["c"]))
+    store.save()
+
+    reloaded = AnswerStore(path=path)
+    assert reloaded.current_version() == "kb1"
+    assert reloaded.lookup_exact("What property types can I list or search for?", "english") == "Apartments and more."
+
+@patch('app.precompute.embedding_model')
+def test_semantic_lookup_matches_paraphrases(mock_embedding):
+    vectors = {
+        "How do I register as a new user?": [1.0, 0.0],
+        "What if I forget my password?": [0.0, 1.0],
+        "አዲስ ተጠቃሚ እንዴት መመዝገብ እችላለሁ?": [0.96, 0.28],
+        "what's the weather": [0.6, 0.6],
+    }
+    mock_embedding.embed_documents.side_effect = lambda texts: [vectors[t] for t in texts]
+    mock_embedding.embed_query.side_effect = lambda text: vectors[text]
+
+    store = AnswerStore()
+    store.start_version("kb1")
+    store.put("Q2", "How do I register as a new user?", "amharic", "የአማርኛ መልስ", "h")
+    store.put("Q7", "What if I forget my password?", "amharic", "ሌላ መልስ", "h")
+
+    question = store.match_question("አዲስ ተጠቃሚ እንዴት መመዝገብ እችላለሁ?", min_similarity=0.9)
+    assert question == "How do I register as a new user?"
+    assert store.lookup_exact(question, "amharic") == "የአማርኛ መልስ"
+    assert store.match_question("what's the weather", min_similarity=0.9) is None
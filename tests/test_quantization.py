@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import faiss
+import pytest
+from app import quantization
+from app.quantization import ENCODINGS, RescoringIndex, build_index, index_memory, pack_binary
+
+def _vectors(n=200, d=64, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, d)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_pack_binary():
+    codes = pack_binary(np.array([[1.0, -1.0] * 4], dtype="float32"))
+    assert codes.shape == (1, 1)
+    assert codes[0, 0] == 0b10101010
+
+@pytest.mark.parametrize("encoding", ["float16", "int8", "binary"])
+def test_rescored_search_matches_exact_neighbours(encoding):
+    vectors = _vectors()
+    # Queries are small perturbations of stored vectors, so their exact nearest neighbour is known
+    queries = vectors[:20] + 0.05 * _vectors(20, seed=1)
+    exact = build_index(vectors, "float32")
+    compressed = build_index(vectors, encoding, rescore_factor=8)
+
+    D_exact, I_exact = exact.search(queries, 3)
+    D, I = compressed.search(queries, 3)
+    assert (I[:, 0] == I_exact[:, 0]).mean() >= 0.9
+    # Rescoring returns exact squared L2 distances for the candidates it keeps
+    same = I[:, 0] == I_exact[:, 0]
+    np.testing.assert_allclose(D[same, 0], D_exact[same, 0], rtol=1e-4, atol=1e-5)
+
+def test_compressed_codes_are_smaller():
+    vectors = _vectors(d=128)
+    sizes = {encoding: index_memory(build_index(vectors, encoding))["code_bytes"] for encoding in ENCODINGS}
+    assert sizes["float32"] == 200 * 128 * 4
+    assert sizes["float16"] == sizes["float32"] // 2
+    assert sizes["int8"] == sizes["float32"] // 4
+    assert sizes["binary"] == sizes["float32"] // 32
+
+def test_rescore_vectors_can_be_memory_mapped(tmp_path):
+    vectors = _vectors()
+    index = RescoringIndex(vectors, "int8", rescore_factor=4, rescore_path=str(tmp_path / "full.f32"))
+    memory = index_memory(index)
+    assert memory["rescore_bytes"] == vectors.nbytes
+    assert memory["resident_bytes"] == memory["code_bytes"]
+    _, I = index.search(vectors[:1], 1)
+    assert I[0, 0] == 0
+
+def test_without_rescoring_scalar_quantized_distances_are_returned():
+    vectors = _vectors()
+    index = build_index(vectors, "float16", rescore_factor=0)
+    assert index_memory(index)["rescore_bytes"] == 0
+    _, I = index.search(vectors[:5], 1)
+    assert list(I[:, 0]) == [0, 1, 2, 3, 4]
+
+def test_binary_requires_rescoring():
+    with pytest.raises(ValueError):
+        RescoringIndex(_vectors(), "binary", rescore_factor=0)
+
+def test_rescore_vectors_are_never_held_in_ram(tmp_path, monkeypatch):
+    monkeypatch.setenv("VECTOR_STORE_PATH", str(tmp_path / "store"))
+    vectors = _vectors()
+    for encoding in ("float16", "int8", "binary"):
+        memory = index_memory(build_index(vectors, encoding, rescore_factor=4))
+        assert memory["rescore_bytes"] == vectors.nbytes
+        assert memory["resident_bytes"] == memory["code_bytes"] < vectors.nbytes
+
+    # Rebuilding replaces the file rather than rewriting it under an existing mapping
+    path = str(tmp_path / "full.f32")
+    first = RescoringIndex(vectors, "int8", rescore_path=path)
+    RescoringIndex(vectors[::-1].copy(), "int8", rescore_path=path)
+    np.testing.assert_array_equal(np.asarray(first._full), vectors)
+
+def test_unnamed_rescore_file_is_kept_under_the_vector_store_path(tmp_path, monkeypatch):
+    store_dir = tmp_path / "store"
+    monkeypatch.setenv("VECTOR_STORE_PATH", str(store_dir))
+    index = RescoringIndex(_vectors(), "int8")
+    assert index._full.filename.startswith(str(store_dir))
+    # Unlinked right away: the mapping is the only reference to the data
+    assert list(store_dir.iterdir()) == []
+
+def test_rescore_vectors_on_tmpfs_are_reported_as_resident(tmp_path, monkeypatch):
+    monkeypatch.setattr(quantization, "_in_memory_filesystem", lambda path: True)
+    vectors = _vectors()
+    memory = index_memory(RescoringIndex(vectors, "int8", rescore_path=str(tmp_path / "full.f32")))
+    assert memory["resident_bytes"] == memory["code_bytes"] + vectors.nbytes
+
+def test_in_memory_filesystem_detection():
+    assert quantization._in_memory_filesystem("/dev/shm/x") == os.path.ismount("/dev/shm")
+    assert not quantization._in_memory_filesystem("/proc/self/status")
@@ -0,0 +1,61 @@
+import gzip
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from app.response_cache import (
+    EncodedResponse, ResponseCache, encode_payload, encoded_response, etag_matches, negotiate_encoding,
+)
+
+def test_encoding_matches_fastapi_json_and_compresses_once():
+    payload = {"response": "ሰላም! Click \"Forgot Password\" on the login page. " * 30}
+    encoded = encode_payload(payload)
+    assert encoded.body == JSONResponse(payload).body
+    assert gzip.decompress(encoded.gzip) == encoded.body
+    assert len(encoded.gzip) < len(encoded.body)
+    assert encoded.etag.startswith('W/"')
+    assert encode_payload(dict(payload)) == encoded  # deterministic (no gzip timestamp)
+
+def test_negotiation_prefers_brotli_when_available():
+    without_br = EncodedResponse(b"{}", b"gz", None, 'W/"x"')
+    with_br = without_br._replace(br=b"br")
+    assert negotiate_encoding("gzip, deflate, br", with_br) == "br"
+    assert negotiate_encoding("gzip, deflate, br", without_br) == "gzip"
+    assert negotiate_encoding("br;q=0, gzip;q=0.5", with_br) == "gzip"
+    assert negotiate_encoding("*", with_br) == "br"
+    assert negotiate_encoding("identity", with_br) == "identity"
+    assert negotiate_encoding("", with_br) == "identity"
+
+def test_etag_matching_is_weak():
+    etag = 'W/"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"zzz", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abd"', etag)
+    assert not etag_matches(None, etag)
+
+def test_encoded_response_headers_and_not_modified():
+    encoded = encode_payload({"response": "x" * 2000})
+    response = encoded_response(encoded, Headers({"accept-encoding": "gzip"}), minimum_size=1000)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == encoded.etag
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.body == encoded.gzip
+
+    small = encode_payload({"response": "short"})
+    assert "content-encoding" not in encoded_response(small, Headers({"accept-encoding": "gzip"}), 1000).headers
+
+    headers = Headers({"if-none-match": encoded.etag})
+    assert encoded_response(encoded, headers, conditional=True).status_code == 304
+    assert encoded_response(encoded, headers).status_code == 200
+
+def test_cache_reencodes_changed_answers_and_evicts_oldest():
+    cache = ResponseCache(max_entries=2)
+    first = cache.encoded(("q1", "english"), "Answer one", "Q1?")
+    assert cache.encoded(("q1", "english"), "Answer one", "Q1?") is first
+    assert cache.encoded(("q1", "english"), "Answer one, revised", "Q1?") != first
+
+    cache.encoded(("q2", "english"), "Answer two", "Q2?")
+    cache.get(("q1", "english"))  # q1 is now the most recently used
+    cache.encoded(("q3", "english"), "Answer three", "Q3?")
+    assert cache.get(("q2", "english")) is None
+    assert cache.get(("q1", "english")).question == "Q1?"
+    assert len(cache) == 2
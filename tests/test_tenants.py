@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.chunk_store import ChunkStore
+from app.metrics import metrics
+from app.tenants import TenantStoreManager, build_tenant_snapshot, lexical_search_with_tenant, search_with_tenant, store_resident_bytes
+from app.vector_store import FAISSVectorStore
+
+def _fake_embed(texts):
+    # One-hot vectors keyed by the first character, so "a..." matches "a..."
+    return [[1.0 if ord(text[0]) % 8 == i else 0.0 for i in range(8)] for text in texts]
+
+def _chunks(texts, source):
+    store = ChunkStore()
+    for text in texts:
+        store.append(text, source=source, section="FAQ", language="english")
+    return store
+
+@pytest.fixture
+def fake_embeddings():
+    with patch('app.vector_store.embedding_model') as store_model, patch('app.tenants.embedding_model') as query_model:
+        store_model.embed_documents.side_effect = _fake_embed
+        query_model.embed_query.side_effect = lambda text: _fake_embed([text])[0]
+        yield
+
+@pytest.fixture
+def snapshot_dir(tmp_path, fake_embeddings):
+    for tenant, texts in {
+        "acme": ["acme late fees are 5% after ten days", "bcme deposits equal one month of rent"],
+        "zenith": ["anything goes at zenith", "zenith allows pets with a deposit"],
+        "cobalt": ["cobalt collects rent by telebirr", "another cobalt policy"],
+    }.items():
+        FAISSVectorStore.from_documents(_chunks(texts, f"{tenant}.txt")).save(str(tmp_path / tenant))
+    return tmp_path
+
+def test_snapshot_roundtrip(tmp_path, fake_embeddings):
+    original = FAISSVectorStore.from_documents(_chunks(["alpha policy", "beta policy"], "policies.txt"))
+    original.save(str(tmp_path / "t1"))
+    loaded = FAISSVectorStore.load(str(tmp_path / "t1"))
+    assert loaded._documents == ["alpha policy", "beta policy"]
+    assert loaded.chunk_metadata(1).source == "policies.txt"
+    assert loaded.search_embedding(_fake_embed(["beta"])[0], k=1)[0].text == "beta policy"
+
+def test_compressed_stores_cannot_be_snapshotted(tmp_path, fake_embeddings):
+    store = FAISSVectorStore.from_documents(["alpha", "beta"], encoding="int8")
+    with pytest.raises(ValueError):
+        store.save(str(tmp_path / "t1"))
+
+def test_tenants_load_lazily_and_report_stats(snapshot_dir):
+    manager = TenantStoreManager(str(snapshot_dir), memory_budget_bytes=10 * 1024 * 1024)
+    assert manager.stats()["loaded"] == 0
+    assert manager.get("missing") is None
+    assert not manager.exists("../acme") and manager.exists("acme")
+
+    cold_loads = metrics.get("tenant_cold_loads")
+    store = manager.get("acme")
+    assert manager.get("acme") is store
+    assert metrics.get("tenant_cold_loads") == cold_loads + 1
+
+    stats = manager.stats()
+    assert stats["tenants"]["acme"]["chunks"] == 2
+    assert stats["tenants"]["acme"]["resident_bytes"] == store_resident_bytes(store) > 0
+    assert stats["tenants"]["acme"]["load_seconds"] >= 0
+
+def test_least_recently_used_tenant_is_evicted_over_budget(snapshot_dir):
+    probe = TenantStoreManager(str(snapshot_dir), memory_budget_bytes=10 * 1024 * 1024)
+    sizes = [store_resident_bytes(probe.get(tenant)) for tenant in ("acme", "zenith", "cobalt")]
+    # Room for two tenants but not three
+    manager = TenantStoreManager(str(snapshot_dir), memory_budget_bytes=sum(sizes) - min(sizes) // 2)
+
+    manager.get("acme")
+    manager.get("zenith")
+    manager.get("acme")  # acme is now the most recently used
+    manager.get("cobalt")
+    assert list(manager.stats()["tenants"]) == ["acme", "cobalt"]
+    assert manager.resident_bytes() <= manager.memory_budget_bytes
+
+def test_oversized_tenant_is_kept_alone(snapshot_dir):
+    manager = TenantStoreManager(str(snapshot_dir), memory_budget_bytes=1)
+    manager.get("acme")
+    assert manager.get("zenith") is not None
+    assert list(manager.stats()["tenants"]) == ["zenith"]
+
+def test_base_and_tenant_corpora_are_searched_together(snapshot_dir):
+    base = FAISSVectorStore.from_documents(_chunks(["a shared answer", "c shared question"], "Faq.txt"))
+    manager = TenantStoreManager(str(snapshot_dir), memory_budget_bytes=10 * 1024 * 1024)
+    with patch('app.tenants.tenant_stores', manager):
+        hits = search_with_tenant("acme", "a question", k=3, max_distance=0.5, base=base)
+        # Tenant doc ids are offset past the base corpus
+        assert sorted((hit.text, hit.doc_id) for hit in hits) == [
+            ("a shared answer", 0), ("acme late fees are 5% after ten days", 2),
+        ]
+        lexical = lexical_search_with_tenant("acme", "deposits rent", k=3, base=base)
+        assert [(hit.text, hit.doc_id) for hit in lexical] == [("bcme deposits equal one month of rent", 3)]
+        # Unknown tenants fall back to the base corpus only
+        assert [hit.doc_id for hit in search_with_tenant("missing", "a", k=3, max_distance=0.5, base=base)] == [0]
+
+def test_corrupt_tenant_snapshot_falls_back_to_base_corpus(snapshot_dir):
+    base = FAISSVectorStore.from_documents(_chunks(["a shared answer", "deposits are refundable"], "Faq.txt"))
+    (snapshot_dir / "acme" / "index.faiss").write_bytes(b"not an index")
+    manager = TenantStoreManager(str(snapshot_dir), memory_budget_bytes=10 * 1024 * 1024)
+    with patch('app.tenants.tenant_stores', manager):
+        assert [hit.doc_id for hit in search_with_tenant("acme", "a question", k=3, max_distance=0.5, base=base)] == [0]
+        assert [hit.doc_id for hit in lexical_search_with_tenant("acme", "deposits", k=3, base=base)] == [1]
+
+def test_tenant_snapshot_chunks_are_tagged_with_their_language(tmp_path, fake_embeddings):
+    from app.knowledge_base import approximate_token_count
+
+    faq = "Q1: How do I pay rent?\nA1: Pay by Telebirr.\nQ2: ኪራይ እንዴት እከፍላለሁ?\nA2: በቴሌብር ይክፈሉ።"
+    with patch('app.knowledge_base._default_token_counter', return_value=approximate_token_count):
+        path = build_tenant_snapshot("acme", faq, snapshot_dir=str(tmp_path))
+        store = FAISSVectorStore.load(path)
+        assert [store.chunk_metadata(i).language for i in range(len(store._documents))] == ["english", "amharic"]
+
+        path = build_tenant_snapshot("acme", faq, snapshot_dir=str(tmp_path), language="amharic")
+        store = FAISSVectorStore.load(path)
+        assert {store.chunk_metadata(i).language for i in range(len(store._documents))} == {"amharic"}
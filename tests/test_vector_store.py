@@ -0,0 +1,42 @@
+from app.vector_store import FAISSVectorStore, SearchHit, faiss_vector_store, select_hits
+from app.chunk_store import ChunkStore
+from unittest.mock import patch
+
+HITS = [SearchHit("a", 0.50, 0), SearchHit("b", 0.60, 1), SearchHit("c", 1.10, 2), SearchHit("d", 1.20, 3)]
+
+def test_select_hits_without_limits_keeps_everything():
+    assert select_hits(HITS) == HITS
+
+def test_select_hits_distance_threshold():
+    assert [hit.text for hit in select_hits(HITS, max_distance=1.0)] == ["a", "b"]
+    assert select_hits(HITS, max_distance=0.1) == []
+
+def test_select_hits_adaptive_k_by_gap():
+    # The jump from 0.60 to 1.10 exceeds the gap, so only the leading cluster survives
+    assert [hit.text for hit in select_hits(HITS, max_gap=0.25)] == ["a", "b"]
+
+def _fake_embed(texts):
+    # One-hot vectors keyed by the first character, so "a..." matches "a..."
+    return [[1.0 if ord(text[0]) % 4 == i else 0.0 for i in range(4)] for text in texts]
+
+@patch('app.vector_store.embedding_model')
+def test_from_documents_builds_standalone_store(mock_embedding):
+    mock_embedding.embed_documents.side_effect = _fake_embed
+    mock_embedding.embed_query.side_effect = lambda text: _fake_embed([text])[0]
+
+    store = FAISSVectorStore.from_documents(["alpha", "beta"])
+    assert store is not faiss_vector_store
+
+    hits = store.search_with_scores("apple", k=2)
+    assert hits[0].text == "alpha"
+    assert hits[0].distance == 0.0
+    assert store.search("apple", k=2, max_distance=1.0) == ["alpha"]
+
+@patch('app.vector_store.embedding_model')
+def test_from_chunk_store_exposes_metadata(mock_embedding):
+    mock_embedding.embed_documents.side_effect = _fake_embed
+    chunks = ChunkStore()
+    chunks.append("alpha", source="Faq.txt", section="Q", language="english")
+    store = FAISSVectorStore.from_documents(chunks)
+    assert store.chunk_metadata(0).source == "Faq.txt"
+    assert FAISSVectorStore.from_documents(["alpha"]).chunk_metadata(0) is None